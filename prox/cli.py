@@ -1,10 +1,14 @@
 """
 Usage:
-  prox <command> [<args>...]
+  prox [--debug] [--profile] [--max-reads=N] [--max-writes=N] <command> [<args>...]
 
 Options:
   -h, --help                             display this help and exit
   -v, --version                          Print version information and quit
+  --debug                                Report API requests sent and saved on exit
+  --profile                              Report per node request limits on exit
+  --max-reads=N                          Cap concurrent reads per node
+  --max-writes=N                         Cap concurrent task-spawning writes per node
 
 Commands:
   node          Node Command
@@ -15,18 +19,62 @@ Commands:
   storage       Storage Command
   create        Create Command
   vm            VM Command
+  batch         Batch Command
+  snapshot      Snapshot Command
+  events        Events Command
+  doctor        Doctor Command
+  backup        Backup Command
+  rebalance     Rebalance Command
+  completion    Completion Command
+  tasks         Tasks Command
+  reconcile     Reconcile Command
 
 Run 'prox COMMAND --help' for more information on a command.
 """
 
-from inspect import getmembers, isclass
 from docopt import docopt, DocoptExit
 from prox import __version__ as VERSION
+import atexit
+import sys
+
+
+def load_command(command_name):
+    """Return the command class implementing ``command_name``."""
+    from inspect import getmembers, isclass
+    import prox.clis
+    try:
+        module = getattr(prox.clis, command_name)
+        members = getmembers(module, isclass)
+        command_class = [command[1] for command in members
+                   if command[0] != 'Base'][0]
+    except (AttributeError, IndexError):
+        raise DocoptExit("Unknown command: {}".format(command_name))
+    return command_class
+
+
+def report_requests():
+    from prox.libs import login_lib
+    from prox.libs import utils
+    sent, saved = login_lib.request_stats()
+    utils.log_info("API GETs: {} sent, {} saved by coalescing".format(sent, saved))
+
+
+def report_limits():
+    from prox.libs.proxmox.governor import GOVERNOR
+    from tabulate import tabulate
+    rows = GOVERNOR.report()
+    if rows:
+        print(tabulate(rows, headers="keys", tablefmt="grid"), file=sys.stderr)
 
 
 def main():
     """Main CLI entrypoint."""
-    import prox.clis
+    if sys.argv[1:2] == ["__complete"]:
+        # scripts from older versions, keep it free of the command imports
+        from prox.libs import completion_lib
+        completion_lib.main(["complete"] + sys.argv[2:])
+        return
+
     options = docopt(__doc__, version=VERSION, options_first=True)
     command_name = ""
     args = ""
@@ -38,18 +86,23 @@ def main():
     if args is None:
         args = {}
 
-    try:
-        module = getattr(prox.clis, command_name)
-        prox.clis = getmembers(module, isclass)
-        command_class = [command[1] for command in prox.clis
-                   if command[0] != 'Base'][0]
-    except AttributeError as e:
-        print(e)
-        raise DocoptExit()
+    if options.pop('--debug'):
+        atexit.register(report_requests)
+    if options.pop('--profile'):
+        atexit.register(report_limits)
+    caps = [options.pop('--max-reads'), options.pop('--max-writes')]
+    if any(caps):
+        try:
+            caps = [int(i) if i else None for i in caps]
+        except ValueError:
+            raise DocoptExit("--max-reads and --max-writes must be numbers")
+        from prox.libs.proxmox.governor import GOVERNOR
+        GOVERNOR.configure(*caps)
 
+    command_class = load_command(command_name)
     command = command_class(options, args)
     command.execute()
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
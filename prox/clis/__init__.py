@@ -6,3 +6,12 @@ from .storage import *
 from .node import *
 from .vm import *
 from .create import *
+from .batch import *
+from .snapshot import *
+from .events import *
+from .doctor import *
+from .backup import *
+from .rebalance import *
+from .completion import *
+from .tasks import *
+from .reconcile import *
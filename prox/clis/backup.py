@@ -0,0 +1,90 @@
+from prox.clis.base import Base
+from prox.libs import backup_lib
+from prox.libs import clusters_lib
+from prox.libs import task_lib
+from prox.libs import utils
+from tabulate import tabulate
+
+
+def _minute(text):
+    hour, minute = text.split(":")
+    return int(hour) * 60 + int(minute)
+
+
+def _duration(minutes):
+    return "{}:{:02d}".format(minutes // 60, minutes % 60)
+
+
+class Backup(Base):
+    """
+        usage:
+            backup plan [-c LIMIT] [--rate MBPS] [--window WINDOW] [--step MINUTES] [-j JOBS]
+
+        Commands :
+            plan                              Find overlapping backup jobs and propose new start times
+
+        Options:
+        -h --help                             Print usage
+        -c limit --concurrency=LIMIT          Backup jobs allowed at once on one storage [default: 1]
+        --rate MBPS                           Backup throughput in MiB/s, measured from past backups when unset
+        --window WINDOW                       Start times to choose from [default: 20:00-06:00]
+        --step MINUTES                        Minutes between proposed start times [default: 15]
+        -j jobs --jobs=JOBS                   Nodes read at once [default: 8]
+    """
+    def is_read_only(self):
+        return True
+
+    def execute(self):
+        try:
+            limit = int(self.args['--concurrency'])
+            step = int(self.args['--step'])
+            jobs = int(self.args['--jobs'])
+            rate = None
+            if self.args['--rate']:
+                rate = float(self.args['--rate']) * (1 << 20)
+            first, last = self.args['--window'].split("-")
+            window = (_minute(first), _minute(last))
+        except ValueError:
+            utils.log_err("Concurrency, rate, step and jobs must be numbers, window like 20:00-06:00")
+            exit()
+
+        backup_jobs = backup_lib.list_jobs()
+        if not backup_jobs:
+            utils.log_warn("No backup jobs scheduled")
+            exit()
+        guests = clusters_lib.list_resources("vm") or []
+        nodes = sorted(set(i.get('node') for i in guests if i.get('node')))
+        tasks = list()
+        for node, found, error in task_lib.run_parallel(nodes, backup_lib.backup_tasks, jobs):
+            if error:
+                utils.log_warn("No backup history from {}: {}".format(node, error))
+                continue
+            tasks.extend(found)
+
+        entries = backup_lib.plan(backup_jobs, guests, tasks, rate)
+        starts = backup_lib.propose(entries, limit, window, step)
+        before = backup_lib.conflicts(entries, limit)
+        after = backup_lib.conflicts(entries, limit, starts)
+
+        rows = list()
+        for entry in entries:
+            if entry['schedule'] is None:
+                rows.append([entry['id'], entry['storage'], entry['guests'],
+                             _duration(entry['minutes']), entry['text'],
+                             "not understood"])
+                continue
+            days, current = entry['schedule']
+            proposed = starts[entry['id']]
+            rows.append([entry['id'], entry['storage'], entry['guests'],
+                         _duration(entry['minutes']), entry['text'],
+                         "-" if proposed == current else
+                         backup_lib.format_schedule(days, proposed)])
+        headers = ["Job", "Storage", "Guests", "Est.", "Schedule", "Proposed"]
+        print(tabulate(rows, headers=headers, tablefmt='grid'))
+
+        for job, reason in before:
+            print("{} overlaps now, {}".format(job, reason))
+        for job, reason in after:
+            print("{} still overlaps as proposed, {}".format(job, reason))
+        if not before:
+            utils.log_info("No overlapping backup jobs")
@@ -1,4 +1,6 @@
 from docopt import docopt
+from prox.libs import query_lib
+from prox.libs import utils
 
 
 class Base(object):
@@ -13,7 +15,35 @@ class Base(object):
         self.options = options
         self.args = docopt(self.__doc__, argv=command_args)
 
+    def is_read_only(self):
+        """
+        Tell whether the parsed command only reads, from the API or local
+        files. Commands override this for the forms that change nothing,
+        anything else counts as a mutation.
+        """
+        return False
+
+    def is_mutation(self):
+        """
+        Tell whether the parsed command changes cluster or local state.
+
+        Read-only commands may be run concurrently by ``prox batch``,
+        mutations are always run alone and in declared order.
+        """
+        return not self.is_read_only()
+
+    def query(self, records, record_class):
+        """Apply the --where, --sort and --top options to listed records"""
+        try:
+            return query_lib.apply(records, self.args.get('--where'),
+                                   self.args.get('--sort'),
+                                   self.args.get('--top'),
+                                   query_lib.fields(record_class))
+        except query_lib.QueryError as e:
+            utils.log_err(e)
+            exit()
+
     def execute(self):
         """Execute the commands"""
 
-        raise NotImplementedError
\ No newline at end of file
+        raise NotImplementedError
@@ -0,0 +1,55 @@
+from prox.clis.base import Base
+from prox.libs import batch_lib
+from prox.libs import utils
+from prox import cli
+import sys
+
+
+class Batch(Base):
+    """
+        usage:
+            batch [FILE] [-j JOBS] [-k | --keep-going]
+
+        Commands :
+            batch                             Run a file of prox commands
+
+        Arguments:
+            FILE                              Runbook, one command per line (default: stdin)
+
+        Options:
+        -h --help                             Print usage
+        -j jobs --jobs=JOBS                   Concurrent read commands [default: 8]
+        -k --keep-going                       Keep running after a failed mutation
+    """
+    def execute(self):
+        path = self.args['FILE']
+        try:
+            jobs = int(self.args['--jobs'])
+        except ValueError:
+            utils.log_err("Jobs must be a number")
+            exit(1)
+
+        if path and path != "-":
+            try:
+                with open(path) as f:
+                    lines = f.read().splitlines()
+            except IOError as e:
+                utils.log_err(e)
+                exit(1)
+        else:
+            lines = sys.stdin.read().splitlines()
+
+        steps = batch_lib.parse_lines(lines)
+        failed = batch_lib.prepare(steps, cli.load_command)
+        if failed:
+            for step in failed:
+                utils.ndjson(batch_lib.result(step, "invalid", 2,
+                                              log=step['error']))
+            utils.log_err("Batch not started, fix the lines above")
+            exit(2)
+
+        groups = batch_lib.plan(steps)
+        failures = batch_lib.run(groups, jobs, self.args['--keep-going'])
+        if failures:
+            exit(1)
+        exit()
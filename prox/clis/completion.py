@@ -0,0 +1,35 @@
+from prox.clis.base import Base
+from prox.libs import completion_lib
+from prox.libs import utils
+
+
+class Completion(Base):
+    """
+        usage:
+            completion (bash | zsh | fish)
+            completion refresh
+
+        Commands :
+            bash                              Print the bash completion script
+            zsh                               Print the zsh completion script
+            fish                              Print the fish completion script
+            refresh                           Rebuild the local index of names and IDs now
+
+        Options:
+        -h --help                             Print usage
+
+        Enable with e.g. `eval "$(prox completion bash)"` in ~/.bashrc,
+        `prox completion fish > ~/.config/fish/completions/prox.fish`.
+    """
+    def is_read_only(self):
+        return not self.args['refresh']
+
+    def execute(self):
+        if self.args['refresh']:
+            completion_lib.refresh()
+            utils.log_info("Completion index written to " + completion_lib.INDEX_DIR)
+            exit()
+        for shell in ("bash", "zsh", "fish"):
+            if self.args[shell]:
+                print(completion_lib.script(shell), end="")
+        exit()
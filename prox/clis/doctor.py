@@ -0,0 +1,80 @@
+from prox.clis.base import Base
+from prox.libs import clusters_lib
+from prox.libs import doctor_lib
+from prox.libs import utils
+from tabulate import tabulate
+import sys
+import time
+
+EXIT_CODES = {doctor_lib.PASS: 0, doctor_lib.WARN: 1, doctor_lib.FAIL: 2}
+
+
+class Doctor(Base):
+    """
+        usage:
+            doctor [-N NODE]... [-t TIMEOUT] [--hours HOURS] [--json]
+
+        Commands :
+            doctor                            Check the health of every node at once
+
+        Options:
+        -h --help                             Print usage
+        -N node --node=NODE                   Only check these nodes
+        -t timeout --timeout=TIMEOUT          Seconds for the whole sweep [default: 30]
+        --hours HOURS                         Report tasks failed in the last HOURS [default: 24]
+        --json                                Print one JSON object per result
+
+        Exit status is 0 when every check passes, 1 on warnings and 2 on failures.
+    """
+    def is_read_only(self):
+        return True
+
+    def execute(self):
+        try:
+            timeout = float(self.args['--timeout'])
+            hours = float(self.args['--hours'])
+        except ValueError:
+            utils.log_err("Timeout and hours must be numbers")
+            exit()
+
+        nodes = clusters_lib.list_resources("node") or []
+        if self.args['--node']:
+            nodes = [i for i in nodes if i.get('node') in self.args['--node']]
+            if not nodes:
+                utils.log_err("Node not found")
+                exit()
+
+        start = time.time()
+        results = doctor_lib.sweep(nodes, timeout, time.time() - hours * 3600)
+        elapsed = time.time() - start
+        counts, level = doctor_lib.summary(results)
+
+        if self.args['--json']:
+            for i in results:
+                utils.ndjson(i)
+            sys.exit(EXIT_CODES[level])
+
+        cells = {}
+        for i in results:
+            key = (i['node'], i['check'])
+            cells[key] = doctor_lib.worst([cells.get(key, doctor_lib.PASS),
+                                           i['level']])
+        rows = list()
+        for node in sorted(set(i['node'] for i in results)):
+            if (node, "node") in cells:
+                rows.append([node] + ["-"] * len(doctor_lib.CHECKS))
+                continue
+            rows.append([node] + [cells.get((node, check), "-")
+                                  for check in doctor_lib.CHECKS])
+        headers = ["Node", "Services", "Storage", "Load/Mem", "Tasks",
+                   "Interfaces"]
+        print(tabulate(rows, headers=headers, tablefmt='grid'))
+
+        for i in results:
+            if i['level'] != doctor_lib.PASS:
+                print("{} {} {}: {}".format(i['level'].upper(), i['node'],
+                                            i['check'], i['detail']))
+        print("{} pass, {} warn, {} fail in {:.1f}s".format(
+            counts[doctor_lib.PASS], counts[doctor_lib.WARN],
+            counts[doctor_lib.FAIL], elapsed))
+        sys.exit(EXIT_CODES[level])
@@ -0,0 +1,62 @@
+from prox.clis.base import Base
+from prox.libs import clusters_lib
+from prox.libs import events_lib
+from prox.libs import login_lib
+from prox.libs import utils
+import time
+
+
+class Events(Base):
+    """
+        usage:
+            events [-i INTERVAL] [-c CURSOR] [--once] [--replay]
+
+        Commands :
+            events                            Stream cluster changes as ndjson
+
+        Options:
+        -h --help                             Print usage
+        -i interval --interval=INTERVAL       Seconds between polls [default: 10]
+        -c cursor --cursor=CURSOR             Cursor file [default: ~/.prox.events]
+        --once                                Poll once and exit
+        --replay                              Without a cursor, emit the recent tasks too
+    """
+    def execute(self):
+        try:
+            interval = float(self.args['--interval'])
+        except ValueError:
+            utils.log_err("Interval must be a number")
+            exit()
+        path = self.args['--cursor'].replace("~", utils.APP_HOME, 1)
+
+        cursor = events_lib.load_cursor(path)
+        baseline = cursor is None
+        if baseline:
+            cursor = events_lib.new_cursor()
+
+        while True:
+            start = time.time()
+            # every poll must see the cluster as it is now
+            login_lib.forget_requests()
+            try:
+                tasks = clusters_lib.list_tasks()
+                resources = clusters_lib.list_resources()
+            except Exception as e:
+                utils.log_err("Poll failed: {}".format(e))
+            else:
+                events = events_lib.task_events(tasks, cursor)
+                events += events_lib.resource_events(resources, cursor)
+                if baseline and not self.args['--replay']:
+                    # a first run starts from now instead of the history
+                    events = list()
+                now = int(time.time())
+                for event in events:
+                    event['time'] = now
+                    utils.ndjson(event)
+                # the cursor only moves when something happened
+                if events or baseline:
+                    events_lib.save_cursor(cursor, path)
+                baseline = False
+            if self.args['--once']:
+                exit()
+            time.sleep(max(0, interval - (time.time() - start)))
@@ -1,6 +1,6 @@
 from prox.clis.base import Base
+from prox.libs import models
 from prox.libs import network_lib
-from tabulate import tabulate
 from prox.libs import utils
 import os
 
@@ -19,6 +19,9 @@ class Interface(Base):
         -N node --node=NODE                   Get Node
         -I interface --interface=INTERFACE    Get Interface Details
     """
+    def is_read_only(self):
+        return True
+
     def execute(self):
         node = self.args["--node"]
         if not node:
@@ -36,12 +39,12 @@ class Interface(Base):
             utils.log_err("Data Not Found")
             exit()
         detail_interface.append(data)
-        headers = {
-            'exists': "Exists", 
-            'type': 'Type', 
-            'method': 'Method', 
-            'method6': 'Method6', 
-            'priority': "Priority", 
-            'families': "Families"
-        }
-        print(tabulate(detail_interface, headers=headers, tablefmt='grid'))
\ No newline at end of file
+        columns = [
+            ('exists', "Exists"),
+            ('type', 'Type'),
+            ('method', 'Method'),
+            ('method6', 'Method6'),
+            ('priority', "Priority"),
+            ('families', "Families")
+        ]
+        print(models.table(detail_interface, columns))
\ No newline at end of file
@@ -1,6 +1,7 @@
 from prox.clis.base import Base
 from getpass import getpass
 from prox.libs import login_lib
+from prox.libs.proxmox.pyproxmox import split_token
 import os
 
 APP_HOME = login_lib.utils.APP_HOME
@@ -8,41 +9,66 @@ APP_HOME = login_lib.utils.APP_HOME
 class Login(Base): 
     """
         usage:
-            login
+            login [--token]
 
         Commands :
             login                         Build Yaml File
 
         Options:
         -h --help                             Print usage
+        --token                               Log in with an API token (user@realm!tokenid=secret)
+                                              instead of a password, no ticket is fetched
+                                              and the session never expires
     """
+    def ask(self):
+        """Prompt for credentials and write ~/.prox.env"""
+        if self.args['--token']:
+            token = getpass("API Token (user@realm!tokenid=secret): ")
+            try:
+                token_id, _ = split_token(token)
+            except ValueError as e:
+                login_lib.utils.log_err(e)
+                exit()
+            auth_url = input("Host: ")
+            login_lib.create_env_file(token_id.split('!', 1)[0], None,
+                                      auth_url, token=token)
+            return
+        username = input("Username: ")
+        password = getpass("Password: ")
+        auth_url = input("Host: ")
+        login_lib.create_env_file(username, password, auth_url)
+
     def execute(self):
-        env = None
         if os.path.exists(APP_HOME+"/.prox.env"):
             print("Environment Exists Do You remove :")
             checks = login_lib.utils.question("Choose Y/N ")
-            if checks == 'Y' or checks == 'y':
-                username = input("Username: ")
-                password = getpass("Password: ")
-                auth_url = input("Host: ")
+            if checks:
                 os.remove(APP_HOME+"/.prox.env")
-                login_lib.create_env_file(username, password, auth_url)
-            else:
-                env = login_lib.utils.get_env_values()
+                self.ask()
         else:
-            username = input("Username: ")
-            password = getpass("Password: ")
-            auth_url = input("Host: ")
-            login_lib.create_env_file(username, password, auth_url)
-            env = login_lib.utils.get_env_values()
+            self.ask()
+        env = login_lib.utils.get_env_values()
 
-
-        prox = login_lib.connect_proxmox(env['project_url'], env['username'], env['password'])
+        try:
+            prox = login_lib.connect_proxmox(env['project_url'], env['username'],
+                                             env['password'], env['token'])
+        except Exception as e:
+            login_lib.utils.log_err(e)
+            login_lib.utils.log_err("Login Not Success")
+            exit()
 
         # check login
         if login_lib.utils.read_file("/tmp/prox.pkl"):
             os.remove("/tmp/prox.pkl")
         login_lib.dump_session(prox)
-        if not login_lib.check_session():
+        if not env['token'] and not login_lib.check_session():
             login_lib.utils.log_err("Login Not Success")
-        login_lib.utils.log_info("Login Success")
\ No newline at end of file
+        login_lib.utils.log_info("Login Success")
+        try:
+            host = prox.discover()
+        except Exception as e:
+            login_lib.utils.log_warn("Could not learn the cluster members: {}".format(e))
+        else:
+            gateways = prox.gateways()
+            login_lib.utils.log_info("Requests go to {} of {} API endpoints".format(
+                host, len(gateways.hosts)))
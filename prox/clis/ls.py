@@ -1,19 +1,29 @@
 from prox.clis.base import Base
+from prox.libs import agent_lib
 from prox.libs import clusters_lib
 from prox.libs import node_lib
+from prox.libs import models
 from prox.libs import network_lib
+from prox.libs import query_lib
 from prox.libs import utils
-from tabulate import tabulate
 import os
 
+VM_COLUMNS = [
+    ("vmid", "ID VM"),
+    ("name", "VM Name"),
+    ("cpus", "vCPUS"),
+    ("mem", "RAM"),
+    ("status", "Status")
+]
+
 
 class Ls(Base): 
     """
         usage:
             ls cluster [-i | --iface] [-N NODE]
-            ls vm [-n | --next] [-N NODE]
-            ls container [-N NODE]
-            ls storage [-N NODE]
+            ls vm [-n | --next] [-N NODE] [--with-ip] [--where EXPR] [--sort KEYS] [--top N]
+            ls container [-N NODE] [--where EXPR] [--sort KEYS] [--top N]
+            ls storage [-N NODE] [--where EXPR] [--sort KEYS] [--top N]
             
             
 
@@ -26,7 +36,14 @@ class Ls(Base):
         -i --iface                            cluster interface
         -n --next                             vm next
         -N node --node=NODE                   Get Node  default by 'pve'
+        --with-ip                             Add guest agent addresses of running VMs
+        --where EXPR                          Filter rows, e.g. "status==running and mem>8G and name~web*"
+        --sort KEYS                           Sort rows by fields, '-' for descending, e.g. -cpu,name
+        --top N                               Keep the first N rows
     """
+    def is_read_only(self):
+        return True
+
     def execute(self):
         if self.args['cluster']:            
             if self.args['--iface']:
@@ -38,32 +55,24 @@ class Ls(Base):
                 if not data:
                     utils.log_err("Data Not Found")
                     exit()
-                list_interface = list()
-                for i in data:
-                    data_interface = {
-                        "interface": i['iface'],
-                        "type": i['type'],
-                    }
-                    list_interface.append(data_interface)
-
-                headers = {
-                    "interface": "Interface",
-                    "type": "Type",
-                }
-                print(tabulate(list_interface, headers=headers, tablefmt='grid'))
+                columns = [
+                    ("iface", "Interface"),
+                    ("type", "Type"),
+                ]
+                print(models.table(data, columns))
                 exit()
-            headers = {
-                'nodeid': "NODE" , 
-                'ip' : "IP", 
-                'name' : "Name", 
-                "type" : "Type", 
-                "id" : "ID", 
-                "online" : "Online",
-                "level": "Level",
-                "local": "Local"
-            }
+            columns = [
+                ('nodeid', "NODE"),
+                ('ip', "IP"),
+                ('name', "Name"),
+                ("type", "Type"),
+                ("id", "ID"),
+                ("online", "Online"),
+                ("level", "Level"),
+                ("local", "Local")
+            ]
             list_cluster = clusters_lib.list_cluster()["data"]
-            print(tabulate(list_cluster, headers=headers,tablefmt='grid'))
+            print(models.table(list_cluster, columns))
             exit()
 
         if self.args['vm']:
@@ -76,54 +85,19 @@ class Ls(Base):
                 node = self.args["--node"]
             except Exception:
                 node = None
-            if node:
-                data = node_lib.list_vm_by_node(node)
-                if not data:
-                    utils.log_err("Data Not Found")
-                    exit()
-                list_vm = list()
-                for key in data:
-                    data_vm = {
-                        "vmid": key['vmid'],
-                        "name": key['name'],
-                        "cpus": key['cpus'],
-                        "memory": key['mem'],
-                        "status": key['status']
-                    }
-                    list_vm.append(data_vm)
-                headers = {
-                    "vmid": "ID VM",
-                    "name": "VM Name",
-                    "cpus": "vCPUS",
-                    "memory": "RAM",
-                    "status": "Status"
-                }
-                print(tabulate(list_vm, headers=headers, tablefmt='grid'))
-                exit()
-            
-            utils.log_warn("Using default node : pve ")
-            data = node_lib.list_vm_by_node("pve")
+            if not node:
+                utils.log_warn("Using default node : pve ")
+                node = "pve"
+            data = node_lib.list_vm_by_node(node)
             if not data:
                 utils.log_err("Data Not Found")
                 exit()
-            list_vm = list()
-            for key in data:
-                data_vm = {
-                    "vmid": key['vmid'],
-                    "name": key['name'],
-                    "cpus": key['cpus'],
-                    "memory": key['mem'],
-                    "status": key['status']
-                }
-                list_vm.append(data_vm)
-            headers = {
-                "vmid": "ID VM",
-                "name": "VM Name",
-                "cpus": "vCPUS",
-                "memory": "RAM",
-                "status": "Status"
-            }
-            print(tabulate(list_vm, headers=headers, tablefmt='grid'))
+            if self.args['--with-ip']:
+                data = self.query_with_ip(data, node)
+                print(models.table(data, VM_COLUMNS + [("ip", "IP")]))
+                exit()
+            data = self.query(data, models.Guest)
+            print(models.table(data, VM_COLUMNS))
             exit()
 
         if self.args['container']:
@@ -131,18 +105,16 @@ class Ls(Base):
                 node = self.args["--node"]
             except Exception:
                 node = None
-            if node:
-                data = node_lib.list_container_by_node("pve")
-                if not data:
-                    utils.log_err("Data Not Found")
-                    exit()
-                print("WIP: Not Data In Testing")
-                exit()
-            data = node_lib.list_container_by_node("pve")
+            if not node:
+                utils.log_warn("Using default node : pve ")
+                node = "pve"
+            data = node_lib.list_container_by_node(node)
             if not data:
                 utils.log_err("Data Not Found")
                 exit()
-            print("WIP: Not Data In Testing")
+            data = self.query(data, models.Guest)
+            print(models.table(data, VM_COLUMNS))
+            exit()
 
         if self.args['storage']:
             node = self.args['--node']
@@ -153,24 +125,43 @@ class Ls(Base):
             if not data:
                 utils.log_err("Data Not Found")
                 exit()
-            list_storage = list()
-            for i in data:
-                storage={
-                    "storage": i['storage'],
-                    "total": i["total"],
-                    "used": i["used"],
-                    "avail": i['avail']
-                }
-                list_storage.append(storage)
-            headers = {
-                "storage": "Name Storage",
-                "total": "Total",
-                "used": "Used",
-                "avail": "Available"
-            }
-            print(tabulate(list_storage, headers=headers, tablefmt='grid'))
+            data = self.query(data, models.Storage)
+            columns = [
+                ("storage", "Name Storage"),
+                ("total", "Total"),
+                ("used", "Used"),
+                ("avail", "Available")
+            ]
+            print(models.table(data, columns))
+            exit()
+
+    def query_with_ip(self, guests, node):
+        """
+        Apply the query, asking agents only about the rows it keeps. Terms
+        of --where on ip, and the sort and top with them when they need it,
+        run once the addresses are in.
+        """
+        where, sort = self.args['--where'], self.args['--sort']
+        top = self.args['--top']
+        known = query_lib.fields(models.Guest)
+        try:
+            test, later = query_lib.split_where(where, ("ip",), known) \
+                if where else (None, None)
+            sorts_ip = "ip" in [i.strip().lstrip("+-") for i in (sort or "").split(",")]
+            if later is None and not sorts_ip:
+                guests = list(query_lib.apply(guests, test, sort, top, known))
+                self.with_ip(guests, node)
+                return guests
+            guests = list(query_lib.apply(guests, test, known=known))
+            self.with_ip(guests, node)
+            return query_lib.apply(guests, later, sort, top, known)
+        except query_lib.QueryError as e:
+            utils.log_err(e)
             exit()
-            
 
-        
-            
\ No newline at end of file
+    def with_ip(self, guests, node):
+        """Fill the ip field of listed VMs from their agents"""
+        vms = [{"vmid": i.vmid, "node": node, "status": i.status} for i in guests]
+        for guest, (vm, result, error) in zip(guests, agent_lib.query_many(
+                vms, agent_lib.COMMANDS['ip'])):
+            guest.ip = ", ".join(agent_lib.addresses(result)) if result else None
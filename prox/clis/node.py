@@ -1,19 +1,36 @@
 from prox.clis.base import Base
+from prox.libs import clusters_lib
+from prox.libs import hotspots_lib
+from prox.libs import migration_lib
+from prox.libs import models
 from prox.libs import node_lib
+from prox.libs import task_lib
+from prox.libs import vm_lib
 from tabulate import tabulate
 from prox.libs import utils
 import os
+import time
+
+TASK_COLUMNS = [
+    ('pstart', 'PStart'),
+    ('target', 'ID'),
+    ('type', 'Type'),
+    ('pid', "PID"),
+    ('status', 'Status')
+]
 
 
 class Node(Base): 
     """
         usage:
-            node task [-N NODE] [-i VMID]
+            node task [-N NODE] [-i VMID] [--where EXPR] [--sort KEYS] [--top N] [--limit N] [--stream]
             node dns [-N NODE]
             node status [-N NODE] [-a ACTION]
-            node log
+            node log [-N NODE] [--limit N] [--stream]
             node rrd [-a ACTION]
             node beans          
+            node hotspots [-N NODE] [-w WINDOW] [--top N] [-j JOBS]
+            node evacuate [-N NODE] [-T TARGETS] [-j JOBS] [--per-target N] [-b BWLIMIT] [--with-local-disks] [--running-only] [--dry-run] [-t TIMEOUT]
 
         Commands :
             task                              Task Command
@@ -22,6 +39,8 @@ class Node(Base):
             log                               Node Log Data
             rrd
             beans
+            evacuate                          Migrate every VM and container off a node
+            hotspots                          Guests behind the node's CPU, disk and net peaks
 
         Options:
         -h --help                             Print usage
@@ -29,13 +48,56 @@ class Node(Base):
         -i vmid --vmid=VMID                   Get VM
         -a action --action=ACTION             Get Status
         -p path --path=PATH                   Get PATH
+        -T targets --targets=TARGETS          Evacuate only to these nodes, e.g. pve2,pve3
+        -j jobs --jobs=JOBS                   Migrations or API calls at once, 4 for evacuate and 8 for hotspots
+        --per-target N                        Migrations at once into one node [default: 2]
+        -b bwlimit --bwlimit=BWLIMIT          Bandwidth limit per migration in MiB/s
+        --with-local-disks                    Migrate local disks too
+        --running-only                        Leave stopped VMs on the node
+        --dry-run                             Only show the migration plan
+        -t timeout --timeout=TIMEOUT          Seconds to wait for one migration [default: 3600]
+        --where EXPR                          Filter rows, e.g. "status==running and mem>8G and name~web*"
+        --sort KEYS                           Sort rows by fields, '-' for descending, e.g. -cpu,name
+        --top N                               Keep the first N rows
+        --limit N                             Rows to fetch, the API default is 50
+        --stream                              Print rows while they arrive
+        -w window --window=WINDOW             History to look at, e.g. 30m, 1h, 1d [default: 1h]
     """
+    def is_read_only(self):
+        return not self.args['evacuate'] or self.args['--dry-run']
+
     def execute(self):
+        if self.args['evacuate']:
+            self.evacuate()
+        if self.args['hotspots']:
+            self.hotspots()
+
         node = self.args["--node"]
         if not node:
             utils.log_info("Using Default Node : pve")
             node = "pve"
 
+        limit = self.args['--limit']
+        if limit:
+            try:
+                limit = int(limit)
+            except ValueError:
+                utils.log_err("Limit must be a number")
+                exit()
+
+        if self.args['task'] and (self.args['--stream'] or limit):
+            task_list = node_lib.iter_finish_task(node, limit)
+            vmid = self.args['--vmid']
+            if vmid:
+                task_list = (i for i in task_list if i.id == vmid)
+            task_list = self.query(task_list, models.Task)
+            if self.args['--stream']:
+                for i in task_list:
+                    utils.ndjson(i.as_dict())
+                exit()
+            print(models.table(task_list, TASK_COLUMNS))
+            exit()
+
         if self.args['task']:
             task_data = node_lib.get_finish_task(node)
             if not task_data:
@@ -44,58 +106,12 @@ class Node(Base):
             
             total_task = task_data['total']
             utils.log_info("Total: "+str(total_task))
-            task_list = list()
+            task_list = task_data['data']
             vmid = self.args['--vmid']
             if vmid:
-                for i in task_data['data']:
-                    if i['id'] == vmid:
-                        id = None
-                        if i['id'] == "":
-                            id = "master"
-                        else:
-                            id = i['id']
-
-                        data = {
-                            'id': id,
-                            'type': i['type'],
-                            'pstart': i['pstart'],
-                            'pid': i['pid'], 
-                            'status': i['status']
-                        }
-                        task_list.append(data)
-                headers = {
-                    'pstart': 'PStart',
-                    'id': 'ID', 
-                    'type': 'Type',
-                    'pid': "PID", 
-                    'status': 'Status'
-                }
-                print(tabulate(task_list, headers=headers, tablefmt='grid'))
-                exit()
-
-            for i in task_data['data']:
-                id = None
-                if i['id'] == "":
-                    id = "master"
-                else:
-                    id = i['id']
-
-                data = {
-                    'id': id,
-                    'type': i['type'],
-                    'pstart': i['pstart'],
-                    'pid': i['pid'], 
-                    'status': i['status']
-                }
-                task_list.append(data)
-            headers = {
-                'pstart': 'PStart',
-                'id': 'ID', 
-                'type': 'Type',
-                'pid': "PID", 
-                'status': 'Status'
-            }
-            print(tabulate(task_list, headers=headers, tablefmt='grid'))
+                task_list = [i for i in task_list if i.id == vmid]
+            task_list = self.query(task_list, models.Task)
+            print(models.table(task_list, TASK_COLUMNS))
             exit()
         
         if self.args['dns']:
@@ -137,19 +153,13 @@ class Node(Base):
             exit()
 
         if self.args['log']:
-            data = node_lib.get_node_syslog(node)
-            list_log = list()
-            for i in data:
-                data_log = {
-                    "row": i['n'],
-                    "desc": i['t']
-                }
-                list_log.append(data_log)
-            headers = {
-                    "row": "No",
-                    "desc": "Description"
-                }
-            print(tabulate(list_log, headers=headers ,tablefmt='grid'))
+            data = node_lib.iter_node_syslog(node, limit)
+            if self.args['--stream']:
+                for i in data:
+                    print("{} {}".format(i['n'], i['t']), flush=True)
+                exit()
+            list_log = [[i['n'], i['t']] for i in data]
+            print(tabulate(list_log, headers=["No", "Description"], tablefmt='grid'))
             exit()
 
         if self.args['rrd']:
@@ -167,5 +177,156 @@ class Node(Base):
             print("Testing")
             exit()
 
+    def hotspots(self):
+        node = self.args["--node"]
+        if not node:
+            utils.log_info("Using Default Node : pve")
+            node = "pve"
+        try:
+            window = hotspots_lib.parse_window(self.args['--window'])
+            top = int(self.args['--top'] or 5)
+            # RRD reads are light, more of them at once than migrations
+            jobs = int(self.args['--jobs'] or 8)
+        except ValueError as e:
+            utils.log_err(e)
+            exit()
 
-        
+        frame = hotspots_lib.timeframe(window)
+        guests = [i for i in clusters_lib.list_resources("vm") or []
+                  if i.get('node') == node and not i.get('template')]
+        # the node series is read along with the guests
+        items = [None] + guests
+        fetched = task_lib.run_parallel(
+            items,
+            lambda i: hotspots_lib.node_history(node, frame) if i is None
+            else hotspots_lib.guest_history(i, frame),
+            jobs)
+        node_rows = list()
+        found = list()
+        rows = list()
+        for item, data, error in fetched:
+            if error:
+                what = "node" if item is None else item['vmid']
+                utils.log_warn("No history for {}: {}".format(what, error))
+                continue
+            if item is None:
+                node_rows = data
+            else:
+                found.append(item)
+                rows.append(data)
+        if not node_rows:
+            utils.log_err("No history for node {}".format(node))
+            exit()
+
+        ranking = hotspots_lib.rank(node_rows, found, rows, window, top)
+        names = {"cpu": "CPU", "disk": "Disk I/O", "net": "Network"}
+        for resource in hotspots_lib.RESOURCES:
+            list_rank = [[
+                i['vmid'], i['name'], i['type'],
+                "{:.0%}".format(i['peak']), "{:.0%}".format(i['share']),
+                "{:.2f}".format(i['corr'])
+            ] for i in ranking[resource]]
+            print(names[resource])
+            print(tabulate(list_rank, headers=["ID", "Name", "Type", "Peak share",
+                                               "Share", "Correlation"],
+                           tablefmt='grid'))
+        exit()
+
+    def evacuate(self):
+        source = self.args["--node"]
+        if not source:
+            utils.log_err("Set the node to evacuate : -N NODE")
+            exit()
+        try:
+            jobs = int(self.args['--jobs'] or 4)
+            per_target = int(self.args['--per-target'])
+            timeout = float(self.args['--timeout'])
+            bwlimit = None
+            if self.args['--bwlimit']:
+                bwlimit = int(float(self.args['--bwlimit']) * 1024)
+        except ValueError:
+            utils.log_err("Jobs, limits, bandwidth and timeout must be numbers")
+            exit()
+        targets = None
+        if self.args['--targets']:
+            targets = self.args['--targets'].split(",")
+
+        status = None
+        if self.args['--running-only']:
+            status = "running"
+        # templates move offline and containers with a restart, a node
+        # holding either cannot go down
+        vms = vm_lib.select_vms(node=source, status=status, templates=True,
+                                types=("qemu", "lxc"))
+        if not vms:
+            utils.log_info("Nothing to migrate on " + source)
+            exit()
+        nodes = clusters_lib.list_resources("node")
+        moves, unplaced = migration_lib.plan_evacuation(vms, nodes, source,
+                                                        targets)
+        for vm in unplaced:
+            utils.log_err("No node has room for {} ({})".format(
+                vm['vmid'], vm.get('name')))
+
+        if self.args['--dry-run']:
+            list_plan = list()
+            for vm, target in moves:
+                list_plan.append({
+                    "vmid": vm['vmid'],
+                    "name": vm.get('name'),
+                    "type": vm.get('type'),
+                    "status": "template" if vm.get('template') else vm.get('status'),
+                    "memory": vm.get('maxmem'),
+                    "target": target
+                })
+            headers = {
+                "vmid": "ID VM",
+                "name": "VM Name",
+                "type": "Type",
+                "status": "Status",
+                "memory": "RAM",
+                "target": "Target"
+            }
+            print(tabulate(list_plan, headers=headers, tablefmt='grid'))
+            exit()
+
+        utils.log_info("Migrating {} guests off {}".format(len(moves), source))
+        start = time.time()
+        results = task_lib.run_parallel(
+            moves,
+            lambda move: migration_lib.migrate_and_wait(
+                move[0], move[1], bwlimit, self.args['--with-local-disks'],
+                timeout),
+            jobs, {"target": per_target},
+            lambda move: {"target": move[1]})
+
+        list_result = list()
+        failed = len(unplaced)
+        for (vm, target), done, error in results:
+            state = "OK"
+            if error:
+                failed += 1
+                state = "Failed: {}".format(error)
+            done = done or {}
+            list_result.append({
+                "vmid": vm['vmid'],
+                "name": vm.get('name'),
+                "target": target,
+                "status": state,
+                "duration": round(done.get('duration', 0), 1),
+                "downtime": done.get('downtime')
+            })
+        headers = {
+            "vmid": "ID VM",
+            "name": "VM Name",
+            "target": "Target",
+            "status": "Status",
+            "duration": "Duration (s)",
+            "downtime": "Downtime (ms)"
+        }
+        print(tabulate(list_result, headers=headers, tablefmt='grid'))
+        utils.log_info("Evacuation took {:.1f}s".format(time.time() - start))
+        if failed:
+            utils.log_err("{} guests are still on {}".format(failed, source))
+            exit(1)
+        exit()
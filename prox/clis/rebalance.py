@@ -0,0 +1,117 @@
+from prox.clis.base import Base
+from prox.libs import clusters_lib
+from prox.libs import hotspots_lib
+from prox.libs import migration_lib
+from prox.libs import rebalance_lib
+from prox.libs import task_lib
+from prox.libs import utils
+from prox.libs import vm_lib
+from tabulate import tabulate
+import time
+
+GiB = float(1 << 30)
+
+
+class Rebalance(Base):
+    """
+        usage:
+            rebalance [-s SPREAD] [--max-moves N] [-w WINDOW] [--pin VMIDS] [--anti-affinity PREFIX] [--reserve PCT] [--execute] [-j JOBS] [--per-node N] [-b BWLIMIT] [-t TIMEOUT]
+
+        Commands :
+            rebalance                         Plan migrations evening out node CPU and memory load
+
+        Options:
+        -h --help                             Print usage
+        -s spread --spread=SPREAD             Largest accepted load gap between nodes, in percent [default: 10]
+        --max-moves N                         Stop the plan after N migrations
+        -w window --window=WINDOW             Also weigh the average load over this RRD window, e.g. 1h, 1d
+        --pin VMIDS                           Never move these VMs, e.g. 100,105-110 (the 'pin' tag does the same)
+        --anti-affinity PREFIX                VMs sharing a tag with this prefix stay apart [default: aa-]
+        --reserve PCT                         Memory kept free on a target node, in percent [default: 10]
+        --execute                             Run the migrations, the default only prints the plan
+        -j jobs --jobs=JOBS                   Migrations at once [default: 4]
+        --per-node N                          Migrations at once into or out of one node [default: 1]
+        -b bwlimit --bwlimit=BWLIMIT          Bandwidth limit per migration in MiB/s
+        -t timeout --timeout=TIMEOUT          Seconds to wait for one migration [default: 3600]
+    """
+    def is_read_only(self):
+        return not self.args['--execute']
+
+    def execute(self):
+        try:
+            spread = float(self.args['--spread']) / 100
+            reserve = float(self.args['--reserve']) / 100
+            max_moves = None
+            if self.args['--max-moves']:
+                max_moves = int(self.args['--max-moves'])
+            jobs = int(self.args['--jobs'])
+            per_node = int(self.args['--per-node'])
+            timeout = float(self.args['--timeout'])
+            bwlimit = None
+            if self.args['--bwlimit']:
+                bwlimit = int(float(self.args['--bwlimit']) * 1024)
+            window = None
+            if self.args['--window']:
+                window = hotspots_lib.parse_window(self.args['--window'])
+            pinned = vm_lib.parse_vmids(self.args['--pin']) if self.args['--pin'] else None
+        except ValueError as e:
+            utils.log_err("Bad option value: {}".format(e))
+            exit()
+
+        nodes = clusters_lib.list_resources("node") or []
+        guests = clusters_lib.list_resources("vm") or []
+        loads = None
+        if window:
+            frame = hotspots_lib.timeframe(window)
+            running = [i for i in guests if i.get('status') == "running"]
+            loads = {}
+            for guest, rows, error in task_lib.run_parallel(
+                    running, lambda i: hotspots_lib.guest_history(i, frame), 16):
+                if error:
+                    utils.log_warn("No history for {}: {}".format(guest['vmid'], error))
+                    continue
+                loads[guest['vmid']] = rebalance_lib.history_load(guest, rows, window)
+
+        start = time.time()
+        cluster = rebalance_lib.Cluster(nodes, guests, loads, pinned,
+                                        self.args['--anti-affinity'], reserve)
+        before = cluster.spreads()
+        moves = rebalance_lib.plan(cluster, spread, max_moves)
+        after = cluster.spreads()
+        utils.log_info("Planned {} migrations in {:.2f}s".format(
+            len(moves), time.time() - start))
+
+        list_plan = list()
+        for number, (vm, source, target, waits) in enumerate(moves, 1):
+            list_plan.append([number, vm['vmid'], vm.get('name'), source, target,
+                              "{:.1f}".format((vm.get('mem') or 0) / GiB),
+                              ", ".join(str(i + 1) for i in waits)])
+        print(tabulate(list_plan, headers=["#", "ID VM", "VM Name", "From", "To",
+                                           "Mem GiB", "After"], tablefmt='grid'))
+        print("CPU spread {:.0%} -> {:.0%}, memory spread {:.0%} -> {:.0%}".format(
+            before[0], after[0], before[1], after[1]))
+        if after[0] > spread or after[1] > spread:
+            utils.log_warn("Spread target of {:.0%} not reached".format(spread))
+
+        if not self.args['--execute'] or not moves:
+            exit()
+
+        utils.log_info("Migrating {} VMs".format(len(moves)))
+        results = task_lib.run_parallel(
+            moves,
+            lambda move: migration_lib.migrate_and_wait(move[0], move[2], bwlimit,
+                                                        timeout=timeout),
+            jobs, {"node": per_node},
+            lambda move: {"node": [move[1], move[2]]},
+            # a move into memory freed by earlier moves waits for them
+            lambda move: move[3])
+        failed = 0
+        for (vm, source, target, waits), done, error in results:
+            if error:
+                failed += 1
+                utils.log_err("{} to {} failed: {}".format(vm['vmid'], target, error))
+        if failed:
+            utils.log_err("{} of {} migrations failed".format(failed, len(moves)))
+            exit(1)
+        utils.log_info("Rebalanced with {} migrations".format(len(moves)))
+        exit()
@@ -0,0 +1,124 @@
+from prox.clis.base import Base
+from prox.libs import clusters_lib
+from prox.libs import login_lib
+from prox.libs import reconcile_lib
+from prox.libs import task_lib
+from prox.libs import utils
+from tabulate import tabulate
+import datetime
+import time
+
+
+class Reconcile(Base):
+    """
+        usage:
+            reconcile -f FILE [-i INTERVAL] [-j JOBS] [--per-node N] [--shutdown-timeout SEC] [--force-stop] [--timeout SEC] [--once] [--dry-run]
+
+        Commands :
+            reconcile                         Keep guests running or stopped as a state file declares
+
+        Options:
+        -h --help                             Print usage
+        -f file --file=FILE                   State file, YAML
+        -i interval --interval=INTERVAL       Seconds between cycles [default: 60]
+        -j jobs --jobs=JOBS                   Start and shutdown calls at once [default: 8]
+        --per-node N                          Unsettled actions per node [default: 4]
+        --shutdown-timeout SEC                Seconds a guest gets to shut down [default: 180]
+        --force-stop                          Stop guests that do not shut down in time
+        --timeout SEC                         Seconds before an action counts as failed [default: 300]
+        --once                                Run one cycle and exit, e.g. from cron
+        --dry-run                             Only print what the first cycle would do
+    """
+    def is_read_only(self):
+        return self.args['--dry-run']
+
+    def execute(self):
+        try:
+            interval = float(self.args['--interval'])
+            jobs = int(self.args['--jobs'])
+            per_node = int(self.args['--per-node'])
+            shutdown_timeout = int(self.args['--shutdown-timeout'])
+            timeout = float(self.args['--timeout'])
+        except ValueError:
+            utils.log_err("Interval, jobs, per-node and timeouts must be numbers")
+            exit()
+        try:
+            rules = reconcile_lib.load_states(self.args['--file'])
+        except (IOError, ValueError) as e:
+            utils.log_err(e)
+            exit()
+
+        pending = {}
+        while True:
+            start = time.time()
+            # the one read of the cycle must see the cluster as it is now
+            login_lib.forget_requests()
+            try:
+                guests = clusters_lib.list_resources("vm")
+            except Exception as e:
+                utils.log_err("Listing failed: {}".format(e))
+            else:
+                self.cycle(guests or [], rules, pending, jobs, per_node,
+                           shutdown_timeout, timeout)
+            if self.args['--once'] or self.args['--dry-run']:
+                exit()
+            time.sleep(max(0, interval - (time.time() - start)))
+
+    def cycle(self, guests, rules, pending, jobs, per_node, shutdown_timeout,
+              timeout):
+        now = time.time()
+        for action, outcome in reconcile_lib.settle(pending, guests, now, timeout):
+            if outcome == "done":
+                utils.log_info("{} {} ({}) done in {:.0f}s".format(
+                    action['action'], action['vmid'], action['name'],
+                    now - action['since']))
+            elif outcome == "gone":
+                utils.log_warn("{} {} ({}): guest is gone".format(
+                    action['action'], action['vmid'], action['name']))
+            else:
+                # the only extra read, for actions that did not settle
+                try:
+                    status = reconcile_lib.task_outcome(action)
+                except Exception as e:
+                    status = e
+                utils.log_err("{} {} ({}) not settled after {:.0f}s: {}".format(
+                    action['action'], action['vmid'], action['name'],
+                    now - action['since'], status))
+
+        states = reconcile_lib.desired_states(guests, rules,
+                                              datetime.datetime.now())
+        actions, deferred = reconcile_lib.plan(states, pending, per_node)
+        if self.args['--dry-run']:
+            rows = [[i['vmid'], i['name'], i['node'], i['action'],
+                     "deferred" if i in deferred else ""]
+                    for i in actions + deferred]
+            if rows:
+                print(tabulate(rows, headers=["ID VM", "VM Name", "Node",
+                                              "Action", "Note"],
+                               tablefmt='grid'))
+            utils.log_info("{} guests to correct, {} in shape".format(
+                len(actions) + len(deferred),
+                len(states) - len(actions) - len(deferred)))
+            return
+        if not actions:
+            return
+
+        force = self.args['--force-stop']
+        results = task_lib.run_parallel(
+            actions,
+            lambda i: reconcile_lib.act(i, shutdown_timeout, force),
+            jobs)
+        for action, upid, error in results:
+            if error:
+                utils.log_err("{} {} ({}) failed: {}".format(
+                    action['action'], action['vmid'], action['name'], error))
+                continue
+            action['upid'] = upid
+            action['since'] = time.time()
+            pending[action['vmid']] = action
+            utils.log_info("{} {} ({}) on {}".format(
+                action['action'], action['vmid'], action['name'],
+                action['node']))
+        if deferred:
+            utils.log_info("{} actions deferred, nodes are at --per-node".format(
+                len(deferred)))
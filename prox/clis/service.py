@@ -1,14 +1,18 @@
 from prox.clis.base import Base
 from prox.libs import clusters_lib
-from tabulate import tabulate
+from prox.libs import models
 from prox.libs import utils
 import os
 
+SERVICE_COLUMNS = [
+    ("name", "Service Name")
+]
+
 
 class Service(Base): 
     """
         usage:
-            service [-N NODE]
+            service [-N NODE] [--where EXPR] [--sort KEYS] [--top N]
             service detail [-N NODE] [-s SERVICE]
             service start [-N NODE] [-s SERVICE]
             
@@ -21,7 +25,13 @@ class Service(Base):
         -h --help                             Print usage
         -N node --node=NODE                   Get Node
         -s service --service=SERVICE          Get Node
+        --where EXPR                          Filter rows, e.g. "status==running and mem>8G and name~web*"
+        --sort KEYS                           Sort rows by fields, '-' for descending, e.g. -cpu,name
+        --top N                               Keep the first N rows
     """
+    def is_read_only(self):
+        return not self.args['start']
+
     def execute(self):
         if self.args['detail']:
             node = self.args["--node"]
@@ -42,13 +52,13 @@ class Service(Base):
                 exit()
             
             list_details.append(data)
-            headers = {
-                'desc': 'Description', 
-                'name': 'Service Name', 
-                'state': 'Status',
-                'service': 'sshd'
-            }
-            print(tabulate(list_details, headers=headers, tablefmt='grid'))
+            columns = [
+                ('desc', 'Description'),
+                ('name', 'Service Name'),
+                ('state', 'Status'),
+                ('service', 'Service')
+            ]
+            print(models.table(list_details, columns))
             exit()
             
         try:
@@ -61,30 +71,14 @@ class Service(Base):
             if not data:
                 utils.log_err("Data Not Found")
                 exit()
-            list_service = list()
-            for i in data:
-                data_service = {
-                    "name": i['name']
-                }
-                list_service.append(data_service)
-            headers = {
-                "name": "Service Name"
-            }
-            print(tabulate(list_service, headers=headers, tablefmt='grid'))
+            data = self.query(data, models.Service)
+            print(models.table(data, SERVICE_COLUMNS))
             exit()
         utils.log_warn("Using Default Node : pve")
         data = clusters_lib.cluster_service("pve")
         if not data:
             utils.log_err("Data Not Found")
             exit()
-        list_service = list()
-        for i in data:
-            data_service = {
-                "name": i['name']
-            }
-            list_service.append(data_service)
-        headers = {
-            "name": "Service Name"
-        }
-        print(tabulate(list_service, headers=headers,tablefmt='grid'))
+        data = self.query(data, models.Service)
+        print(models.table(data, SERVICE_COLUMNS))
         exit()
@@ -0,0 +1,194 @@
+from prox.clis.base import Base
+from prox.libs import snapshot_lib
+from prox.libs import task_lib
+from prox.libs import vm_lib
+from tabulate import tabulate
+from prox.libs import utils
+import time
+
+
+class Snapshot(Base):
+    """
+        usage:
+            snapshot ls [-A | --all] [-N NODE] [-i VMID] [-m NAME] [-p PREFIX]
+            snapshot create [-A | --all] [-N NODE] [-i VMID] [-m NAME] [-p PREFIX] [-d DESC] [--vmstate] [-j JOBS] [--per-node N] [--per-storage N] [-t TIMEOUT]
+            snapshot rollback [-A | --all] [-N NODE] [-i VMID] [-m NAME] [-p PREFIX] [-s SNAPNAME] [-j JOBS] [--per-node N] [--per-storage N] [-t TIMEOUT]
+            snapshot prune [-A | --all] [-N NODE] [-i VMID] [-m NAME] [-p PREFIX] [--keep-last N] [--keep-daily N] [--dry-run] [-j JOBS] [--per-node N] [--per-storage N] [-t TIMEOUT]
+
+        Commands :
+            ls                                List snapshots made by prox
+            create                            Snapshot every selected VM
+            rollback                          Rollback to SNAPNAME or the newest prox snapshot
+            prune                             Delete prox snapshots outside the retention policy
+
+        Options:
+        -h --help                             Print usage
+        -A --all                              Select every VM of the cluster
+        -N node --node=NODE                   Select VMs on NODE
+        -i vmid --vmid=VMID                   Select VMs by id, e.g. 100,105-110
+        -m name --name=NAME                   Select VMs by name glob, e.g. 'web*'
+        -p prefix --prefix=PREFIX             Snapshot name prefix [default: prox]
+        -d desc --description=DESC            Snapshot description
+        -s snapname --snapname=SNAPNAME       Snapshot to rollback to
+        --vmstate                             Save the VM RAM too
+        --keep-last N                         Keep the newest N snapshots [default: 0]
+        --keep-daily N                        Keep one snapshot for each of the last N days [default: 0]
+        --dry-run                             Only show what prune would delete
+        -j jobs --jobs=JOBS                   VMs handled at once [default: 8]
+        --per-node N                          VMs handled at once on one node [default: 2]
+        --per-storage N                       VMs handled at once on one storage [default: 1]
+        -t timeout --timeout=TIMEOUT          Seconds to wait for one task [default: 600]
+    """
+    def is_read_only(self):
+        return self.args['ls'] or \
+            (self.args['prune'] and self.args['--dry-run'])
+
+    def execute(self):
+        if not (self.args['--all'] or self.args['--node']
+                or self.args['--vmid'] or self.args['--name']):
+            utils.log_err("Select VMs with -A, -N, -i or -m")
+            exit()
+
+        try:
+            jobs = int(self.args['--jobs'])
+            limits = {
+                "node": int(self.args['--per-node']),
+                "storage": int(self.args['--per-storage'])
+            }
+            timeout = float(self.args['--timeout'])
+            keep_last = int(self.args['--keep-last'])
+            keep_daily = int(self.args['--keep-daily'])
+        except ValueError:
+            utils.log_err("Jobs, limits, timeout and keep values must be numbers")
+            exit()
+
+        vms = vm_lib.select_vms(self.args['--vmid'], self.args['--node'],
+                                self.args['--name'])
+        if not vms:
+            utils.log_err("Data Not Found")
+            exit()
+        prefix = self.args['--prefix']
+
+        if self.args['ls']:
+            results = task_lib.run_parallel(
+                vms, lambda vm: snapshot_lib.owned(
+                    snapshot_lib.list_snapshots(vm['node'], vm['vmid']),
+                    prefix), jobs)
+            list_snapshot = list()
+            for vm, snapshots, error in results:
+                for i in snapshots or []:
+                    list_snapshot.append({
+                        "vmid": vm['vmid'],
+                        "name": vm.get('name'),
+                        "node": vm['node'],
+                        "snapshot": i['name'],
+                        "time": time.strftime(
+                            "%Y-%m-%d %H:%M:%S",
+                            time.localtime(i.get('snaptime', 0)))
+                    })
+                if error:
+                    utils.log_err("{}: {}".format(vm['vmid'], error))
+            headers = {
+                "vmid": "ID VM",
+                "name": "VM Name",
+                "node": "Node",
+                "snapshot": "Snapshot",
+                "time": "Created"
+            }
+            print(tabulate(list_snapshot, headers=headers, tablefmt='grid'))
+            exit()
+
+        if limits['storage']:
+            # disks decide which storages a snapshot job keeps busy
+            configs = task_lib.run_parallel(
+                vms, lambda vm: vm_lib.get_vm_config(vm['node'], vm['vmid']),
+                jobs)
+            for vm, config, error in configs:
+                vm['storages'] = vm_lib.vm_storages(config)
+
+        def wait(vm, upid):
+            task_lib.wait_task(upid, vm['node'], timeout)
+
+        if self.args['create']:
+            snapname = snapshot_lib.snapshot_name(prefix)
+
+            def job(vm):
+                wait(vm, snapshot_lib.create_snapshot(
+                    vm['node'], vm['vmid'], snapname,
+                    self.args['--description'], self.args['--vmstate']))
+                return [snapname]
+
+        if self.args['rollback']:
+            def job(vm):
+                snapname = self.args['--snapname']
+                if not snapname:
+                    snapshots = snapshot_lib.owned(
+                        snapshot_lib.list_snapshots(vm['node'], vm['vmid']),
+                        prefix)
+                    if not snapshots:
+                        raise task_lib.TaskError("no snapshot to rollback")
+                    snapname = snapshots[0]['name']
+                wait(vm, snapshot_lib.rollback_snapshot(
+                    vm['node'], vm['vmid'], snapname))
+                return [snapname]
+
+        if self.args['prune']:
+            if not keep_last and not keep_daily:
+                utils.log_err("Set --keep-last and/or --keep-daily")
+                exit()
+
+            def job(vm):
+                snapshots = snapshot_lib.owned(
+                    snapshot_lib.list_snapshots(vm['node'], vm['vmid']),
+                    prefix)
+                keep, remove = snapshot_lib.retention(snapshots, keep_last,
+                                                      keep_daily)
+                removed = list()
+                for i in reversed(remove):
+                    # oldest first keeps the chain short while we work
+                    if not self.args['--dry-run']:
+                        wait(vm, snapshot_lib.delete_snapshot(
+                            vm['node'], vm['vmid'], i['name']))
+                    removed.append(i['name'])
+                return removed
+
+        def timed(vm):
+            start = time.time()
+            names = job(vm)
+            return names, time.time() - start
+
+        results = task_lib.run_parallel(
+            vms, timed, jobs, limits,
+            lambda vm: {"node": vm['node'],
+                        "storage": vm.get('storages', [])})
+        list_result = list()
+        failed = 0
+        for vm, done, error in results:
+            names, duration = done if done else ([], 0)
+            status = "OK"
+            if error:
+                failed += 1
+                status = "Failed: {}".format(error)
+            elif self.args['--dry-run']:
+                status = "Dry run"
+            list_result.append({
+                "vmid": vm['vmid'],
+                "name": vm.get('name'),
+                "node": vm['node'],
+                "snapshot": "\n".join(names),
+                "status": status,
+                "duration": round(duration, 1)
+            })
+        headers = {
+            "vmid": "ID VM",
+            "name": "VM Name",
+            "node": "Node",
+            "snapshot": "Snapshot",
+            "status": "Status",
+            "duration": "Duration (s)"
+        }
+        print(tabulate(list_result, headers=headers, tablefmt='grid'))
+        if failed:
+            utils.log_err("{} of {} VMs failed".format(failed, len(vms)))
+            exit(1)
+        exit()
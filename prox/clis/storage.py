@@ -1,8 +1,24 @@
 from prox.clis.base import Base
+from prox.libs import clusters_lib
+from prox.libs import forecast_lib
+from prox.libs import models
 from prox.libs import node_lib
-from tabulate import tabulate
+from prox.libs import task_lib
+from prox.libs import upload_lib
 from prox.libs import utils
+from tabulate import tabulate
 import os
+import time
+
+GiB = float(1 << 30)
+
+
+def _days(days):
+    if days is None:
+        return "-"
+    if days == 0:
+        return "now"
+    return "{:.0f}".format(days) if days >= 1 else "<1"
 
 
 class Storage(Base): 
@@ -10,18 +26,146 @@ class Storage(Base):
         usage:
             storage [-N NODE] [-S STORAGE]
             storage content [-N NODE] [-S STORAGE] [-c CONTENT]
+            storage forecast [-N NODE] [-t TIMEFRAME] [--save FILE | --from FILE] [-j JOBS] [--top N]
+            storage upload -N NODE -S STORAGE <file> [-c CONTENT] [--checksum SUM | --no-verify]
 
         Commands :
             clusters                          list of clusters
             vm                                list of vm
+            forecast                          Days until every storage is 80/90/100% full
+            upload                            Upload an ISO or container template to a storage
 
         Options:
         -h --help                             Print usage
         -N node --node=NODE                   Get Node
         -S storage --storage=STORAGE          Get Storage
-        -c content --content=CONTENT          Get Content
+        -c content --content=CONTENT          Get Content, for upload iso or vztmpl (from the file name by default)
+        -t timeframe --timeframe=TIMEFRAME    History to fit: day, week, month or year [default: month]
+        --save FILE                           Also write the fetched history to FILE
+        --from FILE                           Forecast from a saved history, without the API
+        -j jobs --jobs=JOBS                   Storages read at once [default: 16]
+        --top N                               Only show the N most urgent storages
+        --checksum SUM                        Expected checksum, [ALGORITHM:]HEX with sha256 by default
+        --no-verify                           Skip computing and checking the checksum
     """
+    def is_read_only(self):
+        # --save writes a local file
+        return not (self.args['upload'] or self.args['--save'])
+
+    def forecast(self):
+        try:
+            jobs = int(self.args['--jobs'])
+            top = int(self.args['--top']) if self.args['--top'] else None
+        except ValueError:
+            utils.log_err("Jobs and top must be numbers")
+            exit()
+        node = self.args['--node']
+
+        if self.args['--from']:
+            try:
+                histories = forecast_lib.load_histories(self.args['--from'])
+            except (IOError, ValueError) as e:
+                utils.log_err("Can not read {}: {}".format(self.args['--from'], e))
+                exit()
+            if node:
+                histories = [i for i in histories if i.get('node') == node]
+        else:
+            storages = list()
+            seen = set()
+            for i in clusters_lib.list_resources("storage") or []:
+                if node and i.get('node') != node:
+                    continue
+                if i.get('status') != "available":
+                    continue
+                # a shared storage shows up once per node
+                key = i['storage'] if i.get('shared') else (i['node'], i['storage'])
+                if key in seen:
+                    continue
+                seen.add(key)
+                storages.append(i)
+            timeframe = self.args['--timeframe']
+            histories = list()
+            fetched = task_lib.run_parallel(
+                storages,
+                lambda i: forecast_lib.storage_history(i['node'], i['storage'], timeframe),
+                jobs)
+            for i, data, error in fetched:
+                if error:
+                    utils.log_warn("No history for {} on {}: {}".format(
+                        i['storage'], i['node'], error))
+                    continue
+                histories.append({"node": i['node'], "storage": i['storage'],
+                                  "data": data})
+            if self.args['--save']:
+                forecast_lib.save_histories(histories, self.args['--save'])
+
+        results = sorted(forecast_lib.forecast(histories), key=forecast_lib.urgency)
+        if top is not None:
+            results = results[:top]
+        rows = list()
+        for i in results:
+            rows.append([
+                i['node'], i['storage'],
+                "-" if i['usage'] is None else "{:.1%}".format(i['usage']),
+                "-" if i['growth'] is None else "{:+.2f}".format(i['growth'] / GiB)
+            ] + [_days(i['days'][level]) for level in forecast_lib.LEVELS])
+        headers = ["Node", "Storage", "Used", "GiB/day", "80% in days",
+                   "90% in days", "Full in days"]
+        print(tabulate(rows, headers=headers, tablefmt='grid'))
+
+    def upload(self):
+        path = self.args['<file>']
+        if not os.path.isfile(path):
+            utils.log_err("No such file: {}".format(path))
+            exit()
+        content = self.args['--content'] or upload_lib.guess_content(path)
+        if not content:
+            utils.log_err("Set the content type with -c iso or -c vztmpl")
+            exit()
+        size = os.path.getsize(path)
+
+        checksum = None
+        if self.args['--checksum']:
+            try:
+                checksum = upload_lib.parse_checksum(self.args['--checksum'])
+            except ValueError as e:
+                utils.log_err(e)
+                exit()
+        elif not self.args['--no-verify']:
+            progress = upload_lib.Progress(size, "sha256")
+            checksum = ("sha256", upload_lib.file_checksum(path, "sha256", progress))
+            progress.finish()
+
+        node = self.args['--node']
+        storage = self.args['--storage']
+        progress = upload_lib.Progress(size, "upload")
+        try:
+            upid = upload_lib.upload(node, storage, path, content, checksum, progress)
+        except Exception as e:
+            utils.log_err("Upload failed: {}".format(e))
+            exit(1)
+        progress.finish()
+        utils.log_info("Sent {:.2f} GiB in {:.0f}s, {:.1f} MiB/s".format(
+            size / GiB, time.time() - progress.started, progress.rate() / (1 << 20)))
+        try:
+            task_lib.wait_task(upid, node)
+        except task_lib.TaskError as e:
+            utils.log_err("Upload task failed: {}".format(e))
+            exit(1)
+        if checksum:
+            utils.log_info("{} checksum verified by {}: {}".format(
+                checksum[0], node, checksum[1]))
+        utils.log_info("Uploaded {} to {}:{}/{}".format(
+            os.path.basename(path), storage, content, os.path.basename(path)))
+        exit()
+
     def execute(self):
+        if self.args['forecast']:
+            self.forecast()
+            exit()
+        if self.args['upload']:
+            self.upload()
+
         node = self.args["--node"]
         if not node:
             utils.log_info("Using Default Node : pve")
@@ -51,16 +195,19 @@ class Storage(Base):
             utils.log_err("Set Your Storage")
             exit()
         detail_storage = node_lib.get_storage_detail(node, storage)
-        headers = {
-            'storage': "Name Storage", 
-            'type': "Type", 
-            'total': "Total", 
-            'used': "Used",
-            'avail': "Available", 
-            'shared': "Shared", 
-            'active': "Status", 
-            'enabled': "Enable", 
-            'content': "Content"
-        }
-        print(tabulate(detail_storage, headers=headers, tablefmt='grid'))
+        if not detail_storage:
+            utils.log_err("Data Not Found")
+            exit()
+        columns = [
+            ('storage', "Name Storage"),
+            ('type', "Type"),
+            ('total', "Total"),
+            ('used', "Used"),
+            ('avail', "Available"),
+            ('shared', "Shared"),
+            ('active', "Status"),
+            ('enabled', "Enable"),
+            ('content', "Content")
+        ]
+        print(models.table(detail_storage, columns))
 
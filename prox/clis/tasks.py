@@ -0,0 +1,140 @@
+from prox.clis.base import Base
+from prox.libs import clusters_lib
+from prox.libs import hotspots_lib
+from prox.libs import models
+from prox.libs import tasks_lib
+from prox.libs import utils
+from tabulate import tabulate
+import time
+
+TASK_COLUMNS = [
+    ('starttime', 'Start'),
+    ('node', 'Node'),
+    ('target', 'ID'),
+    ('type', 'Type'),
+    ('user', 'User'),
+    ('duration', 'Seconds'),
+    ('status', 'Status')
+]
+
+
+class Tasks(Base):
+    """
+        usage:
+            tasks sync [-N NODE] [--logs] [-j JOBS] [--db PATH]
+            tasks ls [-N NODE] [-i VMID] [-t TYPE] [-u USER] [-s STATUS] [-w WINDOW] [--min-duration SEC] [--limit N] [--db PATH]
+            tasks stats [-b FIELD] [-N NODE] [-i VMID] [-t TYPE] [-u USER] [-s STATUS] [-w WINDOW] [--db PATH]
+            tasks log <upid> [--db PATH]
+
+        Commands :
+            sync                              Copy new tasks of every node into the local history
+            ls                                List tasks from the local history, newest first
+            stats                             Count and duration percentiles of finished tasks
+            log                               Stored log of a failed task
+
+        Options:
+        -h --help                             Print usage
+        -N node --node=NODE                   Only this node
+        -i vmid --vmid=VMID                   Only tasks of this VM
+        -t type --type=TYPE                   Only this task type, e.g. qmstart, vzdump
+        -u user --user=USER                   Only tasks of this user, e.g. root@pam
+        -s status --status=STATUS             ok, failed, running or an exact status
+        -w window --window=WINDOW             Only tasks started in the last 30m, 1h, 2d, 1w
+        -b field --by=FIELD                   Group by type, user, node, id or status [default: type]
+        -j jobs --jobs=JOBS                   Nodes read at once [default: 4]
+        --min-duration SEC                    Only tasks running at least SEC seconds
+        --limit N                             Rows to show [default: 50]
+        --logs                                Fetch the logs of failed tasks too
+        --db PATH                             History database [default: ~/.prox.tasks.db]
+    """
+    def is_read_only(self):
+        return not self.args['sync']
+
+    def execute(self):
+        path = self.args['--db'].replace("~", utils.APP_HOME, 1)
+        db = tasks_lib.connect(path)
+
+        if self.args['sync']:
+            self.sync(db)
+        if self.args['log']:
+            log = tasks_lib.task_log(db, self.args['<upid>'])
+            if log is None:
+                utils.log_err("No log stored, run `prox tasks sync --logs`")
+                exit()
+            print(log)
+            exit()
+
+        filters = self.filters()
+        if self.args['ls']:
+            try:
+                limit = int(self.args['--limit'])
+            except ValueError:
+                utils.log_err("Limit must be a number")
+                exit()
+            task_list = tasks_lib.query(db, limit, **filters)
+            if not task_list:
+                utils.log_err("Data not found")
+                exit()
+            print(models.table(task_list, TASK_COLUMNS))
+            exit()
+
+        if self.args['stats']:
+            try:
+                rows = tasks_lib.stats(db, self.args['--by'], **filters)
+            except ValueError as e:
+                utils.log_err(e)
+                exit()
+            if not rows:
+                utils.log_err("Data not found")
+                exit()
+            print(tabulate(rows, headers="keys", tablefmt='grid'))
+            exit()
+
+    def filters(self):
+        filters = {
+            "node": self.args['--node'],
+            "vmid": self.args['--vmid'],
+            "type": self.args['--type'],
+            "user": self.args['--user'],
+            "status": self.args['--status']
+        }
+        try:
+            if self.args['--window']:
+                window = hotspots_lib.parse_window(self.args['--window'])
+                filters['start_time'] = time.time() - window
+            if self.args.get('--min-duration'):
+                filters['min_duration'] = int(self.args['--min-duration'])
+        except ValueError as e:
+            utils.log_err(e)
+            exit()
+        return filters
+
+    def sync(self, db):
+        try:
+            jobs = int(self.args['--jobs'])
+        except ValueError:
+            utils.log_err("Jobs must be a number")
+            exit()
+        if self.args['--node']:
+            nodes = [self.args['--node']]
+        else:
+            nodes = [i['node'] for i in clusters_lib.list_resources("node") or []
+                     if i.get('status') == "online"]
+        if not nodes:
+            utils.log_err("No online node found")
+            exit()
+
+        start = time.time()
+        report, logs = tasks_lib.sync(db, nodes, self.args['--logs'], jobs)
+        rows = list()
+        for node, fetched, changed, error in sorted(report, key=lambda i: i[0]):
+            rows.append([node, fetched, changed, error or ""])
+        print(tabulate(rows, headers=["Node", "Fetched", "Stored", "Error"],
+                       tablefmt='grid'))
+        total = db.execute("SELECT count(*) FROM tasks").fetchone()[0]
+        message = "{} tasks in {} after {:.1f}s".format(
+            total, self.args['--db'], time.time() - start)
+        if self.args['--logs']:
+            message += ", {} failed task logs fetched".format(logs)
+        utils.log_info(message)
+        exit()
@@ -1,9 +1,17 @@
 from prox.clis.base import Base
+from prox.libs import agent_lib
+from prox.libs import clone_lib
+from prox.libs import clusters_lib
+from prox.libs import node_lib
+from prox.libs import rightsize_lib
+from prox.libs import task_lib
 from prox.libs import vm_lib
 from tabulate import tabulate
 from prox.libs import utils
 import os
 
+GiB = float(1 << 30)
+
 
 class VM(Base): 
     """
@@ -11,18 +19,63 @@ class VM(Base):
             vm [-N NODE] [-i VMID] [-a ACTION]
             vm info [-N NODE] [-i VMID] [-a ACTION]
             vm rrd [-N NODE] [-i VMID]
+            vm apply -f FILE [--dry-run] [-j JOBS]
+            vm rightsize [-A | --all] [-N NODE] [-i VMID] [-m NAME] [-p PCT] [--headroom PCT] [-j JOBS] [--changed]
+            vm agent (ip | os | fs) [-A | --all] [-N NODE] [-i VMID] [-m NAME] [-j JOBS] [--timeout SEC] [--ttl SEC] [--refresh]
+            vm clone -t ID [-c COUNT] [-m NAME] [-T NODES] [--pool POOL] [--full] [-S STORAGE] [--set SETTING]... [--start-id ID] [--start] [--per-storage N] [-j JOBS] [--timeout SEC] [--dry-run]
 
 
         Commands :
             vm                                list of vm
+            apply                             Bring VM configs to a desired state file
+            rightsize                         Recommend vCPUs and memory from week and month usage
+            clone                             Clone a template COUNT times in parallel
+            agent ip                          Guest addresses from the agent's network-get-interfaces
+            agent os                          Guest OS from the agent's get-osinfo
+            agent fs                          Guest filesystems from the agent's get-fsinfo
 
         Options:
         -h --help                             Print usage
         -N node --node=NODE                   Get Node
         -i vmid --vmid=VMID                   Get vm
         -a action --action=ACTION             Get ACTION
+        -f file --file=FILE                   Desired state YAML file
+        --dry-run                             Only print the plan
+        -j jobs --jobs=JOBS                   Concurrent API calls [default: 8]
+        -A --all                              Select every VM of the cluster
+        -m name --name=NAME                   Select VMs by name glob, e.g. 'web*', for clone
+                                              the name pattern, e.g. 'web-{n:02d}'
+        -p pct --percentile=PCT               Usage percentile to size for [default: 95]
+        --headroom PCT                        Percent added on top of the percentile [default: 20]
+        --changed                             Only list VMs whose size should change
+        -t id --template=ID                   Template VMID to clone
+        -c count --count=COUNT                Number of clones [default: 1]
+        -T nodes --targets=NODES              Nodes to spread the clones over, e.g. pve1,pve2
+        --pool POOL                           Add the clones to a resource pool
+        --full                                Full clones instead of linked clones
+        -S storage --storage=STORAGE          Target storage of full clones
+        --set SETTING                         Config override per clone, e.g. ipconfig0=ip=10.0.0.{n}/24,gw=10.0.0.1
+        --start-id ID                         First VMID to use, the next free one by default
+        --start                               Start every clone once configured
+        --per-storage N                       Clones running at once on one storage [default: 4]
+        --timeout SEC                         Seconds to wait for a clone task (1800) or an agent (2)
+        --ttl SEC                             Reuse agent answers younger than SEC [default: 300]
+        --refresh                             Ask every agent again
     """
+    def is_read_only(self):
+        return not (self.args['apply'] or self.args['clone']) or \
+            self.args['--dry-run']
+
     def execute(self):
+        if self.args['apply']:
+            self.apply()
+        if self.args['rightsize']:
+            self.rightsize()
+        if self.args['clone']:
+            self.clone()
+        if self.args['agent']:
+            self.agent()
+
         node = self.args["--node"]
         if not node:
             utils.log_info("Using Default Node : pve")
@@ -99,9 +152,255 @@ class VM(Base):
             # print(tabulate(data_vm_fix, headers="keys", tablefmt="grid"))
             exit()
 
-        
+    def apply(self):
+        try:
+            jobs = int(self.args['--jobs'])
+        except ValueError:
+            utils.log_err("Jobs must be a number")
+            exit()
+        try:
+            rules = vm_lib.load_rules(self.args['--file'])
+        except (IOError, ValueError) as e:
+            utils.log_err(e)
+            exit()
+
+        matched = vm_lib.match_rules(clusters_lib.list_resources("vm"), rules)
+        if not matched:
+            utils.log_err("No VM matches the desired state")
+            exit()
+
+        def diff(item):
+            vm, vm_rules = item
+            desired = {}
+            for rule in vm_rules:
+                desired.update(rule.get('config') or {})
+            current = vm_lib.get_vm_config(vm['node'], vm['vmid'])
+            changes, delete = vm_lib.config_diff(current, desired)
+            return current, changes, delete
+
+        plan = list()
+        failed = 0
+        for (vm, vm_rules), result, error in task_lib.run_parallel(
+                matched, diff, jobs):
+            if error:
+                failed += 1
+                utils.log_err("{}: {}".format(vm['vmid'], error))
+                continue
+            current, changes, delete = result
+            if changes or delete:
+                plan.append((vm, current, changes, delete))
+
+        list_plan = list()
+        for vm, current, changes, delete in plan:
+            for key in sorted(list(changes) + delete):
+                list_plan.append({
+                    "vmid": vm['vmid'],
+                    "name": vm.get('name'),
+                    "key": key,
+                    "current": current.get(key, ""),
+                    "desired": changes.get(key, "<delete>")
+                })
+        headers = {
+            "vmid": "ID VM",
+            "name": "VM Name",
+            "key": "Key",
+            "current": "Current",
+            "desired": "Desired"
+        }
+        if list_plan:
+            print(tabulate(list_plan, headers=headers, tablefmt='grid'))
+        utils.log_info("{} VMs to change, {} already in shape".format(
+            len(plan), len(matched) - len(plan) - failed))
+        if self.args['--dry-run'] or not plan:
+            exit(1 if failed else None)
+
+        def write(item):
+            vm, current, changes, delete = item
+            return vm_lib.set_vm_config(vm['node'], vm['vmid'], changes,
+                                        delete, current.get('digest'))
+
+        for (vm, current, changes, delete), result, error in \
+                task_lib.run_parallel(plan, write, jobs):
+            if error:
+                failed += 1
+                utils.log_err("{}: {}".format(vm['vmid'], error))
+        if failed:
+            exit(1)
+        utils.log_info("Desired state applied")
+        exit()
+
+    def rightsize(self):
+        if not (self.args['--all'] or self.args['--node']
+                or self.args['--vmid'] or self.args['--name']):
+            utils.log_err("Select VMs with -A, -N, -i or -m")
+            exit()
+        try:
+            jobs = int(self.args['--jobs'])
+            percentile = float(self.args['--percentile'])
+            headroom = float(self.args['--headroom']) / 100
+        except ValueError:
+            utils.log_err("Jobs, percentile and headroom must be numbers")
+            exit()
 
+        vms = vm_lib.select_vms(self.args['--vmid'], self.args['--node'],
+                                self.args['--name'])
+        if not vms:
+            utils.log_err("Data Not Found")
+            exit()
+
+        selected = list()
+        histories = list()
+        for vm, rows, error in task_lib.run_parallel(
+                vms, lambda vm: rightsize_lib.vm_history(vm['node'], vm['vmid']),
+                jobs):
+            if error:
+                utils.log_warn("No history for {}: {}".format(vm['vmid'], error))
+                continue
+            selected.append(vm)
+            histories.append(rows)
+
+        results = rightsize_lib.analyse(selected, histories, percentile, headroom)
+        rows = list()
+        for i in results:
+            if self.args['--changed'] and i['rec_cpus'] == i['cpus'] and \
+                    i['rec_mem'] == i['maxmem']:
+                continue
+            rows.append([
+                i['vmid'], i['name'], i['node'], i['cpus'],
+                "-" if i['cpu'] is None else "{:.2f}".format(i['cpu']),
+                i['rec_cpus'], "{:.1f}".format(i['maxmem'] / GiB),
+                "-" if i['mem'] is None else "{:.1f}".format(i['mem'] / GiB),
+                "{:.1f}".format(i['rec_mem'] / GiB)
+            ])
+        percent = "p{:g}".format(percentile)
+        print(tabulate(rows, headers=["ID VM", "VM Name", "Node", "vCPUs",
+                                      "Cores " + percent, "Rec. vCPUs",
+                                      "Mem GiB", "Mem " + percent, "Rec. GiB"],
+                       tablefmt="grid"))
+
+        freed = rightsize_lib.reclaimable(results)
+        rows = [[node, freed[node]['cpus'], "{:.1f}".format(freed[node]['mem'] / GiB)]
+                for node in sorted(freed)]
+        rows.append(["Total", sum(i['cpus'] for i in freed.values()),
+                     "{:.1f}".format(sum(i['mem'] for i in freed.values()) / GiB)])
+        print(tabulate(rows, headers=["Node", "Reclaimable vCPUs", "Reclaimable GiB"],
+                       tablefmt="grid"))
+        exit()
+
+    def clone(self):
+        try:
+            count = int(self.args['--count'])
+            jobs = int(self.args['--jobs'])
+            per_storage = int(self.args['--per-storage'])
+            timeout = float(self.args['--timeout'] or 1800)
+            start_id = int(self.args['--start-id']) if self.args['--start-id'] else None
+        except ValueError:
+            utils.log_err("Count, jobs, per-storage, timeout and start-id must be numbers")
+            exit()
+        if count < 1:
+            utils.log_err("Count must be at least 1")
+            exit()
+
+        vms = clusters_lib.list_resources("vm")
+        try:
+            template = clone_lib.find_template(vms, self.args['--template'])
+        except ValueError as e:
+            utils.log_err(e)
+            exit()
+        full = self.args['--full']
+        if not template.get('template') and not full:
+            utils.log_err("{} is not a template, only --full clones are possible".format(
+                template['vmid']))
+            exit()
+        targets = [i.strip() for i in (self.args['--targets'] or "").split(",")
+                   if i.strip()]
+
+        first = start_id or int(node_lib.vm_next())
+        ids = clone_lib.allocate_ids(first, count, [i['vmid'] for i in vms])
+        try:
+            clones = clone_lib.plan(template, count, ids,
+                                    self.args['--name'] or clone_lib.DEFAULT_PATTERN,
+                                    targets, self.args['--set'])
+        except ValueError as e:
+            utils.log_err(e)
+            exit()
+        taken = set(i.get('name') for i in vms)
+        for clone in clones:
+            if clone['name'] in taken:
+                utils.log_warn("Name {} is already used".format(clone['name']))
 
+        print(tabulate([[i['vmid'], i['name'], i['node'],
+                         ", ".join("{}={}".format(k, v) for k, v in sorted(i['config'].items()))]
+                        for i in clones],
+                       headers=["ID VM", "VM Name", "Node", "Config"], tablefmt="grid"))
+        if self.args['--dry-run']:
+            exit()
 
+        keys = clone_lib.storages(vm_lib.get_vm_config(template['node'], template['vmid']),
+                                  self.args['--storage'] if full else None)
+        utils.log_info("Cloning {} {} times, {} at once per storage".format(
+            template['vmid'], count, per_storage))
+        results = task_lib.run_parallel(
+            clones,
+            lambda clone: clone_lib.clone_and_wait(
+                template, clone, full, self.args['--storage'], self.args['--pool'],
+                self.args['--start'], timeout),
+            jobs, {"storage": per_storage}, lambda clone: {"storage": keys})
+        failed = 0
+        durations = list()
+        for clone, done, error in results:
+            if error:
+                failed += 1
+                utils.log_err("{} ({}) failed: {}".format(clone['vmid'], clone['name'], error))
+            else:
+                durations.append(done['duration'])
+        if durations:
+            utils.log_info("{} clones done, slowest took {:.0f}s".format(
+                len(durations), max(durations)))
+        if failed:
+            utils.log_err("{} of {} clones failed".format(failed, count))
+            exit(1)
+        exit()
 
-        
\ No newline at end of file
+    def agent(self):
+        if not (self.args['--all'] or self.args['--node']
+                or self.args['--vmid'] or self.args['--name']):
+            utils.log_err("Select VMs with -A, -N, -i or -m")
+            exit()
+        try:
+            jobs = int(self.args['--jobs'])
+            timeout = float(self.args['--timeout'] or agent_lib.TIMEOUT)
+            ttl = float(self.args['--ttl'])
+        except ValueError:
+            utils.log_err("Jobs, timeout and ttl must be numbers")
+            exit()
+        vms = vm_lib.select_vms(self.args['--vmid'], self.args['--node'],
+                                self.args['--name'])
+        if not vms:
+            utils.log_err("Data Not Found")
+            exit()
+        kind = [i for i in ("ip", "os", "fs") if self.args[i]][0]
+        results = agent_lib.query_many(vms, agent_lib.COMMANDS[kind],
+                                       max(jobs, 1), timeout, ttl,
+                                       self.args['--refresh'])
+        rows = list()
+        for vm, result, error in results:
+            base = [vm['vmid'], vm.get('name'), vm.get('node')]
+            if error:
+                rows.append(base + ["-"] * (3 if kind == "fs" else 1) + [error])
+            elif kind == "ip":
+                rows.append(base + ["\n".join(agent_lib.addresses(result)), ""])
+            elif kind == "os":
+                rows.append(base + [agent_lib.os_name(result), ""])
+            else:
+                found = agent_lib.filesystems(result)
+                rows.append(base + [
+                    "\n".join(str(i[0]) for i in found),
+                    "\n".join(str(i[1]) for i in found),
+                    "\n".join("{:.1f}/{:.1f}".format((i[2] or 0) / GiB, i[3] / GiB)
+                              for i in found), ""])
+        headers = ["ID VM", "VM Name", "Node"]
+        headers += {"ip": ["Addresses"], "os": ["OS"],
+                    "fs": ["Mountpoint", "Type", "Used/Total GiB"]}[kind]
+        print(tabulate(rows, headers=headers + ["Agent"], tablefmt="grid"))
+        exit()
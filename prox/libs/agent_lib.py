@@ -0,0 +1,129 @@
+"""
+Bulk QEMU guest agent queries.
+
+Only running VMs are asked, each with a short timeout so a VM without a
+working agent costs at most that much, and answers (failures included)
+are cached in ~/.prox.agent.json for ``ttl`` seconds, so a repeated
+listing only asks the VMs it has not heard from recently.
+"""
+from prox.libs import login_lib
+from prox.libs import proxmox_lib
+from prox.libs import task_lib
+from prox.libs import utils
+import json
+import os
+import time
+
+COMMANDS = {
+    "ip": "network-get-interfaces",
+    "os": "get-osinfo",
+    "fs": "get-fsinfo"
+}
+CACHE_FILE = os.path.join(utils.APP_HOME, ".prox.agent.json")
+TTL = 300
+TIMEOUT = 2.0
+
+
+def get_auth():
+    try:
+        prox = login_lib.load_dumped_session()
+    except Exception as e:
+        print(e)
+        exit()
+    else:
+        return prox
+
+def agent_query(node, vm_id, command, timeout=TIMEOUT):
+    """The 'result' of one guest agent command"""
+    prox = get_auth()
+    data = proxmox_lib.check(prox.getVirtualAgent(node, vm_id, command, timeout))
+    if isinstance(data, dict) and 'result' in data:
+        return data['result']
+    return data
+
+def load_cache(path=CACHE_FILE):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return {}
+
+def save_cache(cache, path=CACHE_FILE, ttl=TTL):
+    """Write the cache without entries older than ``ttl``"""
+    now = time.time()
+    kept = dict((key, entry) for key, entry in cache.items()
+                if now - entry.get('time', 0) <= ttl)
+    try:
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(kept, f)
+        os.replace(tmp, path)
+    except (IOError, OSError) as e:
+        utils.log_warn("Agent cache not saved: {}".format(e))
+
+def query_many(vms, command, jobs=32, timeout=TIMEOUT, ttl=TTL, refresh=False,
+               path=CACHE_FILE):
+    """
+    Ask every VM's agent for ``command``, cached answers first.
+
+    Returns (vm, result, error) tuples in ``vms`` order like run_parallel;
+    the error is a message for stopped VMs and failed agents.
+    """
+    cache = load_cache(path)
+    now = time.time()
+    answers = {}
+    asked = list()
+    for vm in vms:
+        key = "{}:{}".format(vm['vmid'], command)
+        entry = cache.get(key)
+        if vm.get('status') != "running":
+            answers[key] = (None, "not running")
+        elif entry and not refresh and now - entry.get('time', 0) <= ttl:
+            answers[key] = (entry.get('result'), entry.get('error'))
+        else:
+            asked.append(vm)
+
+    for vm, result, error in task_lib.run_parallel(
+            asked, lambda vm: agent_query(vm['node'], vm['vmid'], command, timeout),
+            jobs):
+        key = "{}:{}".format(vm['vmid'], command)
+        if error is not None:
+            error = str(error) or type(error).__name__
+            if "timed out" in error.lower() or "timeout" in type(error).__name__.lower():
+                error = "no answer in {:g}s".format(timeout)
+        answers[key] = (result, error)
+        cache[key] = {"time": now, "result": result, "error": error}
+    if asked:
+        save_cache(cache, path, ttl)
+    return [(vm,) + answers["{}:{}".format(vm['vmid'], command)] for vm in vms]
+
+def addresses(interfaces, loopback=False):
+    """IP addresses of network-get-interfaces, loopback and link-local left out"""
+    found = list()
+    for iface in interfaces or []:
+        if not loopback and iface.get('name') == "lo":
+            continue
+        for address in iface.get('ip-addresses') or []:
+            ip = address.get('ip-address') or ""
+            if not loopback and (ip.startswith("127.") or ip == "::1"):
+                continue
+            if ip.lower().startswith("fe80:"):
+                continue
+            if ip and ip not in found:
+                found.append(ip)
+    return found
+
+def os_name(info):
+    info = info or {}
+    return info.get('pretty-name') or info.get('name') or ""
+
+def filesystems(info):
+    """(mountpoint, type, used bytes, total bytes) of get-fsinfo, pseudo filesystems skipped"""
+    rows = list()
+    for fs in info or []:
+        total = fs.get('total-bytes')
+        if total is None:
+            continue
+        rows.append((fs.get('mountpoint'), fs.get('type'),
+                     fs.get('used-bytes'), total))
+    return rows
@@ -0,0 +1,298 @@
+"""
+Backup window planning.
+
+Backup jobs are laid on a one week timeline of minutes. A job runs on
+every node holding one of its guests at once, each node backing up its
+guests one after another, so a job keeps a node busy for the sum of its
+guests there and keeps its storage busy until the slowest node is done.
+"""
+from prox.libs import login_lib
+from prox.libs import proxmox_lib
+import re
+
+DAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+DAY = 1440
+WEEK = 7 * DAY
+# throughput assumed when no past backup tells better, bytes per second
+DEFAULT_RATE = 100 * (1 << 20)
+BACKUP_TASKS = ("vzdump",)
+
+TIME = re.compile(r'^(\d{1,2}):(\d{2})$')
+
+
+def get_auth():
+    try:
+        prox = login_lib.load_dumped_session()
+    except Exception as e:
+        print(e)
+        exit()
+    else:
+        return prox
+
+def list_jobs():
+    prox = get_auth()
+    return proxmox_lib.check(prox.getClusterBackupSchedule()) or []
+
+def backup_tasks(node, limit=500):
+    """Recent backup tasks of one node"""
+    prox = get_auth()
+    return list(prox.iterNodeTasks(node, limit=limit, typefilter="vzdump"))
+
+def _days(text):
+    days = list()
+    for part in text.split(","):
+        if ".." in part:
+            first, last = part.split("..", 1)
+            if first not in DAYS or last not in DAYS:
+                return None
+            start, end = DAYS.index(first), DAYS.index(last)
+            if end < start:
+                end += 7
+            days.extend(i % 7 for i in range(start, end + 1))
+        elif part in DAYS:
+            days.append(DAYS.index(part))
+        else:
+            return None
+    return sorted(set(days))
+
+def parse_schedule(text):
+    """
+    'mon..fri 02:30' -> ([0, 1, 2, 3, 4], 150), None when not understood.
+
+    Covers the usual backup schedules: optional days (list or range, or
+    'daily') followed by one HH:MM start.
+    """
+    parts = text.strip().lower().split()
+    if not parts or len(parts) > 2:
+        return None
+    days = list(range(7))
+    if len(parts) == 2 or not TIME.match(parts[0]):
+        if parts[0] != "daily":
+            days = _days(parts[0])
+        if days is None:
+            return None
+        parts = parts[1:] or ["00:00"]
+    match = TIME.match(parts[0])
+    if not match:
+        return None
+    hour, minute = int(match.group(1)), int(match.group(2))
+    if hour > 23 or minute > 59:
+        return None
+    return days, hour * 60 + minute
+
+def job_schedule(job):
+    """Schedule of a job row, older jobs use starttime and dow"""
+    if job.get('schedule'):
+        return parse_schedule(job['schedule'])
+    if job.get('starttime'):
+        return parse_schedule("{} {}".format(
+            job.get('dow') or "mon..sun", job['starttime']))
+    return None
+
+def format_schedule(days, minute):
+    days = sorted(days)
+    if days == list(range(7)):
+        text = "daily"
+    elif days == list(range(days[0], days[-1] + 1)) and len(days) > 2:
+        text = "{}..{}".format(DAYS[days[0]], DAYS[days[-1]])
+    else:
+        text = ",".join(DAYS[i] for i in days)
+    return "{} {:02d}:{:02d}".format(text, minute // 60, minute % 60)
+
+def _ids(value):
+    return set(str(i).strip() for i in str(value or "").split(",") if str(i).strip())
+
+def job_guests(job, guests):
+    """Guests (cluster/resources vm rows) a job backs up"""
+    selected = list()
+    vmids = _ids(job.get('vmid'))
+    exclude = _ids(job.get('exclude'))
+    for i in guests:
+        vmid = str(i.get('vmid'))
+        if job.get('node') and i.get('node') != job['node']:
+            continue
+        if job.get('all'):
+            if vmid in exclude:
+                continue
+        elif job.get('pool'):
+            if i.get('pool') != job['pool']:
+                continue
+        elif vmid not in vmids:
+            continue
+        selected.append(i)
+    return selected
+
+def _median(values):
+    values = sorted(values)
+    if not values:
+        return None
+    middle = len(values) // 2
+    if len(values) % 2:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2.0
+
+def history(tasks, guests):
+    """
+    Past backup durations per vmid and the median backup throughput.
+
+    Only single guest vzdump tasks tell a duration for one guest, their
+    size over duration gives the throughput used for the others.
+    """
+    sizes = dict((str(i.get('vmid')), i.get('maxdisk') or 0) for i in guests)
+    durations = {}
+    rates = list()
+    for i in tasks:
+        if i.get('type') not in BACKUP_TASKS or i.get('status') != "OK":
+            continue
+        if not i.get('id') or not i.get('endtime') or not i.get('starttime'):
+            continue
+        seconds = i['endtime'] - i['starttime']
+        if seconds <= 0:
+            continue
+        durations.setdefault(str(i['id']), list()).append(seconds)
+        if sizes.get(str(i['id'])):
+            rates.append(float(sizes[str(i['id'])]) / seconds)
+    durations = dict((k, _median(v)) for k, v in durations.items())
+    return durations, _median(rates)
+
+def estimate(job, guests, durations, rate=DEFAULT_RATE):
+    """Seconds a job keeps each node busy, {node: seconds}"""
+    busy = {}
+    for i in job_guests(job, guests):
+        seconds = durations.get(str(i.get('vmid')))
+        if seconds is None:
+            seconds = float(i.get('maxdisk') or 0) / rate
+        busy[i.get('node')] = busy.get(i.get('node'), 0) + seconds
+    return busy
+
+def plan(jobs, guests, tasks, rate=None):
+    """
+    One entry per enabled job with its schedule and estimated load.
+
+    Jobs whose schedule can not be read are returned with schedule None.
+    """
+    durations, observed = history(tasks, guests)
+    rate = rate or observed or DEFAULT_RATE
+    entries = list()
+    for job in jobs:
+        if str(job.get('enabled', 1)) == "0":
+            continue
+        busy = estimate(job, guests, durations, rate)
+        schedule = job_schedule(job)
+        entries.append({
+            "id": job.get('id'),
+            "storage": job.get('storage') or "local",
+            "schedule": schedule,
+            "text": job.get('schedule') or job.get('starttime'),
+            "nodes": dict((k, int(v // 60) + 1) for k, v in busy.items()),
+            "guests": len(job_guests(job, guests)),
+            "minutes": int(max(busy.values()) // 60) + 1 if busy else 0
+        })
+    return entries
+
+def _occupy(timeline, days, start, minutes):
+    for day in days:
+        begin = day * DAY + start
+        for minute in range(begin, begin + minutes):
+            timeline[minute % WEEK] += 1
+
+def _peak(timeline, days, start, minutes):
+    peak = 0
+    for day in days:
+        begin = day * DAY + start
+        for minute in range(begin, begin + minutes):
+            peak = max(peak, timeline[minute % WEEK])
+    return peak
+
+def timelines(entries, start_of=None):
+    """Per storage and per node counts of running jobs for every minute"""
+    storages = {}
+    nodes = {}
+    for entry in entries:
+        if entry['schedule'] is None:
+            continue
+        days, start = entry['schedule']
+        if start_of:
+            start = start_of.get(entry['id'], start)
+        timeline = storages.setdefault(entry['storage'], [0] * WEEK)
+        _occupy(timeline, days, start, entry['minutes'])
+        for node, minutes in entry['nodes'].items():
+            _occupy(nodes.setdefault(node, [0] * WEEK), days, start, minutes)
+    return storages, nodes
+
+def conflicts(entries, limit=1, start_of=None):
+    """
+    Jobs that run with too many others: (job id, reason) pairs.
+
+    A storage is overloaded above ``limit`` jobs at once, a node as soon
+    as two jobs back it up at the same time.
+    """
+    storages, nodes = timelines(entries, start_of)
+    found = list()
+    for entry in entries:
+        if entry['schedule'] is None:
+            continue
+        days, start = entry['schedule']
+        if start_of:
+            start = start_of.get(entry['id'], start)
+        peak = _peak(storages[entry['storage']], days, start, entry['minutes'])
+        if peak > limit:
+            found.append((entry['id'], "{} jobs at once on storage {}".format(
+                peak, entry['storage'])))
+        for node, minutes in sorted(entry['nodes'].items()):
+            peak = _peak(nodes[node], days, start, minutes)
+            if peak > 1:
+                found.append((entry['id'], "{} jobs at once on node {}".format(
+                    peak, node)))
+    return found
+
+def _fits(entry, start, storages, nodes, limit):
+    days = entry['schedule'][0]
+    storage = storages.setdefault(entry['storage'], [0] * WEEK)
+    if _peak(storage, days, start, entry['minutes']) >= limit:
+        return False
+    for node, minutes in entry['nodes'].items():
+        if _peak(nodes.setdefault(node, [0] * WEEK), days, start, minutes):
+            return False
+    return True
+
+def _cost(entry, start, storages, nodes):
+    days = entry['schedule'][0]
+    cost = _peak(storages[entry['storage']], days, start, entry['minutes'])
+    for node, minutes in entry['nodes'].items():
+        cost += _peak(nodes[node], days, start, minutes)
+    return cost
+
+def propose(entries, limit=1, window=(20 * 60, 6 * 60), step=15):
+    """
+    New start minute for every job, {job id: minute}.
+
+    Longest jobs are placed first. A job keeps its start when it still
+    fits, otherwise it takes the first free start in ``window`` (start
+    and end minute of the day, may cross midnight) or, when nothing is
+    free, the start with the least overlap. Days are never changed.
+    """
+    first, last = window
+    if last <= first:
+        last += DAY
+    candidates = [minute % DAY for minute in range(first, last, step)]
+    storages = {}
+    nodes = {}
+    starts = {}
+    placed = [i for i in entries if i['schedule'] is not None]
+    placed.sort(key=lambda i: (-i['minutes'], i['id']))
+    for entry in placed:
+        days, current = entry['schedule']
+        choice = None
+        for start in [current] + candidates:
+            if _fits(entry, start, storages, nodes, limit):
+                choice = start
+                break
+        if choice is None:
+            choice = min([current] + candidates,
+                         key=lambda s: _cost(entry, s, storages, nodes))
+        starts[entry['id']] = choice
+        _occupy(storages[entry['storage']], days, choice, entry['minutes'])
+        for node, minutes in entry['nodes'].items():
+            _occupy(nodes[node], days, choice, minutes)
+    return starts
@@ -0,0 +1,209 @@
+from concurrent.futures import ThreadPoolExecutor
+from prox.libs import login_lib
+from prox.libs import utils
+import io
+import shlex
+import sys
+import threading
+import time
+
+
+class _ThreadStream(object):
+    """
+    Stand-in for sys.stdout / sys.stderr while a batch runs.
+
+    Writes from a thread that registered a buffer land in that buffer, so
+    concurrent commands keep their output apart; other writes fall
+    through to the real stream.
+    """
+
+    def __init__(self, fallback):
+        self.fallback = fallback
+        self.local = threading.local()
+
+    def capture(self, buffer):
+        self.local.buffer = buffer
+
+    def release(self):
+        self.local.buffer = None
+
+    def write(self, data):
+        buffer = getattr(self.local, 'buffer', None)
+        if buffer is None:
+            return self.fallback.write(data)
+        return buffer.write(data)
+
+    def flush(self):
+        buffer = getattr(self.local, 'buffer', None)
+        if buffer is None:
+            self.fallback.flush()
+
+    def isatty(self):
+        return False
+
+    def __getattr__(self, name):
+        return getattr(self.fallback, name)
+
+
+def parse_lines(lines):
+    """
+    Split a runbook into steps.
+
+    Blank lines and ``#`` comments are skipped, a leading ``prox`` word is
+    optional so existing shell runbooks can be fed as they are.
+    """
+    steps = list()
+    for number, line in enumerate(lines, 1):
+        try:
+            argv = shlex.split(line, comments=True)
+        except ValueError as e:
+            steps.append({
+                "line": number,
+                "command": line.strip(),
+                "argv": None,
+                "error": str(e)
+            })
+            continue
+        if argv and argv[0] == "prox":
+            argv = argv[1:]
+        if not argv:
+            continue
+        steps.append({
+            "line": number,
+            "command": " ".join(argv),
+            "argv": argv,
+            "error": None
+        })
+    return steps
+
+
+def prepare(steps, load_command):
+    """
+    Parse every step with its command's docopt usage before anything runs.
+
+    ``load_command`` maps a command name to its class. Returns the list of
+    steps that failed to parse, each with an ``error`` message.
+    """
+    failed = list()
+    for step in steps:
+        if step['error'] is None:
+            name, args = step['argv'][0], step['argv'][1:]
+            if name == "batch":
+                step['error'] = "batch can not be nested"
+            else:
+                try:
+                    command_class = load_command(name)
+                    step['instance'] = command_class({}, args)
+                    step['mutation'] = step['instance'].is_mutation()
+                except SystemExit as e:
+                    # docopt reports bad usage by raising DocoptExit
+                    if isinstance(e.code, str) and e.code:
+                        step['error'] = e.code
+                    else:
+                        step['error'] = "invalid command"
+        if step['error'] is not None:
+            failed.append(step)
+    return failed
+
+
+def plan(steps):
+    """
+    Group steps for execution.
+
+    Consecutive reads share a group and run concurrently, every mutation
+    is a group of its own so mutations keep their declared order.
+    """
+    groups = list()
+    reads = list()
+    for step in steps:
+        if step['mutation']:
+            if reads:
+                groups.append(reads)
+                reads = list()
+            groups.append([step])
+        else:
+            reads.append(step)
+    if reads:
+        groups.append(reads)
+    return groups
+
+
+def result(step, status, exit_code=None, output="", log="", elapsed=0.0):
+    return {
+        "line": step['line'],
+        "command": step['command'],
+        "mutation": step.get('mutation', False),
+        "status": status,
+        "exit_code": exit_code,
+        "output": output,
+        "log": log,
+        "elapsed": round(elapsed, 4)
+    }
+
+
+def run_step(step, stdout, stderr):
+    out = io.StringIO()
+    err = io.StringIO()
+    stdout.capture(out)
+    stderr.capture(err)
+    start = time.time()
+    status = "ok"
+    exit_code = 0
+    try:
+        step['instance'].execute()
+    except SystemExit as e:
+        # commands end with exit(), only a non zero code is a failure
+        if e.code not in (None, 0):
+            status = "error"
+            exit_code = e.code if isinstance(e.code, int) else 1
+            if not isinstance(e.code, int):
+                err.write(str(e.code) + "\n")
+    except Exception as e:
+        status = "error"
+        exit_code = 1
+        err.write("{}: {}\n".format(type(e).__name__, e))
+    finally:
+        stdout.release()
+        stderr.release()
+    return result(step, status, exit_code, out.getvalue(), err.getvalue(),
+                  time.time() - start)
+
+
+def run(groups, jobs=8, keep_going=False, stream=None):
+    """
+    Execute planned groups and write one ndjson record per step.
+
+    Records come out in declared order. A failed mutation stops the batch
+    unless ``keep_going`` is set, the remaining steps are reported as
+    skipped. Returns the number of failed steps.
+    """
+    if stream is None:
+        stream = sys.stdout
+    stdout = _ThreadStream(sys.stdout)
+    stderr = _ThreadStream(sys.stderr)
+    sys.stdout, sys.stderr = stdout, stderr
+    failures = 0
+    stop = False
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+            for group in groups:
+                # steps in a group share GETs, a later group reads afresh
+                login_lib.forget_requests()
+                if stop:
+                    for step in group:
+                        utils.ndjson(result(step, "skipped"), stream)
+                    continue
+                if len(group) == 1:
+                    results = [run_step(group[0], stdout, stderr)]
+                else:
+                    results = list(pool.map(
+                        lambda step: run_step(step, stdout, stderr), group))
+                for step_result in results:
+                    utils.ndjson(step_result, stream)
+                    if step_result['status'] != "ok":
+                        failures += 1
+                        if step_result['mutation'] and not keep_going:
+                            stop = True
+    finally:
+        sys.stdout, sys.stderr = stdout.fallback, stderr.fallback
+    return failures
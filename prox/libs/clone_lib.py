@@ -0,0 +1,141 @@
+"""
+Cloning a template many times.
+
+A plan gives every clone its VMID, name, node and config overrides up
+front, so the clones can then run in parallel: each one is cloned, its
+task followed to the end, its cloud-init/config overrides written and
+optionally started, without waiting for the others.
+"""
+from prox.libs import login_lib
+from prox.libs import proxmox_lib
+from prox.libs import task_lib
+from prox.libs import vm_lib
+import time
+
+try:
+    from urllib.parse import quote
+except ImportError:
+    from urllib import quote
+
+DEFAULT_PATTERN = "{template}-{n}"
+
+
+def get_auth():
+    try:
+        prox = login_lib.load_dumped_session()
+    except Exception as e:
+        print(e)
+        exit()
+    else:
+        return prox
+
+def clone_vm(node, vm_id, newid, name=None, target=None, pool=None,
+             full=False, storage=None):
+    prox = get_auth()
+    post_data = {"newid": int(newid), "full": 1 if full else 0}
+    if name:
+        post_data['name'] = name
+    if target and target != node:
+        post_data['target'] = target
+    if pool:
+        post_data['pool'] = pool
+    if storage:
+        post_data['storage'] = storage
+    return proxmox_lib.check(prox.cloneVirtualMachine(node, vm_id, post_data))
+
+def start_vm(node, vm_id):
+    prox = get_auth()
+    return proxmox_lib.check(prox.startVirtualMachine(node, vm_id))
+
+def find_template(vms, vmid):
+    """
+    The guest ``vmid`` of a cluster resources listing, which must be a
+    QEMU VM: containers are cloned through another endpoint.
+    """
+    found = [i for i in vms if str(i.get('vmid')) == str(vmid)]
+    if not found:
+        raise ValueError("VM {} not found".format(vmid))
+    if found[0].get('type') != "qemu":
+        raise ValueError("{} is a container, only QEMU VMs can be cloned".format(vmid))
+    return found[0]
+
+def allocate_ids(first, count, used):
+    """``count`` free VMIDs from ``first`` on, skipping ``used``"""
+    used = set(int(i) for i in used)
+    ids = list()
+    vmid = int(first)
+    while len(ids) < count:
+        if vmid not in used:
+            ids.append(vmid)
+        vmid += 1
+    return ids
+
+def parse_sets(values):
+    """['ciuser=ops', 'ipconfig0=ip=10.0.0.{n}/24'] -> ordered (key, value) pairs"""
+    pairs = list()
+    for value in values or []:
+        key, sep, text = value.partition("=")
+        if not sep or not key.strip():
+            raise ValueError("Expected KEY=VALUE, got '{}'".format(value))
+        pairs.append((key.strip(), text))
+    return pairs
+
+def render(text, number, vmid, template):
+    """Fill {n}, {vmid} and {template} of a pattern, e.g. 'web-{n:02d}'"""
+    try:
+        return text.format(n=number, vmid=vmid, template=template)
+    except (KeyError, IndexError, ValueError) as e:
+        raise ValueError("Bad pattern '{}': {}".format(text, e))
+
+def plan(template, count, ids, pattern=DEFAULT_PATTERN, targets=None, sets=None):
+    """
+    One dict per clone: number, vmid, name, node and config overrides.
+
+    Clones go round-robin over ``targets``, the template's node without
+    them. ``sets`` values are patterns like the name.
+    """
+    nodes = targets or [template['node']]
+    name = template.get('name') or str(template['vmid'])
+    clones = list()
+    for number, vmid in enumerate(ids[:count], 1):
+        config = dict((key, render(value, number, vmid, name))
+                      for key, value in parse_sets(sets))
+        if 'sshkeys' in config:
+            # the API wants the keys URL encoded inside the form value
+            config['sshkeys'] = quote(config['sshkeys'], safe="")
+        clones.append({
+            "number": number,
+            "vmid": vmid,
+            "name": render(pattern, number, vmid, name),
+            "node": nodes[(number - 1) % len(nodes)],
+            "config": config
+        })
+    return clones
+
+def storages(template_config, storage=None):
+    """Storages a clone reads from or writes to, the limiter keys"""
+    found = set(vm_lib.vm_storages(template_config))
+    if storage:
+        found.add(storage)
+    return sorted(found)
+
+def clone_and_wait(template, clone, full=False, storage=None, pool=None,
+                   start=False, timeout=None):
+    """
+    Clone, wait for the task, write the overrides and optionally start.
+
+    Returns the clone dict with its task UPID and duration in seconds.
+    """
+    began = time.time()
+    upid = clone_vm(template['node'], template['vmid'], clone['vmid'],
+                    clone['name'], clone['node'], pool, full, storage)
+    task_lib.wait_task(upid, template['node'], timeout)
+    if clone['config']:
+        vm_lib.set_vm_config(clone['node'], clone['vmid'], clone['config'])
+    if start:
+        task_lib.wait_task(start_vm(clone['node'], clone['vmid']),
+                           clone['node'], timeout)
+    done = dict(clone)
+    done['upid'] = upid
+    done['duration'] = time.time() - began
+    return done
@@ -1,4 +1,5 @@
 from prox.libs import login_lib
+from prox.libs import models
 
 
 def get_auth():
@@ -13,16 +14,28 @@ def get_auth():
 def list_cluster():
     prox = get_auth()
     cl_list = prox.getClusterStatus()
+    if cl_list and cl_list.get('data') is not None:
+        cl_list['data'] = models.Node.from_rows(cl_list['data'])
     return cl_list
 
 def cluster_service(node):
     prox = get_auth()
     cluster_service = prox.getNodeServiceList(node)
-    return cluster_service['data']
+    return models.Service.from_rows(cluster_service['data'])
 
 def service_detail(node, service):
     prox = get_auth()
     detail_service = prox.getNodeServiceState(node, service)
-    return detail_service['data']
+    if not detail_service['data']:
+        return None
+    return models.Service.from_api(detail_service['data'])
 
+def list_resources(type=None):
+    prox = get_auth()
+    resources = prox.getClusterResources(type)
+    return resources['data']
 
+def list_tasks():
+    prox = get_auth()
+    tasks = prox.getClusterTasks()
+    return tasks['data']
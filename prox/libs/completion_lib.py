@@ -0,0 +1,262 @@
+"""
+Shell completion from a local index.
+
+The index is a directory of plain text files, one per kind of value,
+one ``value<TAB>description`` line per entry. Completing reads a single
+file and imports nothing but the standard library, so it stays fast
+with tens of thousands of guests. The shell scripts call this module
+directly with ``python -I -S``, skipping site-packages and the prox
+command chain, so a completion costs little more than the interpreter
+start. A stale index is refreshed by a detached
+``python -m prox.libs.completion_lib`` process and the current
+completion is answered from the old one.
+"""
+import os
+import sys
+import time
+
+INDEX_DIR = os.path.join(os.path.expanduser("~"), ".prox.index")
+# the directory holding the prox package, and the usage listing the commands
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+CLI_FILE = os.path.join(ROOT, "prox", "cli.py")
+STAMP = "updated"
+LOCK = "refreshing"
+# seconds before the index is refreshed, and before a refresh is retried
+TTL = 300
+LOCK_TTL = 120
+KINDS = ("nodes", "vms", "storages", "services", "interfaces")
+
+OPTIONS = {
+    "-N": "nodes", "--node": "nodes",
+    "-T": "nodes", "--targets": "nodes",
+    "-i": "vms", "--vmid": "vms", "--pin": "vms",
+    "-S": "storages", "--storage": "storages",
+    "--service": "services",
+    "-I": "interfaces", "--interface": "interfaces"
+}
+# options whose meaning depends on the command
+COMMAND_OPTIONS = {
+    ("service", "-s"): "services",
+    ("events", "-i"): None,
+    ("reconcile", "-i"): None,
+    ("ls", "-i"): None
+}
+# options taking a comma separated list
+LISTS = ("-T", "--targets", "-i", "--vmid", "--pin")
+
+BASH = """_prox() {
+    local IFS=$'\\n'
+    COMPREPLY=($(prox __complete bash "${COMP_WORDS[@]:1:COMP_CWORD}" 2>/dev/null))
+}
+complete -o default -F _prox prox
+"""
+
+ZSH = """#compdef prox
+_prox() {
+    local -a items
+    items=("${(@f)$(prox __complete zsh "${(@)words[2,CURRENT]}" 2>/dev/null)}")
+    _describe 'prox' items
+}
+compdef _prox prox
+"""
+
+FISH = """function __prox_complete
+    prox __complete fish (commandline -opc)[2..-1] (commandline -ct) 2>/dev/null
+end
+complete -c prox -f -a '(__prox_complete)'
+"""
+
+SCRIPTS = {"bash": BASH, "zsh": ZSH, "fish": FISH}
+
+
+def launcher(python=None, root=ROOT):
+    """Shell words running main() with this interpreter, no site-packages"""
+    import shlex
+    code = 'import sys; sys.path.insert(0, "{}"); ' \
+        'from prox.libs.completion_lib import main; main()'.format(
+            root.replace("\\", "\\\\").replace('"', '\\"'))
+    return " ".join(shlex.quote(i) for i in (python or sys.executable, "-I", "-S",
+                                             "-c", code, "complete"))
+
+def script(shell):
+    """Completion script for ``shell``, calling this module directly"""
+    return SCRIPTS[shell].replace("prox __complete", launcher())
+
+def commands(path=CLI_FILE):
+    """Command names listed in the prox usage, read without importing cli"""
+    try:
+        with open(path) as f:
+            text = f.read()
+    except (IOError, OSError):
+        return list()
+    names = text.split("Commands:", 1)[-1].split("\n\n", 1)[0]
+    return [line.split()[0] for line in names.splitlines() if line.strip()]
+
+
+def read(kind, path=INDEX_DIR, prefix=""):
+    """(value, description) pairs of one kind starting with ``prefix``, empty without an index"""
+    try:
+        with open(os.path.join(path, kind)) as f:
+            lines = f.read().splitlines()
+    except (IOError, OSError):
+        return list()
+    return [line.partition("\t")[::2] for line in lines
+            if line and line.startswith(prefix)]
+
+def write(entries, path=INDEX_DIR):
+    """Replace the index, every file atomically, the stamp last"""
+    if not os.path.isdir(path):
+        os.makedirs(path)
+    for kind in KINDS:
+        tmp = os.path.join(path, kind + ".tmp")
+        with open(tmp, "w") as f:
+            for value, description in entries.get(kind, []):
+                f.write("{}\t{}\n".format(value, description or ""))
+        os.replace(tmp, os.path.join(path, kind))
+    with open(os.path.join(path, STAMP), "w") as f:
+        f.write(str(int(time.time())))
+
+def age(name, path=INDEX_DIR):
+    try:
+        return time.time() - os.path.getmtime(os.path.join(path, name))
+    except OSError:
+        return None
+
+def is_stale(path=INDEX_DIR, ttl=TTL):
+    updated = age(STAMP, path)
+    return updated is None or updated > ttl
+
+def refresh_in_background(path=INDEX_DIR):
+    """Start one detached refresh unless one is already running"""
+    started = age(LOCK, path)
+    if started is not None and started < LOCK_TTL:
+        return False
+    if not os.path.isdir(path):
+        os.makedirs(path)
+    with open(os.path.join(path, LOCK), "w") as f:
+        f.write(str(os.getpid()))
+    import subprocess
+    # completions run without site-packages, the refresh needs them and
+    # this copy of prox
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(i for i in (ROOT, env.get('PYTHONPATH')) if i)
+    with open(os.devnull, "w") as devnull:
+        subprocess.Popen([sys.executable, "-m", "prox.libs.completion_lib",
+                          "refresh", path],
+                         stdin=devnull, stdout=devnull, stderr=devnull,
+                         close_fds=True, start_new_session=True, env=env)
+    return True
+
+def collect():
+    """Read every value worth completing from the API"""
+    from prox.libs import clusters_lib
+    from prox.libs import network_lib
+    from prox.libs import task_lib
+
+    resources = clusters_lib.list_resources() or []
+    entries = dict((kind, list()) for kind in KINDS)
+    storages = {}
+    for i in resources:
+        if i.get('type') == "node":
+            entries['nodes'].append((i['node'], i.get('status') or ""))
+        elif i.get('type') in ("qemu", "lxc"):
+            entries['vms'].append((i['vmid'], "{} ({}, {})".format(
+                i.get('name') or "", i.get('type'), i.get('node'))))
+        elif i.get('type') == "storage":
+            storages.setdefault(i['storage'], set()).add(i.get('node'))
+    entries['storages'] = [(name, ", ".join(sorted(n for n in nodes if n)))
+                           for name, nodes in sorted(storages.items())]
+    entries['vms'].sort(key=lambda i: int(i[0]))
+
+    online = [name for name, status in entries['nodes'] if status == "online"]
+    if online:
+        services = clusters_lib.cluster_service(online[0])
+        entries['services'] = [(i.service or i.name, i.desc or "")
+                               for i in services]
+    interfaces = {}
+    for node, found, error in task_lib.run_parallel(
+            online, network_lib.get_interface, 8):
+        for i in found or []:
+            interfaces.setdefault(i.iface, set()).add(node)
+    entries['interfaces'] = [(name, ", ".join(sorted(nodes)))
+                             for name, nodes in sorted(interfaces.items())]
+    return entries
+
+def refresh(path=INDEX_DIR):
+    """Rebuild the index; after a failure the lock holds retries off for LOCK_TTL"""
+    write(collect(), path)
+    try:
+        os.remove(os.path.join(path, LOCK))
+    except OSError:
+        pass
+
+def _kind(command, option):
+    if (command, option) in COMMAND_OPTIONS:
+        return COMMAND_OPTIONS[(command, option)]
+    return OPTIONS.get(option)
+
+def complete(shell, words, commands=(), path=INDEX_DIR):
+    """
+    Candidates for the last of ``words``, the words after ``prox``.
+
+    Command names complete the first word and index values the word
+    after a known option (also as --option=value). Returns lines for
+    ``shell``: bare values for bash, value:description for zsh and
+    value<TAB>description for fish.
+    """
+    if not words:
+        words = [""]
+    current = words[-1]
+    previous = words[-2] if len(words) > 1 else None
+    # bash splits --node=pve into '--node', '=', 'pve'
+    if previous == "=" and len(words) > 2:
+        previous = words[-3]
+    elif current == "=" and previous:
+        current = ""
+    prefix = ""
+    if current.startswith("--") and "=" in current:
+        previous, current = current.split("=", 1)
+        if shell != "bash":
+            prefix = previous + "="
+
+    if len(words) == 1:
+        candidates = [(name, "") for name in commands]
+    else:
+        kind = _kind(words[0], previous)
+        if kind is None:
+            return list()
+        if is_stale(path):
+            refresh_in_background(path)
+        if previous in LISTS and "," in current:
+            head, current = current.rsplit(",", 1)
+            prefix += head + ","
+        candidates = read(kind, path, current)
+
+    lines = list()
+    for value, description in candidates:
+        if not value.startswith(current):
+            continue
+        value = prefix + value
+        if shell == "zsh":
+            lines.append("{}:{}".format(value.replace(":", "\\:"), description)
+                         if description else value.replace(":", "\\:"))
+        elif shell == "fish" and description:
+            lines.append("{}\t{}".format(value, description))
+        else:
+            lines.append(value)
+    return lines
+
+
+def main(argv=None):
+    """``complete SHELL WORDS...`` from the shell scripts, ``refresh [PATH]``"""
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["refresh"]:
+        refresh(argv[1] if len(argv) > 1 else INDEX_DIR)
+    elif argv[:1] == ["complete"] and len(argv) > 1:
+        lines = complete(argv[1], argv[2:], commands())
+        if lines:
+            print("\n".join(lines))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+from prox.libs import login_lib
+from prox.libs import models
+from prox.libs import proxmox_lib
+import queue
+import threading
+import time
+
+PASS = "pass"
+WARN = "warn"
+FAIL = "fail"
+LEVELS = (PASS, WARN, FAIL)
+
+# services a node can not work without, and ones it is degraded without
+CRITICAL_SERVICES = ("pve-cluster", "pvedaemon", "pveproxy", "pvestatd")
+SERVICES = ("corosync", "pve-firewall", "pve-ha-crm", "pve-ha-lrm",
+            "pvescheduler", "chrony", "sshd")
+
+STORAGE_WARN = 0.8
+STORAGE_FAIL = 0.9
+MEMORY_WARN = 0.85
+MEMORY_FAIL = 0.95
+# 1 minute load average per core
+LOAD_WARN = 1.0
+LOAD_FAIL = 2.0
+
+CHECKS = ("services", "storage", "status", "tasks", "interfaces")
+
+
+def get_auth():
+    try:
+        prox = login_lib.load_dumped_session()
+    except Exception as e:
+        print(e)
+        exit()
+    else:
+        return prox
+
+
+def result(node, check, level, detail=""):
+    return {"node": node, "check": check, "level": level, "detail": detail}
+
+
+def worst(levels):
+    levels = list(levels)
+    for level in (FAIL, WARN):
+        if level in levels:
+            return level
+    return PASS
+
+
+def check_services(node, rows):
+    services = models.Service.from_rows(rows)
+    problems = list()
+    level = PASS
+    for i in services:
+        name = i.service or i.name
+        if i.state == "running":
+            continue
+        if name in CRITICAL_SERVICES:
+            level = FAIL
+        elif name in SERVICES:
+            level = worst([level, WARN])
+        else:
+            continue
+        problems.append("{} {}".format(name, i.state))
+    return [result(node, "services", level, ", ".join(problems))]
+
+
+def check_storage(node, rows):
+    results = list()
+    for i in models.Storage.from_rows(rows):
+        if i.enabled == 0:
+            continue
+        if not i.active:
+            results.append(result(node, "storage", FAIL,
+                                  "{} inactive".format(i.storage)))
+            continue
+        usage = i.usage
+        if usage is None or usage < STORAGE_WARN:
+            continue
+        level = FAIL if usage >= STORAGE_FAIL else WARN
+        results.append(result(node, "storage", level,
+                              "{} {:.0%} full".format(i.storage, usage)))
+    return results or [result(node, "storage", PASS)]
+
+
+def check_status(node, data):
+    data = data or {}
+    results = list()
+    memory = data.get('memory') or {}
+    if memory.get('total'):
+        usage = float(memory.get('used', 0)) / memory['total']
+        if usage >= MEMORY_WARN:
+            level = FAIL if usage >= MEMORY_FAIL else WARN
+            results.append(result(node, "status", level,
+                                  "memory {:.0%} used".format(usage)))
+    cpus = (data.get('cpuinfo') or {}).get('cpus')
+    loadavg = data.get('loadavg')
+    if cpus and loadavg:
+        load = float(loadavg[0]) / cpus
+        if load >= LOAD_WARN:
+            level = FAIL if load >= LOAD_FAIL else WARN
+            results.append(result(node, "status", level,
+                                  "load {} on {} cpus".format(loadavg[0], cpus)))
+    return results or [result(node, "status", PASS)]
+
+
+def check_tasks(node, rows, since):
+    failed = [i for i in models.Task.from_rows(rows)
+              if i.endtime and i.endtime >= since and i.status != "OK"]
+    if not failed:
+        return [result(node, "tasks", PASS)]
+    detail = ", ".join("{} {}".format(i.type, i.target) for i in failed[:5])
+    if len(failed) > 5:
+        detail += " and {} more".format(len(failed) - 5)
+    return [result(node, "tasks", WARN,
+                   "{} failed: {}".format(len(failed), detail))]
+
+
+def check_interfaces(node, rows):
+    down = [i.iface for i in models.Interface.from_rows(rows)
+            if i.autostart and not i.active]
+    if not down:
+        return [result(node, "interfaces", PASS)]
+    return [result(node, "interfaces", FAIL,
+                   "down: {}".format(", ".join(sorted(down))))]
+
+
+def run_check(prox, node, check, since):
+    """Fetch what one check needs and judge it"""
+    if check == "services":
+        return check_services(node, proxmox_lib.check(prox.getNodeServiceList(node)))
+    if check == "storage":
+        return check_storage(node, proxmox_lib.check(prox.getNodeStorage(node)))
+    if check == "status":
+        return check_status(node, proxmox_lib.check(prox.getNodeStatus(node)))
+    if check == "tasks":
+        return check_tasks(node, proxmox_lib.check(prox.getNodeFinishedTasks(node)),
+                           since)
+    return check_interfaces(node, proxmox_lib.check(prox.getNodeNetworks(node)))
+
+
+def sweep(nodes, timeout=30, since=None, checks=CHECKS):
+    """
+    Run every check on every node at once under one deadline.
+
+    ``nodes`` are cluster/resources node rows; offline nodes fail without
+    being queried. Each (node, check) call runs on its own daemon thread,
+    so the sweep takes as long as the slowest call and a hung node is
+    reported as failed when the deadline passes instead of holding up
+    the result or the exit. Returns results sorted by node and check.
+    """
+    prox = get_auth()
+    if since is None:
+        since = time.time() - 86400
+    deadline = time.time() + timeout
+    done = queue.Queue()
+    results = list()
+    pending = set()
+
+    def call(node, check):
+        try:
+            found = run_check(prox, node, check, since)
+        except (Exception, SystemExit) as e:
+            found = [result(node, check, FAIL, "error: {}".format(e))]
+        done.put(((node, check), found))
+
+    for i in nodes:
+        node = i.get('node')
+        if i.get('status') != "online":
+            results.append(result(node, "node", FAIL,
+                                  "node {}".format(i.get('status') or "unknown")))
+            continue
+        for check in checks:
+            pending.add((node, check))
+            thread = threading.Thread(target=call, args=(node, check))
+            thread.daemon = True
+            thread.start()
+
+    while pending:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            break
+        try:
+            key, found = done.get(timeout=remaining)
+        except queue.Empty:
+            break
+        pending.discard(key)
+        results.extend(found)
+
+    for node, check in pending:
+        results.append(result(node, check, FAIL,
+                              "no answer within {}s".format(timeout)))
+    order = dict((check, index) for index, check in enumerate(("node",) + CHECKS))
+    results.sort(key=lambda r: (r['node'], order.get(r['check'], 99)))
+    return results
+
+
+def summary(results):
+    """Level counts per (node, check) and the overall level"""
+    cells = {}
+    for i in results:
+        key = (i['node'], i['check'])
+        cells[key] = worst([cells.get(key, PASS), i['level']])
+    counts = dict((level, 0) for level in LEVELS)
+    for level in cells.values():
+        counts[level] += 1
+    return counts, worst(cells.values())
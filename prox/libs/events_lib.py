@@ -0,0 +1,158 @@
+from prox.libs import utils
+import json
+import os
+
+CURSOR_FILE = "{}/.prox.events".format(utils.APP_HOME)
+MIGRATIONS = ("qmigrate", "vzmigrate")
+GUEST_EVENTS = {"running": "guest.started", "stopped": "guest.stopped"}
+
+
+def load_cursor(path=CURSOR_FILE):
+    """Cursor saved by a previous run, None on the first run"""
+    if not os.path.isfile(path):
+        return None
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except ValueError:
+        utils.log_warn("Ignoring broken cursor file " + path)
+        return None
+
+
+def save_cursor(cursor, path=CURSOR_FILE):
+    """Write the cursor atomically so a crash never leaves half a file"""
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(cursor, f)
+    os.replace(tmp, path)
+
+
+def new_cursor():
+    return {
+        "task_time": 0,
+        "task_seen": [],
+        "running": [],
+        "resources": None
+    }
+
+
+def _task_event(name, task):
+    event = {"event": name}
+    for key in ("upid", "node", "type", "id", "user", "status",
+                "starttime", "endtime"):
+        if key in task:
+            event[key] = task[key]
+    return event
+
+
+def task_events(tasks, cursor):
+    """
+    Events for tasks started or finished since the cursor.
+
+    Finished tasks newer than ``task_time`` give task.ok, task.failed or
+    migration.done; tasks never seen running give task.started. The
+    cursor is updated in place.
+    """
+    events = list()
+    seen = set(cursor['task_seen'])
+    running = set(cursor['running'])
+    still_running = set()
+    task_time = cursor['task_time']
+    newest = task_time
+    newest_seen = set(seen)
+
+    for task in sorted(tasks, key=lambda t: (t.get('endtime') or 0,
+                                             t.get('starttime') or 0)):
+        upid = task.get('upid')
+        endtime = task.get('endtime')
+        if not endtime:
+            still_running.add(upid)
+            if upid not in running and task.get('starttime', 0) >= task_time:
+                events.append(_task_event("task.started", task))
+            continue
+        if endtime < task_time or (endtime == task_time and upid in seen):
+            continue
+        if task.get('status') != "OK":
+            events.append(_task_event("task.failed", task))
+        elif task.get('type') in MIGRATIONS:
+            events.append(_task_event("migration.done", task))
+        else:
+            events.append(_task_event("task.ok", task))
+        if endtime > newest:
+            newest = endtime
+            newest_seen = set()
+        newest_seen.add(upid)
+
+    cursor['task_time'] = newest
+    cursor['task_seen'] = sorted(newest_seen)
+    cursor['running'] = sorted(still_running)
+    return events
+
+
+def _resource_key(resource):
+    if resource.get('type') in ("qemu", "lxc"):
+        return "{}/{}".format(resource['type'], resource['vmid'])
+    if resource.get('type') == "node":
+        return "node/{}".format(resource['node'])
+    return None
+
+
+def _resource_state(resource):
+    state = {"status": resource.get('status'), "node": resource.get('node')}
+    if resource.get('name'):
+        state['name'] = resource['name']
+    return state
+
+
+def resource_events(resources, cursor):
+    """
+    Events for guests and nodes that changed since the last poll.
+
+    Only the status and placement of every guest and node is remembered,
+    the first poll records a baseline and emits nothing. The cursor is
+    updated in place.
+    """
+    current = {}
+    for resource in resources:
+        key = _resource_key(resource)
+        if key:
+            current[key] = _resource_state(resource)
+
+    previous = cursor['resources']
+    cursor['resources'] = current
+    if previous is None:
+        return list()
+
+    events = list()
+    for key in sorted(set(previous) | set(current)):
+        kind, ident = key.split("/", 1)
+        before = previous.get(key)
+        after = current.get(key)
+        if before == after:
+            continue
+        event = {"id": ident}
+        if kind == "node":
+            event['event'] = "node.{}".format(
+                (after or {}).get('status') or "removed")
+            event['node'] = ident
+            events.append(event)
+            continue
+        event['type'] = kind
+        event['vmid'] = int(ident)
+        event.update(after or before)
+        if before is None:
+            event['event'] = "guest.created"
+        elif after is None:
+            event['event'] = "guest.removed"
+        else:
+            if before.get('node') != after.get('node'):
+                moved = dict(event, event="guest.moved",
+                             source=before.get('node'))
+                events.append(moved)
+            if before.get('status') == after.get('status'):
+                continue
+            event['event'] = GUEST_EVENTS.get(
+                after.get('status'), "guest.{}".format(after.get('status')))
+            event['previous'] = before.get('status')
+        events.append(event)
+    return events
@@ -0,0 +1,126 @@
+"""
+Storage fill-rate forecasting.
+
+Usage histories of every storage are packed into one padded matrix and
+a least-squares line is fitted to all of them at once with numpy, so a
+few hundred storages cost a handful of array operations.
+"""
+from prox.libs import login_lib
+from prox.libs import proxmox_lib
+import json
+
+LEVELS = (0.8, 0.9, 1.0)
+# usage past which a storage needs attention even when it is not growing
+URGENT = 0.9
+DAY = 86400.0
+
+
+def get_auth():
+    try:
+        prox = login_lib.load_dumped_session()
+    except Exception as e:
+        print(e)
+        exit()
+    else:
+        return prox
+
+def storage_history(node, storage, timeframe="month"):
+    """RRD rows (time, used, total) of one storage"""
+    prox = get_auth()
+    data = prox.getNodeStorageRRDData(node, storage, timeframe)
+    return proxmox_lib.check(data) or []
+
+def save_histories(histories, path):
+    with open(path, "w") as f:
+        json.dump(histories, f)
+
+def load_histories(path):
+    """Histories saved by save_histories, a list of node/storage/data dicts"""
+    with open(path) as f:
+        return json.load(f)
+
+def _matrix(histories):
+    """Pad histories into time, used and total matrices, NaN where missing"""
+    import numpy as np
+    width = max([len(i['data']) for i in histories] + [1])
+    times = np.full((len(histories), width), np.nan)
+    used = np.full((len(histories), width), np.nan)
+    total = np.full((len(histories), width), np.nan)
+    for row, history in enumerate(histories):
+        for column, point in enumerate(history['data']):
+            if point.get('time') is None or point.get('used') is None:
+                continue
+            times[row, column] = point['time']
+            used[row, column] = point['used']
+            if point.get('total') is not None:
+                total[row, column] = point['total']
+    return times, used, total
+
+def forecast(histories, levels=LEVELS):
+    """
+    Fit a fill trend to every history and project when it crosses levels.
+
+    Returns one dict per history with the current usage, the growth in
+    bytes per day and ``days`` mapping each level to the days until it
+    is reached: 0 when already past, None when the storage is not
+    growing or has too little data.
+    """
+    import numpy as np
+    if not histories:
+        return list()
+    times, used, total = _matrix(histories)
+    valid = ~np.isnan(times)
+    count = valid.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_t = np.where(valid, times, 0).sum(axis=1) / count
+        mean_u = np.where(valid, used, 0).sum(axis=1) / count
+        dt = np.where(valid, times - mean_t[:, None], 0)
+        du = np.where(valid, used - mean_u[:, None], 0)
+        slope = (dt * du).sum(axis=1) / (dt * dt).sum(axis=1)
+        rows = np.arange(len(histories))
+        columns = np.arange(times.shape[1])
+        # project from the newest sample, with the newest capacity as
+        # storages can be resized
+        newest = np.where(valid, columns, -1).max(axis=1)
+        current = used[rows, newest]
+        current[newest < 0] = np.nan
+        sized = np.where(~np.isnan(total), columns, -1).max(axis=1)
+        capacity = total[rows, sized]
+        capacity[sized < 0] = np.nan
+        usage = current / capacity
+        growth = slope * DAY
+        days = dict((level, (level * capacity - current) / growth)
+                    for level in levels)
+
+    results = list()
+    for row, history in enumerate(histories):
+        growing = count[row] >= 2 and np.isfinite(growth[row]) and \
+            growth[row] > 0 and np.isfinite(capacity[row])
+        result = {
+            "node": history.get('node'),
+            "storage": history.get('storage'),
+            "total": None if np.isnan(capacity[row]) else float(capacity[row]),
+            "usage": None if not np.isfinite(usage[row]) else float(usage[row]),
+            "growth": None if not np.isfinite(growth[row]) else float(growth[row]),
+            "days": {}
+        }
+        for level in levels:
+            value = None
+            if result['usage'] is not None and result['usage'] >= level:
+                value = 0.0
+            elif growing:
+                value = float(max(days[level][row], 0))
+            result['days'][level] = value
+        results.append(result)
+    return results
+
+def urgency(result):
+    """
+    Sort key: soonest at URGENT usage or full first, so a storage already
+    past URGENT leads whatever its trend, then the fullest of the others.
+    """
+    days = result['days']
+    soonest = [days.get(level) for level in (URGENT, max(days) if days else None)]
+    soonest = [i for i in soonest if i is not None]
+    first = min(soonest) if soonest else None
+    return (first is None, first or 0, -(result['usage'] or 0))
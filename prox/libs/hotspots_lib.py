@@ -0,0 +1,146 @@
+"""
+Noisy neighbour detection.
+
+RRD series of a node and of every guest on it are aligned on the node's
+time axis into one guests x samples matrix per resource. Share of the
+total, share during the node's peaks and correlation with the node are
+then computed for all guests at once with numpy.
+"""
+from prox.libs import login_lib
+from prox.libs import proxmox_lib
+import re
+
+WINDOW = re.compile(r'^(\d+)\s*([mhdw])$')
+UNITS = {"m": 60, "h": 3600, "d": 86400, "w": 7 * 86400}
+# smallest RRD timeframe covering a window, in seconds
+TIMEFRAMES = (("hour", 3600), ("day", 86400), ("week", 7 * 86400),
+              ("month", 31 * 86400), ("year", 366 * 86400))
+RESOURCES = ("cpu", "disk", "net")
+# samples above this quantile of the node total count as peaks
+PEAK = 0.9
+
+
+def get_auth():
+    try:
+        prox = login_lib.load_dumped_session()
+    except Exception as e:
+        print(e)
+        exit()
+    else:
+        return prox
+
+def parse_window(text):
+    """'1h' -> 3600, units are m, h, d and w"""
+    match = WINDOW.match(text.strip().lower())
+    if not match:
+        raise ValueError("Window must look like 30m, 1h, 2d or 1w")
+    return int(match.group(1)) * UNITS[match.group(2)]
+
+def timeframe(window):
+    for name, seconds in TIMEFRAMES:
+        if window <= seconds:
+            return name
+    return TIMEFRAMES[-1][0]
+
+def node_history(node, frame):
+    prox = get_auth()
+    return proxmox_lib.check(prox.getNodeRRDData(node, frame)) or []
+
+def guest_history(guest, frame):
+    prox = get_auth()
+    if guest.get('type') == "lxc":
+        data = prox.getLXCRRDData(guest['node'], guest['vmid'], frame)
+    else:
+        data = prox.getVirtualRRDData(guest['node'], guest['vmid'], frame)
+    return proxmox_lib.check(data) or []
+
+def _value(row, resource):
+    """One sample of a resource: cores, disk bytes/s or net bytes/s"""
+    if resource == "cpu":
+        if row.get('cpu') is None:
+            return None
+        return row['cpu'] * (row.get('maxcpu') or 1)
+    keys = ("diskread", "diskwrite") if resource == "disk" else ("netin", "netout")
+    values = [row.get(i) for i in keys if row.get(i) is not None]
+    return sum(values) if values else None
+
+def align(node_rows, guest_rows, window=None):
+    """
+    Put node and guest samples on the node's time axis.
+
+    Returns (times, node, guests) with ``node`` mapping each resource to
+    a vector (NaN where the node has no such series) and ``guests`` to a
+    guests x samples matrix, 0 where a guest has no sample. Only the last
+    ``window`` seconds are kept.
+    """
+    import numpy as np
+    times = sorted(set(i['time'] for i in node_rows if i.get('time') is not None))
+    if window and times:
+        times = [i for i in times if i > times[-1] - window]
+    index = dict((t, column) for column, t in enumerate(times))
+    node = {}
+    guests = {}
+    for resource in RESOURCES:
+        vector = np.full(len(times), np.nan)
+        for row in node_rows:
+            column = index.get(row.get('time'))
+            value = _value(row, resource)
+            if column is not None and value is not None:
+                vector[column] = value
+        node[resource] = vector
+        matrix = np.zeros((len(guest_rows), len(times)))
+        for number, rows in enumerate(guest_rows):
+            for row in rows:
+                column = index.get(row.get('time'))
+                value = _value(row, resource)
+                if column is not None and value is not None:
+                    matrix[number, column] = value
+        guests[resource] = matrix
+    return times, node, guests
+
+def _correlation(matrix, vector):
+    """Pearson correlation of every row with ``vector``, 0 when flat"""
+    import numpy as np
+    dm = matrix - matrix.mean(axis=1)[:, None]
+    dv = vector - vector.mean()
+    with np.errstate(invalid="ignore", divide="ignore"):
+        corr = dm.dot(dv) / (np.sqrt((dm * dm).sum(axis=1)) * np.sqrt(dv.dot(dv)))
+    return np.nan_to_num(corr)
+
+def rank(node_rows, guests, guest_rows, window=None, top=5):
+    """
+    Rank guests per resource by their part in the node's peaks.
+
+    For every resource returns up to ``top`` dicts, highest peak share
+    first: ``share`` of the node total over the window, ``peak`` share
+    at the node's busiest samples and ``corr`` with the node series.
+    The node total is the node's own series where it has one (CPU, net)
+    and the sum of its guests otherwise (disk I/O).
+    """
+    import numpy as np
+    times, node, matrices = align(node_rows, guest_rows, window)
+    ranking = {}
+    for resource in RESOURCES:
+        matrix = matrices[resource]
+        if not times or not len(guests):
+            ranking[resource] = list()
+            continue
+        total = node[resource]
+        summed = matrix.sum(axis=0)
+        total = np.where(np.isnan(total), summed, np.maximum(total, summed))
+        peaks = total >= np.quantile(total, PEAK)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            share = np.nan_to_num(matrix.sum(axis=1) / total.sum())
+            peak = np.nan_to_num(matrix[:, peaks].sum(axis=1) / total[peaks].sum())
+        corr = _correlation(matrix, total)
+        order = np.lexsort((-corr, -peak))[:top]
+        ranking[resource] = [{
+            "vmid": guests[i].get('vmid'),
+            "name": guests[i].get('name'),
+            "type": guests[i].get('type'),
+            "share": float(share[i]),
+            "peak": float(peak[i]),
+            "corr": float(corr[i]),
+            "mean": float(matrix[i].mean())
+        } for i in order if matrix[i].any()]
+    return ranking
@@ -3,17 +3,29 @@ from prox.libs import utils
 from prox.libs import proxmox_lib
 import os
 import dill
+import threading
 
 APP_HOME = utils.APP_HOME
 
-def create_env_file(username, password, auth_url = None, port = None):
+# session loaded once per process and shared by every lib call
+_session = None
+_session_lock = threading.Lock()
+
+def create_env_file(username, password, auth_url = None, port = None, token = None):
+    """Write ~/.prox.env, with a token the password is not stored"""
+    path = "{}/.prox.env".format(APP_HOME)
     try:
-        env_file = open("{}/.prox.env".format(APP_HOME), "w+")
-        env_file.write("OS_USERNAME=%s\n" % username)
-        env_file.write("OS_PASSWORD=%s\n" % password)
-        env_file.write("OS_PROJECT_URL=%s\n" % auth_url)
-        env_file.write("OS_PROJECT_PORT=%s\n" % port)
-        env_file.close()
+        # created owner only, the secret is never readable by others
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        os.chmod(path, 0o600)
+        with os.fdopen(fd, "w") as env_file:
+            env_file.write("OS_USERNAME=%s\n" % username)
+            if token:
+                env_file.write("OS_API_TOKEN=%s\n" % token)
+            else:
+                env_file.write("OS_PASSWORD=%s\n" % password)
+            env_file.write("OS_PROJECT_URL=%s\n" % auth_url)
+            env_file.write("OS_PROJECT_PORT=%s\n" % port)
         return True
     except Exception as e:
         print(e)
@@ -21,22 +33,75 @@ def create_env_file(username, password, auth_url = None, port = None):
 
 
 def dump_session(sess):
+    """
+    Keep the session for later commands in /tmp/prox.pkl, readable by
+    the owner only. Token sessions are not written, they are rebuilt
+    from ~/.prox.env and the token never reaches /tmp.
+    """
+    global _session
+    _session = sess
+    if getattr(sess, 'headers', None):
+        return
     try:
-        with open('/tmp/prox.pkl', 'wb') as f:
+        fd = os.open('/tmp/prox.pkl', os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        os.chmod('/tmp/prox.pkl', 0o600)
+        with os.fdopen(fd, 'wb') as f:
             dill.dump(sess, f)
     except Exception:
         utils.log_err("Dump session failed")
 
 
 def load_dumped_session():
+    global _session
+    if _session is not None:
+        return _session
+    with _session_lock:
+        if _session is None:
+            _session = _load_dumped_session()
+    return _session
+
+
+def forget_requests():
+    """Make the next GETs of this process reach the API, for pollers"""
+    if _session is not None and hasattr(_session, 'forget'):
+        _session.forget()
+
+
+def request_stats():
+    """(sent, saved) memoized GETs of this process"""
+    if _session is None or not hasattr(_session, 'memo'):
+        return 0, 0
+    memo = _session.memo()
+    return memo.made, memo.saved
+
+
+def refresh_gateways(sess):
+    """Learn the cluster members again once the cached list is stale"""
+    if not hasattr(sess, 'discover'):
+        return
+    try:
+        if sess.gateways().stale():
+            sess.discover()
+    except Exception as e:
+        utils.log_warn("Could not learn the cluster members: {}".format(e))
+
+
+def _load_dumped_session():
     try:
         if check_session():
             sess = None
             with open('/tmp/prox.pkl', 'rb') as f:
                 sess = dill.load(f)
+            refresh_gateways(sess)
+            return sess
+        env = utils.get_env_values() if utils.check_env() else None
+        if env and env.get('token'):
+            # a token session is built locally, no request is needed
+            sess = connect_proxmox(env['project_url'], env['username'],
+                                   None, env['token'])
+            refresh_gateways(sess)
             return sess
-        else:
-            return load_dumped_session()
+        raise Exception("No session found in /tmp/prox.pkl")
     except Exception as e:
         utils.log_err("Loading Session Failed")
         utils.log_err("Please login first")
@@ -53,8 +118,8 @@ def logout():
     else:
         print("Not Current Sessions")
 
-def connect_proxmox(host, username, password):
-    prox_at = proxmox_lib.proxmox_auth(host, username, password)
+def connect_proxmox(host, username, password, token=None):
+    prox_at = proxmox_lib.proxmox_auth(host, username, password, token)
     return prox_at
 
 
@@ -0,0 +1,121 @@
+from prox.libs import login_lib
+from prox.libs import proxmox_lib
+from prox.libs import task_lib
+import re
+import time
+
+DOWNTIME = re.compile(r'downtime[: ]+(\d+)\s*ms')
+
+
+def get_auth():
+    try:
+        prox = login_lib.load_dumped_session()
+    except Exception as e:
+        print(e)
+        exit()
+    else:
+        return prox
+
+def migrate_vm(node, vm_id, target, online=False, bwlimit=None,
+               with_local_disks=False):
+    prox = get_auth()
+    task = prox.migrateVirtualMachine(node, vm_id, target, online, bwlimit,
+                                      with_local_disks)
+    return proxmox_lib.check(task)
+
+def migrate_container(node, vm_id, target, restart=False, bwlimit=None):
+    """Containers do not move live, a running one is stopped and started again"""
+    prox = get_auth()
+    task = prox.migrateLXCContainer(node, vm_id, target, restart, bwlimit)
+    return proxmox_lib.check(task)
+
+def headroom(nodes):
+    """
+    Free memory and CPU of every online node, from cluster/resources rows.
+
+    Memory is in bytes, CPU in cores.
+    """
+    free = {}
+    for i in nodes:
+        if i.get('status') != "online":
+            continue
+        free[i['node']] = {
+            "mem": i.get('maxmem', 0) - i.get('mem', 0),
+            "cpu": i.get('maxcpu', 0) * (1 - i.get('cpu', 0)),
+            "maxmem": i.get('maxmem', 0)
+        }
+    return free
+
+def plan_evacuation(vms, nodes, source, targets=None, reserve=0.1):
+    """
+    Pick a target node for every VM leaving ``source``.
+
+    Largest VMs are placed first, each on the node with the most free
+    memory after earlier placements; ``reserve`` is the share of a
+    target's memory kept free. Stopped VMs are spread the same way but
+    never rejected, they only move a config. Returns (moves, unplaced),
+    moves being (vm, target) pairs.
+    """
+    free = headroom(nodes)
+    free.pop(source, None)
+    if targets:
+        free = dict((k, v) for k, v in free.items() if k in targets)
+    moves = list()
+    unplaced = list()
+    ordered = sorted(vms, key=lambda vm: (vm.get('status') == "running",
+                                          vm.get('maxmem', 0)), reverse=True)
+    for vm in ordered:
+        running = vm.get('status') == "running"
+        need_mem = vm.get('maxmem', 0)
+        need_cpu = vm.get('maxcpu', 0) * vm.get('cpu', 0) if running else 0
+        best = None
+        for name, room in free.items():
+            if running and room['mem'] - need_mem < room['maxmem'] * reserve:
+                continue
+            key = (room['mem'] - need_mem, room['cpu'] - need_cpu, name)
+            if best is None or key > best[0]:
+                best = (key, name)
+        if best is None:
+            unplaced.append(vm)
+            continue
+        target = best[1]
+        free[target]['mem'] -= need_mem
+        free[target]['cpu'] -= need_cpu
+        moves.append((vm, target))
+    return moves, unplaced
+
+def downtime(log):
+    """Downtime in ms reported by a live migration task log, or None"""
+    for line in reversed(log):
+        match = DOWNTIME.search(line)
+        if match:
+            return int(match.group(1))
+    return None
+
+def migrate_and_wait(vm, target, bwlimit=None, with_local_disks=False,
+                     timeout=None):
+    """
+    Migrate one guest and follow its task to the end, containers with a
+    restart migration.
+
+    Returns a dict with the task UPID, wall duration in seconds and the
+    downtime in ms (live migrations only).
+    """
+    online = vm.get('status') == "running"
+    start = time.time()
+    if vm.get('type') == "lxc":
+        upid = migrate_container(vm['node'], vm['vmid'], target, online, bwlimit)
+        online = False
+    else:
+        upid = migrate_vm(vm['node'], vm['vmid'], target, online, bwlimit,
+                          with_local_disks)
+    task_lib.wait_task(upid, vm['node'], timeout)
+    duration = time.time() - start
+    down = None
+    if online:
+        down = downtime(task_lib.task_log(vm['node'], upid, limit=100000))
+    return {
+        "upid": upid,
+        "duration": duration,
+        "downtime": down
+    }
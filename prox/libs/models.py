@@ -0,0 +1,117 @@
+"""
+Typed records for API rows.
+
+Rows are copied once into ``__slots__`` records, which hold no per
+instance dict, and handed as they are to the table formatter. Every
+record answers ``getattr`` for each of its fields, a field missing from
+the API row is None.
+"""
+from tabulate import tabulate
+
+
+class Record(object):
+    __slots__ = ()
+    # API key to read for a field when it is not named like the field
+    aliases = {}
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name))
+
+    @classmethod
+    def from_api(cls, row):
+        record = cls.__new__(cls)
+        aliases = cls.aliases
+        for name in cls.__slots__:
+            value = row.get(name)
+            if value is None and name in aliases:
+                value = row.get(aliases[name])
+            setattr(record, name, value)
+        return record
+
+    @classmethod
+    def from_rows(cls, rows):
+        if rows is None:
+            return list()
+        return [cls.from_api(row) for row in rows]
+
+    def get(self, name, default=None):
+        value = getattr(self, name, None)
+        if value is None:
+            return default
+        return value
+
+    def as_dict(self):
+        return dict((name, getattr(self, name)) for name in self.__slots__)
+
+    def __repr__(self):
+        return "{}({})".format(type(self).__name__, ", ".join(
+            "{}={!r}".format(name, getattr(self, name))
+            for name in self.__slots__))
+
+
+class Node(Record):
+    __slots__ = ("node", "status", "cpu", "maxcpu", "mem", "maxmem",
+                 "disk", "maxdisk", "uptime", "ip", "id", "type", "nodeid",
+                 "online", "level", "local", "name")
+
+
+class Guest(Record):
+    __slots__ = ("vmid", "name", "node", "type", "status", "cpus", "cpu",
+                 "mem", "maxmem", "disk", "maxdisk", "uptime", "template",
+                 "netin", "netout", "diskread", "diskwrite", "pool", "tags",
+                 "ip")
+    aliases = {"cpus": "maxcpu"}
+
+
+class Storage(Record):
+    __slots__ = ("storage", "node", "type", "content", "total", "used",
+                 "avail", "shared", "active", "enabled", "status")
+    aliases = {"total": "maxdisk", "used": "disk", "type": "plugintype"}
+
+    @property
+    def usage(self):
+        """Used share of the storage, 0 to 1"""
+        if self.total and self.used is not None:
+            return float(self.used) / self.total
+        return None
+
+
+class Task(Record):
+    __slots__ = ("upid", "node", "id", "type", "user", "status", "starttime",
+                 "endtime", "pid", "pstart", "saved")
+
+    @property
+    def target(self):
+        """Task object, node wide tasks have an empty id"""
+        return self.id or "master"
+
+    @property
+    def duration(self):
+        if self.starttime and self.endtime:
+            return self.endtime - self.starttime
+        return None
+
+
+class Service(Record):
+    __slots__ = ("service", "name", "desc", "state")
+
+
+class Interface(Record):
+    __slots__ = ("iface", "type", "method", "method6", "active", "autostart",
+                 "address", "netmask", "gateway", "bridge_ports", "families",
+                 "exists", "priority")
+
+
+def table(records, columns, tablefmt='grid'):
+    """
+    Render records with tabulate.
+
+    ``columns`` is a list of (field, header) pairs; rows go to tabulate
+    as plain lists, no dict is built per row.
+    """
+    fields = [field for field, header in columns]
+    headers = [header for field, header in columns]
+    rows = [[getattr(record, field, None) for field in fields]
+            for record in records]
+    return tabulate(rows, headers=headers, tablefmt=tablefmt)
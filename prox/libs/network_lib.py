@@ -1,4 +1,5 @@
 from prox.libs import login_lib
+from prox.libs import models
 
 def get_auth():
     try:
@@ -12,9 +13,11 @@ def get_auth():
 def get_interface(node):
     prox = get_auth()
     network = prox.getNodeNetworks(node)
-    return network['data']
+    return models.Interface.from_rows(network['data'])
 
 def get_interface_details(node, interface):
     prox = get_auth()
     network = prox.getNodeInterface(node, interface)
-    return network['data']
\ No newline at end of file
+    if not network['data']:
+        return None
+    return models.Interface.from_api(network['data'])
\ No newline at end of file
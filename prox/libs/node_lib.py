@@ -1,5 +1,7 @@
 from prox.libs import login_lib
+from prox.libs import models
 from prox.libs import utils
+import requests
 
 def get_auth():
     try:
@@ -10,15 +12,24 @@ def get_auth():
     else:
         return prox
 
+def checked_rows(rows):
+    """
+    Rows of a streamed listing. An API error (expired ticket, unknown
+    node) is logged and ends the rows, the caller sees no data.
+    """
+    try:
+        for row in rows:
+            yield row
+    except requests.exceptions.HTTPError as e:
+        utils.log_err("Request failed: {}".format(e))
+
 def list_vm_by_node(node):
     prox = get_auth()
-    vm_list = prox.getNodeVirtualIndex(node)
-    return vm_list['data']
+    return models.Guest.from_rows(checked_rows(prox.iterNodeVirtualIndex(node)))
 
 def list_container_by_node(node):
     prox = get_auth()
-    vm_list = prox.getNodeContainerIndex(node)
-    return vm_list['data']
+    return models.Guest.from_rows(checked_rows(prox.iterNodeLXCIndex(node)))
 
 def vm_next():
     prox = get_auth()
@@ -27,8 +38,7 @@ def vm_next():
 
 def get_storage(node):
     prox = get_auth()
-    list_storage = prox.getNodeStorage(node)
-    return list_storage['data']
+    return models.Storage.from_rows(checked_rows(prox.iterNodeStorage(node)))
 
 def get_storage_detail(node, storage):
     prox = get_auth()
@@ -37,28 +47,17 @@ def get_storage_detail(node, storage):
     except Exception as e:
         print(e)
         raise e
-    detail_storage = list()
     for i in data['data']:
         if i['storage'] == storage:
-            content = None
-            content = i['content']
-            content = content.split(",")
-            detail_storage.append({
-                "storage": i['storage'],
-                "avail": i['avail'],
-                "type": i['type'],
-                "total": i['total'],
-                "used": i['used'],
-                "shared": i['shared'],
-                "active": i['active'],
-                "enabled": i['enabled'],
-                "content": content,
-            })
-            return detail_storage
+            detail = models.Storage.from_api(i)
+            detail.content = (detail.content or "").split(",")
+            return [detail]
 
 def get_finish_task(node):
     prox = get_auth()
     list_finish = prox.getNodeFinishedTasks(node)
+    if list_finish and list_finish.get('data') is not None:
+        list_finish['data'] = models.Task.from_rows(list_finish['data'])
     return list_finish
 
 def get_node_dns(node):
@@ -76,6 +75,15 @@ def get_node_syslog(node):
     list_syslog= prox.getNodeSyslog(node)
     return list_syslog['data']
 
+def iter_node_syslog(node, limit=None):
+    prox = get_auth()
+    return checked_rows(prox.iterNodeSyslog(node, limit=limit))
+
+def iter_finish_task(node, limit=None):
+    prox = get_auth()
+    return (models.Task.from_api(i)
+            for i in checked_rows(prox.iterNodeTasks(node, limit=limit)))
+
 def get_node_rrd(node, path=None):
     prox = get_auth()
     png_rrd= prox.getNodeRRD(node)
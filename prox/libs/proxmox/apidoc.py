@@ -0,0 +1,387 @@
+"""
+Client generated from the Proxmox API schema.
+
+Every Proxmox node serves the schema behind its API viewer at
+/pve-docs/api-viewer/apidoc.js. It is fetched once, stripped down to
+paths, parameters and return types and cached in
+~/.prox.apidoc.<host>-<version>.json, one file per login host and
+Proxmox VE version, so a cluster never validates against the schema of
+another one or of the release it ran before an upgrade.
+Nothing is generated at import time: an endpoint is an Endpoint object
+made on attribute access and looked up in the schema only when called.
+
+    api = prox.api
+    api.nodes("pve").qemu(100).status.current.get()
+    api.nodes("pve").lxc.get()
+    api.nodes("pve").qemu(100).agent["network-get-interfaces"].get()
+    api.nodes("pve").qemu(100).migrate.post(target="pve2", online=True)
+
+Parameters are checked against the schema before a request is sent and
+values in the response are converted to the declared integer, number
+and boolean types. Results keep the pyproxmox shape, a dict holding
+``data``, and go through the session's connect().
+"""
+import json
+import os
+import re
+import threading
+import time
+from .jsonstream import loads
+
+try:
+    from urllib.parse import urlencode
+except ImportError:
+    from urllib import urlencode
+
+SCHEMA_URL = "https://%s:8006/pve-docs/api-viewer/apidoc.js"
+# {} is filled by cache_key()
+CACHE_FILE = os.path.join(os.path.expanduser("~"), ".prox.apidoc.{}.json")
+# a cached schema older than this is fetched again
+CACHE_TTL = 7 * 86400
+METHODS = ("GET", "POST", "PUT", "DELETE")
+# parameter keys kept from the schema, descriptions are dropped
+KEEP = ("type", "optional", "enum", "minimum", "maximum", "default", "items",
+        "properties")
+PLACEHOLDER = "{}"
+
+
+class SchemaError(ValueError):
+    """A call does not match the API schema"""
+    pass
+
+
+def extract(script):
+    """The schema array inside apidoc.js"""
+    if isinstance(script, bytes):
+        script = script.decode("utf-8")
+    start = script.find("apiSchema")
+    start = script.find("[", start)
+    if start < 0:
+        raise SchemaError("No apiSchema in the API viewer script")
+    return json.JSONDecoder().raw_decode(script, start)[0]
+
+def cache_key(host, version=None):
+    """File name part of a schema cache: the login host and PVE version"""
+    key = host if not version else "{}-{}".format(host, version)
+    return re.sub(r'[^\w.-]', "_", key)
+
+def _prune(schema):
+    """Keep what validation and typing need of a parameter/return schema"""
+    if not isinstance(schema, dict):
+        return schema
+    pruned = dict((key, schema[key]) for key in KEEP if key in schema)
+    if isinstance(pruned.get('items'), dict):
+        pruned['items'] = _prune(pruned['items'])
+    if isinstance(pruned.get('properties'), dict):
+        pruned['properties'] = dict((name, _prune(value)) for name, value
+                                    in pruned['properties'].items())
+    return pruned
+
+def compact(tree):
+    """Flatten the schema tree into {path: {METHOD: {parameters, returns}}}"""
+    endpoints = {}
+    stack = list(tree)
+    while stack:
+        item = stack.pop()
+        stack.extend(item.get('children') or [])
+        info = item.get('info') or {}
+        methods = {}
+        for method in METHODS:
+            if method not in info:
+                continue
+            parameters = (info[method].get('parameters') or {}).get('properties') or {}
+            methods[method] = {
+                "parameters": _prune({"properties": parameters})['properties'],
+                "returns": _prune(info[method].get('returns') or {})
+            }
+        if item.get('path'):
+            endpoints[item['path']] = methods
+    return endpoints
+
+
+class Schema(object):
+    """Endpoints of a compact schema, indexed by path segment on first use"""
+
+    def __init__(self, endpoints):
+        self.endpoints = endpoints
+        self._trie = None
+        self._lock = threading.Lock()
+
+    def trie(self):
+        if self._trie is None:
+            with self._lock:
+                if self._trie is None:
+                    trie = {}
+                    for path, methods in self.endpoints.items():
+                        node = trie
+                        for segment in path.strip("/").split("/"):
+                            if segment.startswith("{"):
+                                segment = PLACEHOLDER
+                            node = node.setdefault(segment, {})
+                        node[None] = (path, methods)
+                    self._trie = trie
+        return self._trie
+
+    def resolve(self, segments):
+        """
+        Match concrete path segments to an endpoint.
+
+        A literal segment wins over a {placeholder}; an attribute spelt
+        with underscores also matches a hyphenated segment. Returns
+        (segments as sent, schema path, methods), raises SchemaError.
+        """
+        node = self.trie()
+        sent = list()
+        for segment in segments:
+            segment = str(segment)
+            for candidate in (segment, segment.replace("_", "-")):
+                if candidate in node:
+                    node = node[candidate]
+                    sent.append(candidate)
+                    break
+            else:
+                if PLACEHOLDER not in node:
+                    raise SchemaError("No such endpoint: /" + "/".join(
+                        sent + [segment]))
+                node = node[PLACEHOLDER]
+                sent.append(segment)
+        if None not in node:
+            raise SchemaError("No such endpoint: /" + "/".join(sent))
+        path, methods = node[None]
+        return sent, path, methods
+
+
+def _check_value(name, value, schema):
+    kind = schema.get('type')
+    if kind == "boolean":
+        if value in (True, False, 0, 1, "0", "1"):
+            return int(value)
+        raise SchemaError("{} must be a boolean".format(name))
+    if kind in ("integer", "number"):
+        try:
+            number = int(value) if kind == "integer" else float(value)
+        except (TypeError, ValueError):
+            raise SchemaError("{} must be an {}".format(name, kind))
+        if schema.get('minimum') is not None and number < schema['minimum']:
+            raise SchemaError("{} must be at least {}".format(name, schema['minimum']))
+        if schema.get('maximum') is not None and number > schema['maximum']:
+            raise SchemaError("{} must be at most {}".format(name, schema['maximum']))
+        return number
+    if schema.get('enum') and str(value) not in [str(i) for i in schema['enum']]:
+        raise SchemaError("{} must be one of {}".format(
+            name, ", ".join(str(i) for i in schema['enum'])))
+    return value
+
+def _parameter(name, properties):
+    """Schema key of a parameter: the name, its hyphen form or a net[n] family"""
+    for candidate in (name, name.replace("_", "-")):
+        if candidate in properties:
+            return candidate, candidate
+        family = re.sub(r'\d+$', '[n]', candidate)
+        if family != candidate and family in properties:
+            return candidate, family
+    return None, None
+
+def validate(method, params, info, path_params=()):
+    """
+    Check call parameters against the schema of one method.
+
+    Keyword spellings with underscores map to hyphenated parameters.
+    Returns the parameters to send, booleans as 0/1 and None dropped.
+    """
+    properties = info.get('parameters') or {}
+    checked = {}
+    for name, value in params.items():
+        if value is None:
+            continue
+        sent, key = _parameter(name, properties)
+        if key is None:
+            raise SchemaError("{} does not take '{}'".format(method, name))
+        checked[sent] = _check_value(sent, value, properties[key])
+    for name, schema in properties.items():
+        if name in path_params or "[n]" in name:
+            continue
+        if not schema.get('optional') and 'default' not in schema \
+                and name not in checked:
+            raise SchemaError("{} needs '{}'".format(method, name))
+    return checked
+
+def coerce(value, schema):
+    """Convert a returned value to the types the schema declares"""
+    if value is None or not isinstance(schema, dict):
+        return value
+    kind = schema.get('type')
+    try:
+        if kind == "integer" and not isinstance(value, bool):
+            return int(value)
+        if kind == "number" and not isinstance(value, bool):
+            return float(value)
+        if kind == "boolean":
+            return bool(int(value))
+    except (TypeError, ValueError):
+        return value
+    if kind == "array" and isinstance(value, list) and schema.get('items'):
+        return [coerce(i, schema['items']) for i in value]
+    if isinstance(value, dict) and schema.get('properties'):
+        properties = schema['properties']
+        return dict((key, coerce(item, properties.get(key)))
+                    for key, item in value.items())
+    return value
+
+
+class Endpoint(object):
+    """One API path, grown by attribute access, item access or calls"""
+
+    def __init__(self, client, segments=()):
+        self._client = client
+        self._segments = tuple(segments)
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return Endpoint(self._client, self._segments + (name,))
+
+    def __getitem__(self, segment):
+        return Endpoint(self._client, self._segments + (segment,))
+
+    def __call__(self, *segments):
+        return Endpoint(self._client, self._segments + segments)
+
+    def __repr__(self):
+        return "<Endpoint /{}>".format("/".join(str(i) for i in self._segments))
+
+    def get(self, params=None, **kwargs):
+        return self._client.call("GET", self._segments, params, kwargs)
+
+    def post(self, params=None, **kwargs):
+        return self._client.call("POST", self._segments, params, kwargs)
+
+    def put(self, params=None, **kwargs):
+        return self._client.call("PUT", self._segments, params, kwargs)
+
+    def delete(self, params=None, **kwargs):
+        return self._client.call("DELETE", self._segments, params, kwargs)
+
+    create = post
+    set = put
+
+    def info(self, method="GET"):
+        """Schema of a method of this endpoint, None without a schema"""
+        schema = self._client.schema()
+        if schema is None:
+            return None
+        return schema.resolve(self._segments)[2].get(method)
+
+
+class Client(Endpoint):
+    """
+    Root of the generated client, bound to a pyproxmox session.
+
+    The schema comes from ``cache_file`` or, when that is missing or
+    stale, from the node the session talks to. A ``{}`` in
+    ``cache_file`` is replaced by the login host and the version the
+    cluster answers on /version. Without any schema calls are sent
+    unchecked.
+    """
+
+    def __init__(self, prox, cache_file=CACHE_FILE):
+        Endpoint.__init__(self, self)
+        self._prox = prox
+        self._cache_file = cache_file
+        self._schema = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def schema(self):
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    path = self.cache_path()
+                    endpoints = self._read_cache(path)
+                    if endpoints is None:
+                        endpoints = self._fetch(path)
+                    if endpoints is not None:
+                        self._schema = Schema(endpoints)
+                    self._loaded = True
+        return self._schema
+
+    def cache_path(self):
+        if "{}" not in self._cache_file:
+            return self._cache_file
+        return self._cache_file.format(cache_key(self._prox.url, self._version()))
+
+    def _version(self):
+        """Proxmox VE version of the cluster, None when it can not be read"""
+        try:
+            return self._prox.connect("get", "version", None)['data']['version']
+        except Exception:
+            return None
+
+    def _read_cache(self, path):
+        try:
+            if time.time() - os.path.getmtime(path) > CACHE_TTL:
+                return None
+            with open(path, "rb") as f:
+                return loads(f.read())
+        except (IOError, OSError, ValueError):
+            return None
+
+    def _fetch(self, path):
+        prox = self._prox
+
+        def send(host):
+            return prox.session().get(SCHEMA_URL % (host), cookies=prox.ticket)
+
+        try:
+            # a member that refuses the connection is skipped like for
+            # any other read
+            response = prox._failover(send)
+            response.raise_for_status()
+            endpoints = compact(extract(response.content))
+        except Exception:
+            return None
+        try:
+            tmp = path + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump(endpoints, f, separators=(",", ":"))
+            os.replace(tmp, path)
+        except (IOError, OSError):
+            pass
+        return endpoints
+
+    def refresh(self):
+        """Fetch the schema from the node again"""
+        with self._lock:
+            endpoints = self._fetch(self.cache_path())
+            if endpoints is not None:
+                self._schema = Schema(endpoints)
+            self._loaded = True
+        return self._schema is not None
+
+    def call(self, method, segments, params=None, kwargs=None):
+        params = dict(params or {}, **(kwargs or {}))
+        segments = [str(i) for i in segments]
+        schema = self.schema()
+        info = None
+        if schema is not None:
+            segments, path, methods = schema.resolve(segments)
+            if method not in methods:
+                raise SchemaError("{} {} is not in the API".format(method, path))
+            info = methods[method]
+            path_params = re.findall(r'\{([^}]+)\}', path)
+            params = validate("{} {}".format(method, path), params, info,
+                              path_params)
+        else:
+            params = dict((key, int(value) if isinstance(value, bool) else value)
+                          for key, value in params.items() if value is not None)
+
+        option = "/".join(segments)
+        if method == "GET":
+            if params:
+                option += "?" + urlencode(sorted(params.items()))
+            result = self._prox.connect("get", option, None)
+        else:
+            result = self._prox.connect(method.lower(), option, params)
+        if info and isinstance(result, dict) and result.get('data') is not None:
+            result['data'] = coerce(result['data'], info.get('returns'))
+        return result
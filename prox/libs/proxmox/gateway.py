@@ -0,0 +1,145 @@
+"""
+API endpoint selection and failover.
+
+Every cluster member serves the whole API and accepts the same ticket
+or token, so requests need not go to the host typed at login. Members
+are learnt from cluster/status, timed with a TCP connect to their API
+port and the fastest one that answers is used. A request that cannot
+connect marks its host down for DOWN_TTL seconds and moves on to the
+next member. Members, times and down marks are kept per login host in
+~/.prox.gateways.json and learnt again after TTL seconds.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+import socket
+import threading
+import time
+
+CACHE_FILE = os.path.join(os.path.expanduser("~"), ".prox.gateways.json")
+# members are learnt again after TTL seconds, a host that failed is
+# skipped for DOWN_TTL seconds
+TTL = 3600
+DOWN_TTL = 60
+PORT = 8006
+PROBE_TIMEOUT = 1.0
+# seconds a request waits for a TCP connection before failing over
+CONNECT_TIMEOUT = 3.05
+
+
+def probe(host, port=PORT, timeout=PROBE_TIMEOUT):
+    """Seconds a TCP connect to ``host`` takes, None when it does not answer"""
+    started = time.time()
+    try:
+        socket.create_connection((host.strip("[]"), port), timeout).close()
+    except (OSError, ValueError):
+        return None
+    return time.time() - started
+
+def members(status):
+    """API hosts of the online nodes in cluster/status rows, IPv6 in brackets"""
+    hosts = list()
+    for row in status or []:
+        if row.get('type') != "node" or not row.get('ip'):
+            continue
+        if row.get('online', 1) in (0, "0"):
+            continue
+        ip = row['ip']
+        hosts.append("[{}]".format(ip) if ":" in ip else ip)
+    return hosts
+
+
+class Gateways(object):
+    """Members of one cluster, fastest first, and the one in use"""
+
+    def __init__(self, login_host, cache_file=None):
+        self.login_host = login_host
+        self.cache_file = cache_file or CACHE_FILE
+        self.hosts = [login_host]
+        self.rtt = {}
+        self.down = {}
+        self.updated = 0
+        self.lock = threading.Lock()
+        self._read_cache()
+        self.current = self.pick()
+
+    def _read_cache(self):
+        try:
+            with open(self.cache_file) as f:
+                entry = json.load(f).get(self.login_host)
+        except (IOError, OSError, ValueError, AttributeError):
+            return
+        if entry and entry.get('hosts'):
+            self.hosts = entry['hosts']
+            self.rtt = entry.get('rtt') or {}
+            self.down = entry.get('down') or {}
+            self.updated = entry.get('updated') or 0
+
+    def save(self):
+        """Write this cluster's entry, other login hosts are kept"""
+        try:
+            with open(self.cache_file) as f:
+                cache = json.load(f)
+        except (IOError, OSError, ValueError):
+            cache = {}
+        with self.lock:
+            cache[self.login_host] = {"hosts": self.hosts, "rtt": self.rtt,
+                                      "down": self.down, "updated": self.updated}
+        try:
+            tmp = "{}.{}.tmp".format(self.cache_file, os.getpid())
+            with open(tmp, "w") as f:
+                json.dump(cache, f)
+            os.replace(tmp, self.cache_file)
+        except (IOError, OSError):
+            pass
+
+    def stale(self):
+        return time.time() - self.updated > TTL
+
+    def pick(self, skip=()):
+        """Fastest host not down nor in ``skip``, else the one down longest"""
+        now = time.time()
+        left = [host for host in self.hosts if host not in skip]
+        for host in left:
+            if now - self.down.get(host, 0) > DOWN_TTL:
+                return host
+        if not left:
+            return None
+        return min(left, key=lambda host: self.down.get(host, 0))
+
+    def learn(self, hosts, workers=8):
+        """
+        Time every member and use the fastest. Members that do not
+        answer go last and count as down, the login host stays as the
+        last resort. Returns the host in use.
+        """
+        hosts = list(dict.fromkeys(hosts))
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(hosts)))) as pool:
+            rtt = dict(zip(hosts, pool.map(probe, hosts)))
+        now = time.time()
+        with self.lock:
+            self.hosts = sorted((host for host in hosts if rtt[host] is not None),
+                                key=rtt.get)
+            self.hosts += [host for host in hosts if rtt[host] is None]
+            if self.login_host not in self.hosts:
+                self.hosts.append(self.login_host)
+            self.rtt = dict((host, round(value, 4)) for host, value in rtt.items()
+                            if value is not None)
+            self.down = dict((host, now) for host in hosts if rtt[host] is None)
+            self.updated = now
+            self.current = self.pick()
+        self.save()
+        return self.current
+
+    def failed(self, host, tried=()):
+        """
+        Mark ``host`` down after a connection error. Returns the host to
+        try next, None when every member was in ``tried``.
+        """
+        with self.lock:
+            self.down[host] = time.time()
+            if self.current == host or self.current in tried:
+                self.current = self.pick(skip=set(tried) | set([host])) or host
+            following = self.current if self.current not in tried else None
+        self.save()
+        return following
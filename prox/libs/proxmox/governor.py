@@ -0,0 +1,144 @@
+"""
+Adaptive per-node concurrency for API requests.
+
+Every request made by pyproxmox takes a slot from the budget of the
+node it targets, reads and writes separately: a pveproxy busy with
+listings can still accept a start, and task-spawning writes never pile
+up behind reads. Budgets adapt AIMD-style, a completed request grows the
+limit by 1/limit (about one slot per round of requests), a 502/503/504,
+a connection error or a request much slower than the fastest seen
+halves it, at most once per round trip. Requests outside /nodes/NODE share the
+"cluster" budgets.
+"""
+import re
+import threading
+import time
+
+NODE = re.compile(r'^/?nodes/([^/?]+)')
+# starting limits and caps, per node
+READS = 4
+WRITES = 2
+MAX_READS = 16
+MAX_WRITES = 4
+# a request slower than SLOW x the fastest one seen, and than MIN_SLOW
+# seconds, counts as congestion
+SLOW = 4.0
+MIN_SLOW = 0.5
+# statuses of an overloaded pveproxy; other 5xx are API errors, e.g. a
+# guest without an agent, and must not halve a budget
+OVERLOADED = (502, 503, 504)
+
+
+def node_of(option):
+    match = NODE.match(option)
+    return match.group(1) if match else "cluster"
+
+
+class Budget(object):
+    """In-flight requests of one node and kind, and what they taught"""
+
+    def __init__(self, limit, cap):
+        self.cap = cap
+        self.limit = float(min(limit, cap))
+        self.inflight = 0
+        self.peak = 0
+        self.requests = 0
+        self.errors = 0
+        self.cuts = 0
+        self.elapsed = 0.0
+        self.fastest = None
+        self.last_cut = 0.0
+
+    def free(self):
+        return self.inflight < max(1, int(self.limit))
+
+    def done(self, latency, failed):
+        """Adapt the limit to one finished request"""
+        self.requests += 1
+        self.elapsed += latency
+        if failed:
+            self.errors += 1
+        elif self.fastest is None or latency < self.fastest:
+            self.fastest = latency
+        slow = self.fastest is not None and latency > MIN_SLOW and \
+            latency > SLOW * self.fastest
+        now = time.time()
+        if failed or slow:
+            # one cut per round trip, the requests already in flight
+            # saw the same congestion
+            if now - self.last_cut > latency:
+                self.limit = max(1.0, self.limit / 2)
+                self.last_cut = now
+                self.cuts += 1
+        else:
+            self.limit = min(float(self.cap), self.limit + 1.0 / self.limit)
+
+
+class Governor(object):
+    """Budgets of every node, shared by all sessions of the process"""
+
+    def __init__(self, reads=READS, writes=WRITES, max_reads=MAX_READS,
+                 max_writes=MAX_WRITES):
+        self.start = {False: reads, True: writes}
+        self.caps = {False: max_reads, True: max_writes}
+        self.budgets = {}
+        self.condition = threading.Condition()
+
+    def configure(self, max_reads=None, max_writes=None):
+        """Cap the per node limits, e.g. from the command line"""
+        with self.condition:
+            for write, cap in ((False, max_reads), (True, max_writes)):
+                if cap is None:
+                    continue
+                self.caps[write] = max(1, int(cap))
+                self.start[write] = min(self.start[write], self.caps[write])
+            for (node, write), budget in self.budgets.items():
+                budget.cap = self.caps[write]
+                budget.limit = min(budget.limit, float(budget.cap))
+            self.condition.notify_all()
+
+    def acquire(self, option, write=False):
+        """Wait for a slot on the node of ``option``, returns the slot to release"""
+        key = (node_of(option), bool(write))
+        with self.condition:
+            budget = self.budgets.get(key)
+            if budget is None:
+                budget = self.budgets[key] = Budget(self.start[key[1]],
+                                                    self.caps[key[1]])
+            while not budget.free():
+                self.condition.wait()
+            budget.inflight += 1
+            budget.peak = max(budget.peak, budget.inflight)
+        return budget, time.time()
+
+    def release(self, slot, failed=False):
+        """Free a slot; ``failed`` None frees it without adapting the limit"""
+        budget, started = slot
+        with self.condition:
+            budget.inflight -= 1
+            if failed is not None:
+                budget.done(time.time() - started, failed)
+            self.condition.notify_all()
+
+    def report(self):
+        """One dict per node and kind, nodes sorted, reads first"""
+        with self.condition:
+            rows = list()
+            for (node, write) in sorted(self.budgets):
+                budget = self.budgets[(node, write)]
+                rows.append({
+                    "node": node,
+                    "kind": "write" if write else "read",
+                    "limit": int(budget.limit),
+                    "cap": budget.cap,
+                    "peak": budget.peak,
+                    "requests": budget.requests,
+                    "errors": budget.errors,
+                    "cuts": budget.cuts,
+                    "avg_ms": int(1000 * budget.elapsed / budget.requests)
+                              if budget.requests else 0
+                })
+            return rows
+
+
+GOVERNOR = Governor()
@@ -0,0 +1,139 @@
+"""
+JSON decoding helpers for API responses.
+
+``loads`` uses orjson or ujson when one is installed and the standard
+json module otherwise. ``iter_array`` walks the array under one key of
+a JSON object while the body is still arriving, yielding one element at
+a time, so a listing never sits in memory as a whole.
+"""
+import codecs
+import json
+
+try:
+    import orjson
+
+    def loads(data):
+        return orjson.loads(data)
+except ImportError:
+    try:
+        import ujson
+
+        def loads(data):
+            if isinstance(data, bytes):
+                data = data.decode("utf-8")
+            return ujson.loads(data)
+    except ImportError:
+        def loads(data):
+            if isinstance(data, bytes):
+                data = data.decode("utf-8")
+            return json.loads(data)
+
+WHITESPACE = " \t\n\r"
+DELIMITERS = WHITESPACE + ",:]}"
+_decoder = json.JSONDecoder()
+
+
+class _Reader(object):
+    """Text buffer refilled from an iterator of byte chunks"""
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.buffer = ""
+        self.position = 0
+        self.done = False
+
+    def fill(self):
+        """Read one more chunk, False once the body is exhausted"""
+        if self.done:
+            return False
+        # drop what was consumed so the buffer holds about one chunk
+        self.buffer = self.buffer[self.position:]
+        self.position = 0
+        for chunk in self.chunks:
+            if chunk:
+                if isinstance(chunk, bytes):
+                    chunk = self.decoder.decode(chunk)
+                self.buffer += chunk
+                return True
+        self.buffer += self.decoder.decode(b"", True)
+        self.done = True
+        return False
+
+    def char(self):
+        """Next non blank character without consuming it, None at the end"""
+        while True:
+            while self.position < len(self.buffer) and \
+                    self.buffer[self.position] in WHITESPACE:
+                self.position += 1
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self.fill():
+                return None
+
+    def value(self):
+        """
+        Decode the next complete JSON value.
+
+        A value is only accepted once a delimiter follows it, a number cut
+        by a chunk boundary ("12" of "12.5") would otherwise decode as
+        a shorter number.
+        """
+        while True:
+            if self.char() is None:
+                raise ValueError("Unexpected end of JSON body")
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.position)
+            except ValueError:
+                value, end = None, None
+            if end is not None and (self.done or (end < len(self.buffer) and
+                                                  self.buffer[end] in DELIMITERS)):
+                self.position = end
+                return value
+            if not self.fill() and end is None:
+                raise ValueError("Broken JSON body")
+
+    def expect(self, char):
+        if self.char() != char:
+            raise ValueError("Expected '{}' in JSON body".format(char))
+        self.position += 1
+
+
+def iter_array(chunks, key="data"):
+    """
+    Yield the elements of ``body[key]`` from a JSON object body.
+
+    ``chunks`` is any iterator of bytes or text, e.g.
+    ``response.iter_content(65536)``. Other members of the object are
+    decoded and thrown away one at a time. Yields nothing when the key is
+    missing or null.
+    """
+    reader = _Reader(chunks)
+    reader.expect("{")
+    while True:
+        char = reader.char()
+        if char == "}":
+            return
+        if char == ",":
+            reader.position += 1
+            continue
+        name = reader.value()
+        reader.expect(":")
+        if name != key:
+            reader.value()
+            continue
+        if reader.char() != "[":
+            reader.value()
+            continue
+        reader.position += 1
+        while True:
+            char = reader.char()
+            if char == "]":
+                reader.position += 1
+                return
+            if char == ",":
+                reader.position += 1
+                continue
+            if char is None:
+                raise ValueError("Unexpected end of JSON body")
+            yield reader.value()
@@ -8,6 +8,10 @@ url or ip of a server, username and password:
 
 a = prox_auth('vnode01.example.org','apiuser@pve','examplePassword')
 
+or an API token, which needs no login request at all:
+
+a = prox_auth('vnode01.example.org',token='apiuser@pve!cli=aaaa-bbbb')
+
 2) Create and instance of the pyproxmox class using the auth object as a parameter:
 
 b = pyproxmox(a)
@@ -16,10 +20,120 @@ b = pyproxmox(a)
 
 status = b.getClusterStatus('vnode01')
 
+4) Requests go to the fastest reachable cluster member and move to
+another one when it stops answering, see gateway.py. To learn the
+members after login:
+
+b.discover()
+
+5) Endpoints without a method here are reached through the client
+generated from the API schema, see apidoc.py:
+
+status = b.api.nodes('vnode01').lxc(101).status.current.get()
+
+The pre defined methods are kept for compatibility, new code should
+prefer b.api.
+
 For more information see https://github.com/Daemonthread/pyproxmox.
 """
 import json
+import re
 import requests
+import requests.adapters
+import threading
+import urllib3.exceptions
+from .gateway import CONNECT_TIMEOUT, Gateways, members
+from .governor import GOVERNOR, OVERLOADED
+from .jsonstream import iter_array, loads
+
+def split_token(token):
+    """'user@realm!tokenid=secret' -> ('user@realm!tokenid', 'secret')"""
+    token_id, _, secret = token.partition('=')
+    if '@' not in token_id or '!' not in token_id or not secret:
+        raise ValueError("API token must look like user@realm!tokenid=secret")
+    return token_id, secret
+
+def unsent(error):
+    """Whether a connection error was raised before the request left"""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return isinstance(reason, urllib3.exceptions.ConnectTimeoutError)
+
+# GET paths that are polled and must always reach the API
+UNCACHED = re.compile(r'/tasks/[^/]+/(status|log)')
+
+class RequestMemo:
+    """
+    Single-flight and memoization of GET requests for one invocation.
+
+    Concurrent callers of the same path share one request, later callers
+    get the stored body. Bodies are kept raw and decoded per caller, so
+    no caller sees another one's changes to the result. Any write
+    forgets everything, as does forget() for callers that poll.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.bodies = {}
+        self.flights = {}
+        self.generation = 0
+        self.made = 0
+        self.saved = 0
+
+    def get(self, key, fetch):
+        """Body of ``key``, calling ``fetch`` only if nobody has or is"""
+        with self.lock:
+            if key in self.bodies:
+                self.saved += 1
+                return self.bodies[key]
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = {"done": threading.Event(),
+                                              "generation": self.generation}
+                self.made += 1
+            else:
+                self.saved += 1
+        if not leader:
+            flight['done'].wait()
+            if 'error' in flight:
+                raise flight['error']
+            return flight['body']
+        try:
+            body = fetch()
+        except Exception as e:
+            flight['error'] = e
+            raise
+        else:
+            flight['body'] = body
+            with self.lock:
+                # failures are retried and a write during the request
+                # makes the body stale
+                if body[0] < 400 and flight['generation'] == self.generation:
+                    self.bodies[key] = body
+            return body
+        finally:
+            with self.lock:
+                self.flights.pop(key, None)
+            flight['done'].set()
+
+    def forget(self):
+        with self.lock:
+            self.bodies.clear()
+            self.generation += 1
+
+class _Session(requests.Session):
+    """
+    A requests session whose ``verify`` setting wins over the
+    environment: requests would otherwise check the node's self-signed
+    certificate whenever REQUESTS_CA_BUNDLE or CURL_CA_BUNDLE is set.
+    """
+    def merge_environment_settings(self, url, proxies, stream, verify, cert):
+        settings = requests.Session.merge_environment_settings(
+            self, url, proxies, stream, verify, cert)
+        if verify is None:
+            settings['verify'] = self.verify
+        return settings
 
 # Authentication class
 class prox_auth:
@@ -31,11 +145,25 @@ class prox_auth:
     3. A password
     
     Creates the required ticket and CSRF prevention token for future connections.
+
+    With ``token`` (user@realm!tokenid=secret) instead of a password no
+    ticket is fetched: every request carries the token in its
+    Authorization header and needs no CSRF token or renewal.
     
     Designed to be instanciated then passed to the new pyproxmox class as an init parameter.
     """
-    def __init__(self,url,username,password):
+    def __init__(self,url,username=None,password=None,token=None):
         self.url = url
+        self.headers = {}
+        if token:
+            token_id, secret = split_token(token)
+            self.username = token_id.split('!', 1)[0]
+            self.headers['Authorization'] = 'PVEAPIToken=%s=%s' % (token_id, secret)
+            self.ticket = None
+            self.CSRF = None
+            return
+
+        self.username = username
         self.connect_data = { "username":username, "password":password }
         self.full_url = "https://%s:8006/api2/json/access/ticket" % (self.url)
 
@@ -55,51 +183,327 @@ class pyproxmox:
     GET and POST methods are currently implemented along with quite a few
     custom API methods.
     """
+    _http_lock = threading.Lock()
+
     # INIT
     def __init__(self, auth_class):
         """Take the prox_auth instance and extract the important stuff"""
         self.url = auth_class.url
         self.ticket = auth_class.ticket
         self.CSRF = auth_class.CSRF
-    
-    def connect(self, conn_type, option, post_data):
+        self.headers = getattr(auth_class, 'headers', {})
+
+    def __getstate__(self):
+        """
+        Keep the HTTP session (sockets, pools) out of dumped sessions, and
+        the headers, which hold the secret of an API token
+        """
+        state = self.__dict__.copy()
+        state.pop('headers', None)
+        state.pop('_http', None)
+        state.pop('_memo', None)
+        state.pop('_api', None)
+        state.pop('_gateways', None)
+        state.pop('response', None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.headers = {}
+
+    def session(self):
+        """
+        Return the keep-alive HTTP session shared by every request.
+
+        Reusing one session saves a TCP and TLS handshake per call and
+        lets concurrent callers share a pool of connections to the node.
+        """
+        http = self.__dict__.get('_http')
+        if http is not None:
+            return http
+        with self._http_lock:
+            http = self.__dict__.get('_http')
+            if http is None:
+                http = _Session()
+                http.verify = False
+                # pveproxy compresses large bodies when asked to
+                http.headers['Accept-Encoding'] = 'gzip, deflate'
+                # sessions dumped before token support have no headers
+                http.headers.update(getattr(self, 'headers', {}))
+                adapter = requests.adapters.HTTPAdapter(pool_connections=4,
+                                                        pool_maxsize=32)
+                http.mount('https://', adapter)
+                self._http = http
+        return http
+
+    def memo(self):
+        """The RequestMemo of this session, made on first use"""
+        memo = self.__dict__.get('_memo')
+        if memo is None:
+            with self._http_lock:
+                memo = self.__dict__.get('_memo')
+                if memo is None:
+                    memo = self._memo = RequestMemo()
+        return memo
+
+    @property
+    def api(self):
+        """Client generated from the API schema, bound to this session"""
+        api = self.__dict__.get('_api')
+        if api is None:
+            from .apidoc import Client
+            with self._http_lock:
+                api = self.__dict__.get('_api')
+                if api is None:
+                    api = self._api = Client(self)
+        return api
+
+    def forget(self):
+        """Drop memoized GETs, the next ones reach the API again"""
+        self.memo().forget()
+
+    def gateways(self):
+        """The cluster members this session may send requests to"""
+        gateways = self.__dict__.get('_gateways')
+        if gateways is None:
+            with self._http_lock:
+                gateways = self.__dict__.get('_gateways')
+                if gateways is None:
+                    gateways = self._gateways = Gateways(self.url)
+        return gateways
+
+    def host(self):
+        """The cluster member requests go to now"""
+        return self.gateways().current
+
+    def discover(self):
+        """Learn the cluster members from cluster/status and use the fastest"""
+        status = self.connect('get', 'cluster/status', None)
+        hosts = members(status.get('data') if isinstance(status, dict) else None)
+        if not hosts:
+            return self.host()
+        return self.gateways().learn(hosts)
+
+    def _failover(self, send, write=False):
+        """
+        Call ``send(host)`` with the current member, then with the next
+        ones while it fails to connect. A read is sent again after any
+        connection error, a write only when it never left.
+        """
+        gateways = self.gateways()
+        tried = set()
+        while True:
+            host = gateways.current
+            try:
+                return send(host)
+            except requests.exceptions.ConnectionError as e:
+                tried.add(host)
+                if write and not unsent(e):
+                    raise
+                if gateways.failed(host, tried) is None:
+                    raise
+
+    def connect(self, conn_type, option, post_data, timeout=None):
         """
         The main communication method.
+
+        GETs go through the session's RequestMemo, other methods reach
+        the API and then forget every memoized GET. ``timeout`` in
+        seconds raises requests' Timeout on a slow answer.
         """
-        self.full_url = "https://%s:8006/api2/json/%s" % (self.url,option)
-    
-        httpheaders = {'Accept':'application/json','Content-Type':'application/x-www-form-urlencoded'}
+        self.full_url = "https://%s:8006/api2/json/%s" % (self.host(),option)
+
+        if conn_type == "get" and not UNCACHED.search(option):
+            status, reason, content = self.memo().get(
+                option, lambda: self._request(conn_type, option, post_data, timeout))
+        else:
+            status, reason, content = self._request(conn_type, option,
+                                                    post_data, timeout)
+            if conn_type != "get":
+                self.memo().forget()
+        try:
+            returned_data = loads(content)
+            if status >= 400 and isinstance(returned_data, dict):
+                # the API only explains failures in the HTTP status line
+                returned_data['status'] = status
+                returned_data['reason'] = reason
+            self.returned_data = returned_data
+            return returned_data
+        except:
+            print("Error in trying to process JSON")
+            print(getattr(self, 'response', None))
 
-        if conn_type == "post":
-            httpheaders['CSRFPreventionToken'] = str(self.CSRF)
-            self.response = requests.post(self.full_url, verify=False, 
-                                          data = post_data, 
-                                          cookies = self.ticket,
-                                          headers = httpheaders)
+    def _request(self, conn_type, option, post_data, timeout=None):
+        """
+        Send one request, returns (status code, reason, raw body).
 
-        elif conn_type == "put":
-            httpheaders['CSRFPreventionToken'] = str(self.CSRF)
-            self.response = requests.put(self.full_url, verify=False, 
-                                          data = post_data, 
-                                          cookies = self.ticket,
-                                          headers = httpheaders)
-        elif conn_type == "delete":
+        The request waits for a slot of its node in the GOVERNOR, writes
+        and reads have separate budgets. It goes to the current cluster
+        member and fails over to the next ones.
+        """
+        return self._failover(
+            lambda host: self._send(host, conn_type, option, post_data, timeout),
+            conn_type != "get")
+
+    def _send(self, host, conn_type, option, post_data, timeout=None):
+        full_url = "https://%s:8006/api2/json/%s" % (host,option)
+        httpheaders = {'Accept':'application/json','Content-Type':'application/x-www-form-urlencoded'}
+        if self.CSRF:
+            # API tokens are not checked for CSRF
             httpheaders['CSRFPreventionToken'] = str(self.CSRF)
-            self.response = requests.delete(self.full_url, verify=False, 
-                                          data = post_data, 
-                                          cookies = self.ticket,
-                                          headers = httpheaders)
-        elif conn_type == "get":
-            self.response = requests.get (self.full_url, verify=False, 
-                                          cookies = self.ticket)
+        http = self.session()
+        read_timeout = timeout
+        timeout = (CONNECT_TIMEOUT, read_timeout)
 
+        slot = GOVERNOR.acquire(option, conn_type != "get")
+        failed = True
         try:
-            self.returned_data = self.response.json()
-            return self.returned_data
-        except:
-            print("Error in trying to process JSON")
-            print(self.response)
+            if conn_type == "post":
+                response = http.post(full_url, data = post_data,
+                                     cookies = self.ticket,
+                                     headers = httpheaders,
+                                     timeout = timeout)
+
+            elif conn_type == "put":
+                response = http.put(full_url, data = post_data,
+                                    cookies = self.ticket,
+                                    headers = httpheaders,
+                                    timeout = timeout)
+            elif conn_type == "delete":
+                response = http.delete(full_url, data = post_data,
+                                       cookies = self.ticket,
+                                       headers = httpheaders,
+                                       timeout = timeout)
+            elif conn_type == "get":
+                response = http.get(full_url, cookies = self.ticket,
+                                    timeout = timeout)
+            failed = response.status_code in OVERLOADED
+        except requests.exceptions.ReadTimeout:
+            # a short timeout the caller asked for tells nothing of the
+            # node's load
+            if read_timeout:
+                failed = None
+            raise
+        finally:
+            GOVERNOR.release(slot, failed)
+
+        self.response = response
+        return response.status_code, response.reason, response.content
+
+
+    def rows(self, option, chunk_size=65536):
+        """
+        Stream the 'data' array of a GET request, one element at a time.
 
+        The body is decoded while it arrives, so the first rows are
+        available before the whole listing is transferred and only one
+        row is held at a time.
+        """
+        def send(host):
+            full_url = "https://%s:8006/api2/json/%s" % (host,option)
+            # the slot is held until the headers arrive, the API builds
+            # the whole listing before it answers
+            slot = GOVERNOR.acquire(option)
+            failed = True
+            try:
+                response = self.session().get(full_url, cookies = self.ticket,
+                                              stream = True,
+                                              timeout = (CONNECT_TIMEOUT, None))
+                failed = response.status_code in OVERLOADED
+            finally:
+                GOVERNOR.release(slot, failed)
+            return response
+
+        response = self._failover(send)
+        try:
+            response.raise_for_status()
+            for row in iter_array(response.iter_content(chunk_size)):
+                yield row
+        finally:
+            response.close()
+
+    def upload(self, option, body):
+        """
+        POST a streamed body, read in small blocks while it is sent.
+
+        ``body`` is a file-like object with len() and a content_type,
+        e.g. a multipart form around a file, so nothing of the file is
+        held in memory. Returns JSON like connect().
+        """
+        httpheaders = {'Accept':'application/json',
+                       'Content-Type':body.content_type,
+                       'Content-Length':str(len(body))}
+        if self.CSRF:
+            httpheaders['CSRFPreventionToken'] = str(self.CSRF)
+
+        def send(host):
+            full_url = "https://%s:8006/api2/json/%s" % (host,option)
+            slot = GOVERNOR.acquire(option, True)
+            failed = True
+            try:
+                response = self.session().post(full_url, data = body,
+                                               cookies = self.ticket,
+                                               headers = httpheaders,
+                                               timeout = (CONNECT_TIMEOUT, None))
+                # a long transfer says nothing of the node's load
+                failed = True if response.status_code in OVERLOADED else None
+            finally:
+                GOVERNOR.release(slot, failed)
+            return response
+
+        response = self._failover(send, True)
+        self.memo().forget()
+        self.response = response
+        returned_data = loads(response.content)
+        if response.status_code >= 400 and isinstance(returned_data, dict):
+            returned_data['status'] = response.status_code
+            returned_data['reason'] = response.reason
+        return returned_data
+
+    def _paged(self, option, start, limit, typefilter=None):
+        option = '%s?start=%s' % (option, int(start or 0))
+        if limit:
+            option += '&limit=%s' % (int(limit))
+        if typefilter:
+            option += '&typefilter=%s' % (typefilter)
+        return option
+
+    # Streaming Methods, each returns an iterator of rows
+
+    def iterClusterResources(self,type=None):
+        """Resources index (cluster wide). Returns rows"""
+        if type:
+            return self.rows('cluster/resources?type=%s' % (type))
+        return self.rows('cluster/resources')
+
+    def iterNodeVirtualIndex(self,node):
+        """Virtual machine index (per node). Returns rows"""
+        return self.rows('nodes/%s/qemu' % (node))
+
+    def iterNodeLXCIndex(self,node):
+        """LXC container index (per node). Returns rows"""
+        return self.rows('nodes/%s/lxc' % (node))
+
+    def iterNodeStorage(self,node):
+        """Get status for all datastores. Returns rows"""
+        return self.rows('nodes/%s/storage' % (node))
+
+    def iterNodeTasks(self,node,start=0,limit=None,typefilter=None,since=None,source=None):
+        """Read task list for one node, newest first, the API returns 50 unless limit is set. Returns rows"""
+        option = self._paged('nodes/%s/tasks' % (node), start, limit, typefilter)
+        if since:
+            option += '&since=%s' % (int(since))
+        if source:
+            option += '&source=%s' % (source)
+        return self.rows(option)
+
+    def iterNodeSyslog(self,node,start=0,limit=None):
+        """Read system log, the API returns 50 lines unless limit is set. Returns rows"""
+        return self.rows(self._paged('nodes/%s/syslog' % (node), start, limit))
+
+    def iterNodeStorageContent(self,node,storage):
+        """List storage content. Returns rows"""
+        return self.rows('nodes/%s/storage/%s/content' % (node,storage))
 
     """
     Methods using the GET protocol to communicate with the Proxmox API.
@@ -121,6 +525,19 @@ class pyproxmox:
         data = self.connect('get','cluster/nextid',None)
         return data
 
+    def getClusterTasks(self):
+        """List recent tasks (cluster wide). Returns JSON"""
+        data = self.connect('get','cluster/tasks',None)
+        return data
+
+    def getClusterResources(self,type=None):
+        """Resources index (cluster wide), type is vm, storage or node. Returns JSON"""
+        if type:
+            data = self.connect('get','cluster/resources?type=%s' % (type),None)
+        else:
+            data = self.connect('get','cluster/resources',None)
+        return data
+
 
     # Node Methods
     def getVm(self):
@@ -143,6 +560,11 @@ class pyproxmox:
         data = self.connect('get','nodes/%s/openvz' % (node),None)
         return data
 
+    def getNodeLXCIndex(self,node):
+        """LXC container index (per node). Returns JSON"""
+        data = self.connect('get','nodes/%s/lxc' % (node),None)
+        return data
+
     def getNodeVirtualIndex(self,node):
         """Virtual machine index (per node). Returns JSON"""
         data = self.connect('get','nodes/%s/qemu' % (node),None)
@@ -188,9 +610,9 @@ class pyproxmox:
         data = self.connect('get','nodes/%s/rrd' % (node),None)
         return data
     
-    def getNodeRRDData(self,node):
-        """Read node RRD statistics. Returns RRD"""
-        data = self.connect('get','nodes/%s/rrddata' % (node),None)
+    def getNodeRRDData(self,node,timeframe='day',cf='AVERAGE'):
+        """Read node RRD statistics, timeframe is hour, day, week, month or year. Returns RRD"""
+        data = self.connect('get','nodes/%s/rrddata?timeframe=%s&cf=%s' % (node,timeframe,cf),None)
         return data
 
     def getNodeBeans(self,node):
@@ -203,9 +625,12 @@ class pyproxmox:
         data = self.connect('get','nodes/%s/tasks/%s' % (node,upid),None)
         return data
 
-    def getNodeTaskLogByUPID(self,node,upid):
-        """Read task log. Returns JSON"""
-        data = self.connect('get','nodes/%s/tasks/%s/log' % (node,upid),None)
+    def getNodeTaskLogByUPID(self,node,upid,start=0,limit=None):
+        """Read task log, the API returns 50 lines unless limit is set. Returns JSON"""
+        option = 'nodes/%s/tasks/%s/log?start=%s' % (node,upid,int(start))
+        if limit:
+            option += '&limit=%s' % (int(limit))
+        data = self.connect('get',option,None)
         return data
 
     def getNodeTaskStatusByUPID(self,node,upid):
@@ -279,6 +704,11 @@ class pyproxmox:
         data = self.connect('get','nodes/%s/openvz/%s/rrddata' % (node,vmid),None)
         return data
 
+    def getLXCRRDData(self,node,vmid,timeframe='day',cf='AVERAGE'):
+        """Read LXC container RRD statistics. Returns JSON"""
+        data = self.connect('get','nodes/%s/lxc/%s/rrddata?timeframe=%s&cf=%s' % (node,vmid,timeframe,cf),None)
+        return data
+
     # KVM Methods
 
     def getVirtualIndex(self,node,vmid):
@@ -296,6 +726,11 @@ class pyproxmox:
         data = self.connect('get','nodes/%s/qemu/%s/%s' % (node,vmid, action),None)
         return data
 
+    def getVirtualAgent(self,node,vmid,command,timeout=None):
+        """Run a read-only QEMU guest agent command, e.g. get-osinfo. Returns JSON"""
+        data = self.connect('get','nodes/%s/qemu/%s/agent/%s' % (node,vmid,command),None,timeout)
+        return data
+
     def getVirtualConfig(self,node,vmid):
         """Get virtual machine configuration. Returns JSON"""
         data = self.connect('get','nodes/%s/qemu/%s/config' % (node,vmid),None)
@@ -306,9 +741,14 @@ class pyproxmox:
         data = self.connect('get','nodes/%s/qemu/%s/rrd' % (node,vmid),None)
         return data
 
-    def getVirtualRRDData(self,node,vmid):
-        """Read VM RRD statistics. Returns JSON"""
-        data = self.connect('get','nodes/%s/qemu/%s/rrddata' % (node,vmid),None)
+    def getVirtualRRDData(self,node,vmid,timeframe='day',cf='AVERAGE'):
+        """Read VM RRD statistics, timeframe is hour, day, week, month or year. Returns JSON"""
+        data = self.connect('get','nodes/%s/qemu/%s/rrddata?timeframe=%s&cf=%s' % (node,vmid,timeframe,cf),None)
+        return data
+
+    def getVirtualSnapshots(self,node,vmid):
+        """List all snapshots of a virtual machine. Returns JSON"""
+        data = self.connect('get','nodes/%s/qemu/%s/snapshot' % (node,vmid),None)
         return data
 
     # Storage Methods
@@ -319,6 +759,10 @@ class pyproxmox:
         # data = self.connect('get','nodes/%s/storage/%s/content/' % (node,storage),None)
         return data
 
+    def uploadStorageContent(self,node,storage,body):
+        """Upload an ISO or container template, body as for upload(). Creates a new task. Returns JSON"""
+        return self.upload('nodes/%s/storage/%s/upload' % (node,storage), body)
+
     def getStorageConfig(self,storage):
         """Read storage config. Returns JSON"""
         data = self.connect('get','storage/%s' % (storage),None)
@@ -334,9 +778,9 @@ class pyproxmox:
         data = self.connect('get','nodes/%s/storage/%s/rrd' % (node,storage),None)
         return data
 
-    def getNodeStorageRRDData(self,node,storage):
-        """Read storage RRD statistics. Returns JSON"""
-        data = self.connect('get','nodes/%s/storage/%s/rrddata' % (node,storage),None)
+    def getNodeStorageRRDData(self,node,storage,timeframe='day',cf='AVERAGE'):
+        """Read storage RRD statistics, timeframe is hour, day, week, month or year. Returns JSON"""
+        data = self.connect('get','nodes/%s/storage/%s/rrddata?timeframe=%s&cf=%s' % (node,storage,timeframe,cf),None)
         return data
 
     """
@@ -377,6 +821,27 @@ class pyproxmox:
         data = self.connect('post','nodes/%s/openvz/%s/status/stop' % (node,vmid), post_data)
         return data
 
+    def startLXCContainer(self,node,vmid):
+        """Start an LXC container. Returns JSON"""
+        post_data = None
+        data = self.connect('post','nodes/%s/lxc/%s/status/start' % (node,vmid), post_data)
+        return data
+
+    def shutdownLXCContainer(self,node,vmid,post_data=None):
+        """Shut down an LXC container, post_data may hold timeout and forceStop. Returns JSON"""
+        data = self.connect('post','nodes/%s/lxc/%s/status/shutdown' % (node,vmid), post_data)
+        return data
+
+    def migrateLXCContainer(self,node,vmid,target,restart=False,bwlimit=None):
+        """Migrate an LXC container, a running one restarts on the target, bwlimit in KiB/s. Creates a new migration task. Returns JSON"""
+        post_data = {'target': str(target)}
+        if restart:
+            post_data['restart'] = 1
+        if bwlimit:
+            post_data['bwlimit'] = int(bwlimit)
+        data = self.connect('post','nodes/%s/lxc/%s/migrate' % (node,vmid), post_data)
+        return data
+
     def unmountOpenvzPrivate(self,node,vmid):
         """Unmounts container private area. Returns JSON"""
         post_data = None
@@ -410,9 +875,8 @@ class pyproxmox:
         data = self.connect('post',"nodes/%s/qemu/%s/status/resume" % (node,vmid), post_data)
         return data
         
-    def shutdownVirtualMachine(self,node,vmid):
-        """Shut down a virtual machine. Returns JSON"""
-        post_data = None
+    def shutdownVirtualMachine(self,node,vmid,post_data=None):
+        """Shut down a virtual machine, post_data may hold timeout and forceStop. Returns JSON"""
         data = self.connect('post',"nodes/%s/qemu/%s/status/shutdown" % (node,vmid), post_data)
         return data
     
@@ -434,10 +898,21 @@ class pyproxmox:
         data = self.connect('post',"nodes/%s/qemu/%s/status/suspend" % (node,vmid), post_data)
         return data
         
-    def migrateVirtualMachine(self,node,vmid,target):
-        """Migrate a virtual machine. Returns JSON"""
+    def migrateVirtualMachine(self,node,vmid,target,online=False,bwlimit=None,with_local_disks=False):
+        """Migrate a virtual machine, bwlimit in KiB/s. Creates a new migration task. Returns JSON"""
         post_data = {'target': str(target)}
-        data = self.connect('post',"nodes/%s/qemu/%s/status/start" % (node,vmid), post_data)
+        if online:
+            post_data['online'] = 1
+        if bwlimit:
+            post_data['bwlimit'] = int(bwlimit)
+        if with_local_disks:
+            post_data['with-local-disks'] = 1
+        data = self.connect('post',"nodes/%s/qemu/%s/migrate" % (node,vmid), post_data)
+        return data
+
+    def cloneVirtualMachine(self,node,vmid,post_data):
+        """Clone a virtual machine, newid is required. Creates a new task. Returns JSON"""
+        data = self.connect('post',"nodes/%s/qemu/%s/clone" % (node,vmid), post_data)
         return data
 
     def monitorVirtualMachine(self,node,vmid,command):
@@ -452,6 +927,16 @@ class pyproxmox:
         data = self.connect('post',"nodes/%s/qemu/%s/vncproxy" % (node,vmid), post_data)
         return data
 
+    def snapshotVirtualMachine(self,node,vmid,snapname,description=None,vmstate=False):
+        """Snapshot a virtual machine. Creates a new task. Returns JSON"""
+        post_data = {'snapname': str(snapname)}
+        if description:
+            post_data['description'] = str(description)
+        if vmstate:
+            post_data['vmstate'] = 1
+        data = self.connect('post',"nodes/%s/qemu/%s/snapshot" % (node,vmid), post_data)
+        return data
+
     def rollbackVirtualMachine(self,node,vmid,snapname):
         """Rollback a snapshot of a virtual machine. Returns JSON"""
         post_data = None
@@ -494,6 +979,11 @@ class pyproxmox:
         """Destroy the vm (also delete all used/owned volumes)."""
         data = self.connect('delete',"nodes/%s/qemu/%s" % (node,vmid),None)
         return data
+
+    def deleteVirtualMachineSnapshot(self,node,vmid,snapname):
+        """Delete a virtual machine snapshot. Creates a new task."""
+        data = self.connect('delete',"nodes/%s/qemu/%s/snapshot/%s" % (node,vmid,snapname),None)
+        return data
         
     # POOLS
     def deletePool(self,poolid):
@@ -3,10 +3,27 @@ import urllib3
 
 urllib3.disable_warnings()
 
-def proxmox_auth(host, username, password):
+def proxmox_auth(host, username, password, token=None):
     try:
-        prox = prox_auth(host, username, password)
+        prox = prox_auth(host, username, password, token)
     except Exception:
         raise
     else:
-        return pyproxmox(prox)
\ No newline at end of file
+        return pyproxmox(prox)
+
+
+class ProxmoxError(Exception):
+    """The API refused a request"""
+    pass
+
+
+def check(result):
+    """Return the data of an API result, raise ProxmoxError on failure"""
+    if not isinstance(result, dict):
+        raise ProxmoxError("No response from the API")
+    if result.get('status', 200) >= 400:
+        reason = result.get('reason') or "HTTP {}".format(result['status'])
+        if result.get('errors'):
+            reason = "{} {}".format(reason, result['errors'])
+        raise ProxmoxError(reason)
+    return result.get('data')
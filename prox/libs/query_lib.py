@@ -0,0 +1,302 @@
+"""
+A small filter language for listings.
+
+    --where "status==running and mem>8G and name~web*"
+    --sort -cpu,name --top 20
+
+Comparisons are ``field OP value`` with OP one of == != > >= < <= and
+~ / !~ for shell globs; they combine with and, or, not and parentheses.
+Numbers take K/M/G/T/P (binary) or % suffixes. An expression is
+compiled once into nested closures and then run over every record.
+"""
+from functools import cmp_to_key
+import fnmatch
+import heapq
+import itertools
+import operator
+import re
+
+TOKEN = re.compile(r'''\s*(?:
+    (?P<paren>[()])
+  | (?P<op>==|!=|>=|<=|!~|=~|~|>|<|=)
+  | "(?P<dq>[^"]*)"
+  | '(?P<sq>[^']*)'
+  | (?P<word>[^\s()=!<>~"']+)
+)''', re.VERBOSE)
+
+NUMBER = re.compile(r'^(-?\d+(?:\.\d+)?)\s*([kmgtp]?)(i?b?)(%?)$', re.IGNORECASE)
+UNITS = {"": 1, "k": 1 << 10, "m": 1 << 20, "g": 1 << 30, "t": 1 << 40,
+         "p": 1 << 50}
+
+OPS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le
+}
+ALIASES = {"=": "==", "=~": "~"}
+
+
+class QueryError(ValueError):
+    """The expression, sort keys or top count can not be used"""
+    pass
+
+
+def parse_number(text):
+    """'8G' -> 8589934592, '50%' -> 0.5, '12' -> 12, anything else None"""
+    match = NUMBER.match(text.strip())
+    if not match:
+        return None
+    number, unit, _, percent = match.groups()
+    value = float(number) * UNITS[unit.lower()]
+    if percent:
+        value = value / 100
+    if value == int(value) and not percent:
+        return int(value)
+    return value
+
+
+def fields(record_class):
+    """Field names a record class answers, slots and public properties"""
+    names = set(record_class.__slots__)
+    for name in dir(record_class):
+        if not name.startswith("_") and \
+                isinstance(getattr(record_class, name, None), property):
+            names.add(name)
+    return names
+
+
+def tokenize(text):
+    tokens = list()
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = TOKEN.match(text, position)
+        if not match or match.end() == position:
+            raise QueryError("Can not read '{}'".format(text[position:]))
+        position = match.end()
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind in ("dq", "sq"):
+            kind = "string"
+        elif kind == "op":
+            value = ALIASES.get(value, value)
+        elif kind == "word" and value.lower() in ("and", "or", "not"):
+            kind, value = "keyword", value.lower()
+        tokens.append((kind, value))
+    return tokens
+
+
+def _comparison(field, op, raw):
+    number = parse_number(raw)
+
+    if op in ("~", "!~"):
+        def test(record):
+            value = getattr(record, field, None)
+            matched = value is not None and \
+                fnmatch.fnmatchcase(str(value), raw)
+            return matched if op == "~" else not matched
+        return test
+
+    compare = OPS[op]
+
+    def test(record):
+        value = getattr(record, field, None)
+        if value is None:
+            return op == "!="
+        if number is not None and not isinstance(value, bool):
+            if isinstance(value, str):
+                try:
+                    value = float(value)
+                except ValueError:
+                    return compare(value, raw)
+            return compare(value, number)
+        return compare(str(value), raw)
+    return test
+
+
+class _Parser(object):
+
+    def __init__(self, tokens, known=None):
+        self.tokens = tokens
+        self.position = 0
+        self.known = known
+
+    def peek(self):
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
+        return (None, None)
+
+    def take(self, kind=None, value=None):
+        token = self.peek()
+        if token[0] is None or (kind and token[0] != kind) or \
+                (value and token[1] != value):
+            expected = value or kind or "more input"
+            found = token[1] if token[0] else "end of expression"
+            raise QueryError("Expected {} but found '{}'".format(expected,
+                                                               found))
+        self.position += 1
+        return token
+
+    def parse(self):
+        test = self.parse_or()
+        if self.peek()[0] is not None:
+            raise QueryError("Unexpected '{}'".format(self.peek()[1]))
+        return test
+
+    def parse_or(self):
+        tests = [self.parse_and()]
+        while self.peek() == ("keyword", "or"):
+            self.take()
+            tests.append(self.parse_and())
+        if len(tests) == 1:
+            return tests[0]
+        return lambda record: any(test(record) for test in tests)
+
+    def parse_and(self):
+        tests = [self.parse_not()]
+        while self.peek() == ("keyword", "and"):
+            self.take()
+            tests.append(self.parse_not())
+        if len(tests) == 1:
+            return tests[0]
+        return lambda record: all(test(record) for test in tests)
+
+    def parse_not(self):
+        if self.peek() == ("keyword", "not"):
+            self.take()
+            test = self.parse_not()
+            return lambda record: not test(record)
+        if self.peek() == ("paren", "("):
+            self.take()
+            test = self.parse_or()
+            self.take("paren", ")")
+            return test
+        field = self.take("word")[1]
+        if self.known is not None and field not in self.known:
+            raise QueryError("Unknown field '{}', use one of: {}".format(
+                field, ", ".join(sorted(self.known))))
+        op = self.take("op")[1]
+        kind, raw = self.peek()
+        if kind not in ("word", "string"):
+            raise QueryError("Expected a value after '{} {}'".format(field,
+                                                                   op))
+        self.take()
+        return _comparison(field, op, raw)
+
+
+def compile_where(text, known=None):
+    """Compile an expression into a ``test(record) -> bool`` function"""
+    tokens = tokenize(text)
+    if not tokens:
+        raise QueryError("Empty expression")
+    return _Parser(tokens, known).parse()
+
+
+def split_where(text, names, known=None):
+    """
+    Split an expression around fields that are filled late, e.g. an ip
+    fetched only for the rows left: (test, later) where ``test`` holds
+    the top-level and terms that compare none of ``names`` and ``later``
+    the others. Either may be None.
+    """
+    compile_where(text, known)
+    tokens = tokenize(text)
+    terms = [[]]
+    depth = 0
+    for token in tokens:
+        if token == ("paren", "("):
+            depth += 1
+        elif token == ("paren", ")"):
+            depth -= 1
+        elif depth == 0 and token == ("keyword", "or"):
+            # a top-level or keeps the expression whole
+            terms = [tokens]
+            break
+        elif depth == 0 and token == ("keyword", "and"):
+            terms.append([])
+            continue
+        terms[-1].append(token)
+
+    now, later = list(), list()
+    for term in terms:
+        late = any(kind == "word" and value in names and following[0] == "op"
+                   for (kind, value), following in zip(term, term[1:]))
+        group = later if late else now
+        if group:
+            group.append(("keyword", "and"))
+        group.extend(term)
+    return tuple(_Parser(group, known).parse() if group else None
+                 for group in (now, later))
+
+
+def _rank(value):
+    # numbers before text, missing values last whatever the direction
+    if value is None:
+        return (2, 0)
+    if isinstance(value, (int, float)):
+        return (0, value)
+    return (1, str(value))
+
+
+def compile_sort(text, known=None):
+    """'-cpu,name' -> sort key, '-' sorts a field descending"""
+    keys = list()
+    for part in text.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        descending = part.startswith("-")
+        field = part.lstrip("+-")
+        if known is not None and field not in known:
+            raise QueryError("Unknown sort field '{}'".format(field))
+        keys.append((field, descending))
+    if not keys:
+        raise QueryError("Empty sort")
+
+    def compare(left, right):
+        for field, descending in keys:
+            a = _rank(getattr(left, field, None))
+            b = _rank(getattr(right, field, None))
+            if a == b:
+                continue
+            if a[0] != b[0]:
+                return -1 if a[0] < b[0] else 1
+            if descending:
+                return -1 if a > b else 1
+            return -1 if a < b else 1
+        return 0
+    return cmp_to_key(compare)
+
+
+def apply(records, where=None, sort=None, top=None, known=None):
+    """
+    Filter, order and cut records.
+
+    ``where`` is an expression or a test from split_where. ``top`` keeps the first N records in sort order using heap selection,
+    without a sort it keeps the first N matches. With neither, matches
+    are returned lazily so a streamed listing stays streamed.
+    """
+    test = where
+    if isinstance(where, str):
+        test = compile_where(where, known) if where else None
+    key = compile_sort(sort, known) if sort else None
+    if top is not None:
+        try:
+            top = int(top)
+        except ValueError:
+            raise QueryError("Top must be a number")
+        if top < 0:
+            raise QueryError("Top must not be negative")
+
+    if test is not None:
+        records = (record for record in records if test(record))
+    if key is not None:
+        if top is not None:
+            return heapq.nsmallest(top, records, key=key)
+        return sorted(records, key=key)
+    if top is not None:
+        return list(itertools.islice(records, top))
+    return records
@@ -0,0 +1,221 @@
+"""
+Cluster rebalancing.
+
+Node CPU and memory loads are kept in numpy vectors. Each step takes the
+most loaded nodes as sources and scores moving every one of their
+guests to each of the least loaded nodes at once as a guests x nodes
+matrix, by how far the node loads then are from their mean, and applies
+the single best move. The loop stops as soon as the spread of both
+loads is within the target, so the plan stays short.
+"""
+
+PIN_TAG = "pin"
+ANTI_AFFINITY = "aa-"
+# sources tried per step, the most loaded nodes of each resource, and
+# targets, the least loaded ones
+SOURCES = 3
+TARGETS = 8
+EPSILON = 1e-9
+
+
+def tags(guest):
+    return set(i for i in (guest.get('tags') or "").replace(",", ";").split(";") if i)
+
+def history_load(guest, rows, window=None):
+    """
+    Cores and memory of a guest: its current use or the RRD average over
+    the window, whichever is higher.
+    """
+    import numpy as np
+    cores = (guest.get('cpu') or 0) * (guest.get('maxcpu') or 1)
+    mem = guest.get('mem') or 0
+    times = [i['time'] for i in rows if i.get('time') is not None]
+    if window and times:
+        rows = [i for i in rows if i.get('time', 0) > max(times) - window]
+    cpu = [i['cpu'] * (i.get('maxcpu') or guest.get('maxcpu') or 1)
+           for i in rows if i.get('cpu') is not None]
+    used = [i['mem'] for i in rows if i.get('mem') is not None]
+    if cpu:
+        cores = max(cores, float(np.mean(cpu)))
+    if used:
+        mem = max(mem, float(np.mean(used)))
+    return cores, mem
+
+
+class Cluster(object):
+    """Loads of the online nodes and the running VMs that may move"""
+
+    def __init__(self, nodes, guests, loads=None, pinned=None,
+                 anti_affinity=ANTI_AFFINITY, reserve=0.1):
+        import numpy as np
+        nodes = [i for i in nodes if i.get('status') == "online"]
+        self.names = [i['node'] for i in nodes]
+        index = dict((name, number) for number, name in enumerate(self.names))
+        self.cap_cpu = np.array([i.get('maxcpu') or 1 for i in nodes], dtype=float)
+        self.cap_mem = np.array([i.get('maxmem') or 1 for i in nodes], dtype=float)
+        self.use_cpu = np.array([(i.get('cpu') or 0) * (i.get('maxcpu') or 1)
+                                 for i in nodes], dtype=float)
+        self.use_mem = np.array([i.get('mem') or 0 for i in nodes], dtype=float)
+        self.limit_mem = self.cap_mem * (1 - reserve)
+        pinned = set(str(i) for i in (pinned or []))
+        loads = loads or {}
+
+        self.guests = list()
+        self.cpu = list()
+        self.mem = list()
+        self.where = list()
+        self.movable = list()
+        self.groups = list()
+        for guest in guests:
+            if guest.get('node') not in index or guest.get('template'):
+                continue
+            guest_tags = tags(guest)
+            cores, mem = loads.get(guest.get('vmid'), (
+                (guest.get('cpu') or 0) * (guest.get('maxcpu') or 1),
+                guest.get('mem') or 0))
+            if guest.get('status') != "running":
+                cores, mem = 0, 0
+            self.guests.append(guest)
+            self.cpu.append(cores)
+            self.mem.append(mem)
+            self.where.append(index[guest['node']])
+            # only running VMs move live, containers would restart
+            self.movable.append(guest.get('type') == "qemu" and
+                                guest.get('status') == "running" and
+                                PIN_TAG not in guest_tags and
+                                str(guest.get('vmid')) not in pinned)
+            self.groups.append(set(i for i in guest_tags
+                                   if anti_affinity and i.startswith(anti_affinity)))
+        self.cpu = np.array(self.cpu, dtype=float)
+        self.mem = np.array(self.mem, dtype=float)
+        self.where = np.array(self.where, dtype=int)
+        self.movable = np.array(self.movable, dtype=bool)
+        self.grouped = np.array([bool(i) for i in self.groups], dtype=bool)
+        # guests of each anti-affinity group on every node
+        self.members = {}
+        for number, groups in enumerate(self.groups):
+            for group in groups:
+                counts = self.members.setdefault(group, np.zeros(len(self.names), dtype=int))
+                counts[self.where[number]] += 1
+
+    def loads(self):
+        return self.use_cpu / self.cap_cpu, self.use_mem / self.cap_mem
+
+    def spreads(self):
+        cpu, mem = self.loads()
+        if not len(cpu):
+            return 0.0, 0.0
+        return float(cpu.max() - cpu.min()), float(mem.max() - mem.min())
+
+    def move(self, guest, target):
+        source = self.where[guest]
+        self.use_cpu[source] -= self.cpu[guest]
+        self.use_mem[source] -= self.mem[guest]
+        self.use_cpu[target] += self.cpu[guest]
+        self.use_mem[target] += self.mem[guest]
+        for group in self.groups[guest]:
+            self.members[group][source] -= 1
+            self.members[group][target] += 1
+        self.where[guest] = target
+        # a VM moves once, the plan never bounces it around
+        self.movable[guest] = False
+
+
+def _deviation(cluster):
+    """Squared deviations of the node loads from their mean, CPU plus memory"""
+    total = 0.0
+    for loads in cluster.loads():
+        total += float(((loads - loads.mean()) ** 2).sum())
+    return total
+
+def _best_move(cluster, sources, nodes):
+    """
+    Move of a guest on ``sources`` to one of ``nodes`` leaving the lowest
+    deviation: (deviation, guest, node) or None.
+
+    All candidates are scored at once as a guests x nodes matrix from
+    the sums of the loads and of their squares, which one move changes
+    only at its two nodes.
+    """
+    import numpy as np
+    on_source = np.zeros(len(cluster.names), dtype=bool)
+    on_source[sources] = True
+    guests = np.nonzero(on_source[cluster.where] & cluster.movable)[0]
+    if not len(guests) or not len(nodes):
+        return None
+    where = cluster.where[guests]
+    count = len(cluster.names)
+    score = 0.0
+    for loads, cap, need in zip(cluster.loads(), (cluster.cap_cpu, cluster.cap_mem),
+                                (cluster.cpu, cluster.mem)):
+        leaving = need[guests] / cap[where]
+        arriving = need[guests][:, None] / cap[nodes][None, :]
+        sums = loads.sum() - leaving[:, None] + arriving
+        squares = (loads * loads).sum() + \
+            (leaving * (leaving - 2 * loads[where]))[:, None] + \
+            arriving * (arriving + 2 * loads[nodes][None, :])
+        score = score + squares - sums * sums / count
+
+    allowed = cluster.use_mem[nodes][None, :] + cluster.mem[guests][:, None] <= \
+        cluster.limit_mem[nodes][None, :]
+    allowed &= where[:, None] != nodes[None, :]
+    for row in np.nonzero(cluster.grouped[guests])[0]:
+        for group in cluster.groups[guests[row]]:
+            allowed[row] &= cluster.members[group][nodes] == 0
+    if not allowed.any():
+        return None
+    # lowest deviation, then the least memory to copy
+    score = np.where(allowed, score, np.inf)
+    best = score <= score.min() + EPSILON
+    cost = np.where(best, cluster.mem[guests][:, None], np.inf)
+    row, column = np.unravel_index(np.argmin(cost), cost.shape)
+    return score[row, column], guests[row], nodes[column]
+
+def plan(cluster, target=0.1, max_moves=None):
+    """
+    Moves bringing the CPU and memory spread within ``target``.
+
+    Each step applies the move that most lowers the squared deviations
+    of the node loads from their mean, so nodes tied at the top come
+    down one after the other. The loop stops once the spread (max - min)
+    of both loads is within ``target``, or when no move lowers the
+    deviation; a VM moves at most once, so it always ends.
+
+    Returns (guest, source node, target node, after) tuples in the order
+    they should run, ``after`` holding the indexes of earlier moves off
+    the target node that must finish first to free the memory the move
+    needs.
+    """
+    import numpy as np
+    moves = list()
+    # memory planned to leave every node, and the moves taking it
+    freed = np.zeros(len(cluster.names))
+    leaving = dict((number, list()) for number in range(len(cluster.names)))
+    deviation = _deviation(cluster)
+    while max_moves is None or len(moves) < max_moves:
+        spread_cpu, spread_mem = cluster.spreads()
+        if spread_cpu <= target + EPSILON and spread_mem <= target + EPSILON:
+            break
+        cpu, mem = cluster.loads()
+        # the most loaded nodes that have a guest to give, the least loaded
+        held = np.bincount(cluster.where[cluster.movable],
+                           minlength=len(cluster.names)) > 0
+        candidates = np.nonzero(held)[0]
+        sources = np.union1d(candidates[np.argsort(-cpu[candidates])[:SOURCES]],
+                             candidates[np.argsort(-mem[candidates])[:SOURCES]])
+        nodes = np.union1d(np.argsort(cpu)[:TARGETS], np.argsort(mem)[:TARGETS])
+        best = _best_move(cluster, sources, nodes)
+        if best is None or best[0] >= deviation - EPSILON:
+            break
+        deviation, guest, node = best
+        source = cluster.where[guest]
+        after = list()
+        if cluster.use_mem[node] + freed[node] + cluster.mem[guest] > \
+                cluster.limit_mem[node]:
+            after = list(leaving[node])
+        cluster.move(guest, node)
+        freed[source] += cluster.mem[guest]
+        leaving[source].append(len(moves))
+        moves.append((cluster.guests[guest], cluster.names[source],
+                      cluster.names[node], after))
+    return moves
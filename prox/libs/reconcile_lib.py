@@ -0,0 +1,177 @@
+"""
+Power state reconciliation.
+
+A state file declares which guests should run and which should be
+stopped, always or inside a weekly window. Every cycle compares one
+cluster/resources listing with it and sends only the start and shutdown
+calls needed. Actions in flight are remembered between cycles: a guest
+is left alone until the listing shows it settled, and a node never has
+more than its share of unsettled actions, so a boot storm is spread
+over several cycles.
+"""
+from prox.libs import backup_lib
+from prox.libs import login_lib
+from prox.libs import proxmox_lib
+from prox.libs import task_lib
+from prox.libs import utils
+from prox.libs import vm_lib
+
+STATES = ("running", "stopped")
+TYPES = ("qemu", "lxc")
+ACTIONS = {"running": "start", "stopped": "shutdown"}
+
+
+def get_auth():
+    try:
+        prox = login_lib.load_dumped_session()
+    except Exception as e:
+        print(e)
+        exit()
+    else:
+        return prox
+
+def parse_window(text):
+    """
+    'mon..fri 08:00-18:00' -> ([0, 1, 2, 3, 4], 480, 1080).
+
+    Days as in backup schedules, the end may be past midnight, e.g.
+    'fri 22:00-06:00'. Raises ValueError.
+    """
+    head, _, end = str(text).strip().rpartition("-")
+    days_start = backup_lib.parse_schedule(head)
+    days_end = backup_lib.parse_schedule(end)
+    if not head or days_start is None or days_end is None:
+        raise ValueError("Window must look like 'mon..fri 08:00-18:00'")
+    days, start = days_start
+    return days, start, days_end[1]
+
+def in_window(window, now):
+    """Whether the local time ``now`` (a datetime) is inside ``window``"""
+    days, start, end = window
+    minute = now.hour * 60 + now.minute
+    day = now.weekday()
+    if start <= end:
+        return day in days and start <= minute < end
+    # the part after midnight belongs to the day before
+    return (day in days and minute >= start) or \
+        ((day - 1) % 7 in days and minute < end)
+
+def load_states(path):
+    """
+    Read a state file: rules under a ``guests`` key, or a bare list.
+
+    A rule selects guests with ``vmid``, ``node`` and ``name`` like vm
+    apply, at least one of them, and sets either ``state`` (running or
+    stopped) or ``running``, a window outside which the guests are
+    stopped. Unknown keys are refused. Later rules win.
+    """
+    data = utils.yaml_read(path)
+    if isinstance(data, dict):
+        data = data.get('guests')
+    if not isinstance(data, list):
+        raise ValueError("{}: expected a list of rules".format(path))
+    for number, rule in enumerate(data, 1):
+        vm_lib.check_rule(path, number, rule, ("state", "running"))
+        if ('state' in rule) == ('running' in rule):
+            raise ValueError("{}: rule {} needs either state or running".format(
+                path, number))
+        if 'state' in rule and rule['state'] not in STATES:
+            raise ValueError("{}: rule {} state must be running or stopped".format(
+                path, number))
+        if 'running' in rule:
+            try:
+                rule['window'] = parse_window(rule['running'])
+            except ValueError as e:
+                raise ValueError("{}: rule {}: {}".format(path, number, e))
+    return data
+
+def desired_states(guests, rules, now):
+    """{vmid: (guest, state)} of every guest a rule selects, at ``now``"""
+    states = {}
+    for rule in rules:
+        if 'window' in rule:
+            state = "running" if in_window(rule['window'], now) else "stopped"
+        else:
+            state = rule['state']
+        for guest in vm_lib.filter_vms(guests, rule.get('vmid'), rule.get('node'),
+                                       rule.get('name'), types=TYPES):
+            states[guest['vmid']] = (guest, state)
+    return states
+
+def settle(pending, guests, now, timeout):
+    """
+    Drop the actions the listing shows done or that ran out of time.
+
+    ``pending`` maps a vmid to its action, it is updated in place.
+    Returns (action, outcome) pairs, outcome "done", "gone" or "timeout".
+    """
+    status = dict((guest['vmid'], guest.get('status')) for guest in guests)
+    settled = list()
+    for vmid, action in sorted(pending.items()):
+        if status.get(vmid) == action['state']:
+            settled.append((action, "done"))
+        elif vmid not in status:
+            settled.append((action, "gone"))
+        elif now - action['since'] > timeout:
+            settled.append((action, "timeout"))
+        else:
+            continue
+        del pending[vmid]
+    return settled
+
+def plan(states, pending, per_node=None):
+    """
+    Actions bringing the guests to their states, by vmid.
+
+    Locked guests (backup, migration, snapshot) and guests with an
+    action in flight are left alone. With ``per_node`` a node gets at
+    most that many unsettled actions, the others wait for a later cycle.
+    Returns (actions, deferred).
+    """
+    busy = {}
+    for action in pending.values():
+        busy[action['node']] = busy.get(action['node'], 0) + 1
+    actions = list()
+    deferred = list()
+    for vmid in sorted(states, key=int):
+        guest, state = states[vmid]
+        if vmid in pending or guest.get('lock'):
+            continue
+        running = guest.get('status') == "running"
+        if running == (state == "running"):
+            continue
+        action = {"vmid": vmid, "node": guest['node'], "type": guest['type'],
+                  "name": guest.get('name'), "state": state,
+                  "action": ACTIONS[state]}
+        if per_node and busy.get(guest['node'], 0) >= per_node:
+            deferred.append(action)
+            continue
+        busy[guest['node']] = busy.get(guest['node'], 0) + 1
+        actions.append(action)
+    return actions, deferred
+
+def act(action, shutdown_timeout=None, force=False):
+    """Send one start or shutdown, returns the UPID of its task"""
+    prox = get_auth()
+    node, vmid = action['node'], action['vmid']
+    if action['action'] == "start":
+        if action['type'] == "lxc":
+            return proxmox_lib.check(prox.startLXCContainer(node, vmid))
+        return proxmox_lib.check(prox.startVirtualMachine(node, vmid))
+    post_data = {}
+    if shutdown_timeout:
+        post_data['timeout'] = int(shutdown_timeout)
+    if force:
+        post_data['forceStop'] = 1
+    if action['type'] == "lxc":
+        return proxmox_lib.check(prox.shutdownLXCContainer(node, vmid, post_data))
+    return proxmox_lib.check(prox.shutdownVirtualMachine(node, vmid, post_data))
+
+def task_outcome(action):
+    """Exit status of the task of an action that did not settle in time"""
+    if not action.get('upid'):
+        return None
+    status = task_lib.task_status(action['node'], action['upid'])
+    if status.get('status') != "stopped":
+        return "still running"
+    return status.get('exitstatus')
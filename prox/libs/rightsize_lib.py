@@ -0,0 +1,100 @@
+"""
+VM right-sizing from RRD history.
+
+CPU and memory samples of every VM are packed into NaN padded numpy
+matrices and their percentiles taken for all VMs in one call, so the
+analysis of thousands of VMs costs a few array operations.
+"""
+from prox.libs import login_lib
+from prox.libs import proxmox_lib
+import math
+import warnings
+
+TIMEFRAMES = ("week", "month")
+MEM_STEP = 512 * (1 << 20)
+
+
+def get_auth():
+    try:
+        prox = login_lib.load_dumped_session()
+    except Exception as e:
+        print(e)
+        exit()
+    else:
+        return prox
+
+def vm_history(node, vm_id, timeframes=TIMEFRAMES):
+    """RRD rows of a VM over every timeframe, one list"""
+    prox = get_auth()
+    rows = list()
+    for timeframe in timeframes:
+        rows.extend(proxmox_lib.check(
+            prox.getVirtualRRDData(node, vm_id, timeframe)) or [])
+    return rows
+
+def _matrix(histories, field, scale=None):
+    import numpy as np
+    width = max([len(i) for i in histories] + [1])
+    matrix = np.full((len(histories), width), np.nan)
+    for row, history in enumerate(histories):
+        values = [np.nan if i.get(field) is None else i[field] for i in history]
+        matrix[row, :len(values)] = values
+    if scale is not None:
+        matrix *= np.asarray(scale, dtype=float)[:, None]
+    return matrix
+
+def _percentile(matrix, percentile):
+    import numpy as np
+    with warnings.catch_warnings():
+        # VMs without samples give NaN, not a warning per row
+        warnings.simplefilter("ignore", RuntimeWarning)
+        return np.nanpercentile(matrix, percentile, axis=1)
+
+def analyse(vms, histories, percentile=95, headroom=0.2):
+    """
+    Recommend vCPUs and memory for every VM.
+
+    ``histories`` holds the RRD rows of each VM in ``vms`` order. CPU
+    samples are a share of the configured vCPUs and become cores, the
+    ``percentile`` of cores and memory plus ``headroom`` gives the size,
+    at least one vCPU and memory in 512 MiB steps. VMs without samples
+    keep their size.
+    """
+    import numpy as np
+    cpus = np.array([vm.get('maxcpu') or 1 for vm in vms], dtype=float)
+    cores = _percentile(_matrix(histories, 'cpu', cpus), percentile)
+    memory = _percentile(_matrix(histories, 'mem'), percentile)
+
+    results = list()
+    for row, vm in enumerate(vms):
+        maxmem = vm.get('maxmem') or 0
+        result = {
+            "vmid": vm.get('vmid'),
+            "name": vm.get('name'),
+            "node": vm.get('node'),
+            "cpus": int(cpus[row]),
+            "cpu": None,
+            "rec_cpus": int(cpus[row]),
+            "maxmem": maxmem,
+            "mem": None,
+            "rec_mem": maxmem
+        }
+        if not np.isnan(cores[row]):
+            result['cpu'] = float(cores[row])
+            result['rec_cpus'] = max(1, int(math.ceil(
+                cores[row] * (1 + headroom) - 1e-9)))
+        if not np.isnan(memory[row]):
+            result['mem'] = float(memory[row])
+            steps = math.ceil(memory[row] * (1 + headroom) / MEM_STEP)
+            result['rec_mem'] = int(max(1, steps) * MEM_STEP)
+        results.append(result)
+    return results
+
+def reclaimable(results):
+    """vCPUs and memory freed per node if every VM shrinks as recommended"""
+    nodes = {}
+    for i in results:
+        node = nodes.setdefault(i['node'], {"cpus": 0, "mem": 0})
+        node['cpus'] += max(0, i['cpus'] - i['rec_cpus'])
+        node['mem'] += max(0, i['maxmem'] - i['rec_mem'])
+    return nodes
@@ -0,0 +1,89 @@
+from prox.libs import login_lib
+from prox.libs import proxmox_lib
+import time
+
+DEFAULT_PREFIX = "prox"
+
+
+def get_auth():
+    try:
+        prox = login_lib.load_dumped_session()
+    except Exception as e:
+        print(e)
+        exit()
+    else:
+        return prox
+
+def list_snapshots(node, vm_id):
+    """Snapshots of a VM without the 'current' pseudo entry"""
+    prox = get_auth()
+    snapshots = prox.getVirtualSnapshots(node, vm_id)
+    return [i for i in snapshots['data'] if i.get('name') != "current"]
+
+def create_snapshot(node, vm_id, snapname, description=None, vmstate=False):
+    prox = get_auth()
+    task = prox.snapshotVirtualMachine(node, vm_id, snapname,
+                                       description, vmstate)
+    return proxmox_lib.check(task)
+
+def rollback_snapshot(node, vm_id, snapname):
+    prox = get_auth()
+    task = prox.rollbackVirtualMachine(node, vm_id, snapname)
+    return proxmox_lib.check(task)
+
+def delete_snapshot(node, vm_id, snapname):
+    prox = get_auth()
+    task = prox.deleteVirtualMachineSnapshot(node, vm_id, snapname)
+    return proxmox_lib.check(task)
+
+def snapshot_name(prefix=DEFAULT_PREFIX, now=None):
+    """Snapshot names must start with a letter and stay in [A-Za-z0-9_-]"""
+    if now is None:
+        now = time.time()
+    return "{}_{}".format(prefix, time.strftime("%Y%m%d_%H%M%S",
+                                                time.localtime(now)))
+
+def owned(snapshots, prefix=DEFAULT_PREFIX):
+    """Snapshots created by prox with ``prefix``, newest first"""
+    mine = [i for i in snapshots
+            if i.get('name', '').startswith(prefix + "_")]
+    return sorted(mine, key=lambda i: i.get('snaptime', 0), reverse=True)
+
+def retention(snapshots, keep_last=0, keep_daily=0):
+    """
+    Split snapshots into (keep, remove) lists.
+
+    keep-last keeps the newest N snapshots. keep-daily then keeps the
+    newest snapshot of each of the N most recent days not already covered
+    by a kept snapshot. With no rule set everything is kept.
+    """
+    ordered = sorted(snapshots, key=lambda i: i.get('snaptime', 0),
+                     reverse=True)
+    if not keep_last and not keep_daily:
+        return ordered, list()
+
+    kept = set()
+    for snapshot in ordered[:keep_last]:
+        kept.add(snapshot['name'])
+
+    def day(snapshot):
+        return time.strftime("%Y-%m-%d",
+                             time.localtime(snapshot.get('snaptime', 0)))
+
+    if keep_daily:
+        covered = set(day(i) for i in ordered if i['name'] in kept)
+        days = set()
+        for snapshot in ordered:
+            if snapshot['name'] in kept:
+                continue
+            period = day(snapshot)
+            if period in covered or period in days:
+                continue
+            if len(days) >= keep_daily:
+                break
+            days.add(period)
+            kept.add(snapshot['name'])
+
+    keep = [i for i in ordered if i['name'] in kept]
+    remove = [i for i in ordered if i['name'] not in kept]
+    return keep, remove
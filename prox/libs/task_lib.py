@@ -0,0 +1,165 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from prox.libs import login_lib
+from prox.libs import proxmox_lib
+import threading
+import time
+
+
+def get_auth():
+    try:
+        prox = login_lib.load_dumped_session()
+    except Exception as e:
+        print(e)
+        exit()
+    else:
+        return prox
+
+
+class TaskError(Exception):
+    """A Proxmox task did not finish with exit status OK."""
+    pass
+
+
+def upid_node(upid):
+    """Node name encoded in a UPID:node:pid:pstart:starttime:type:id:user: string"""
+    return upid.split(":")[1]
+
+
+def task_status(node, upid):
+    prox = get_auth()
+    status = prox.getNodeTaskStatusByUPID(node, upid)
+    return status['data']
+
+
+def task_log(node, upid, limit=None):
+    """Lines of a task log as plain strings, raises ProxmoxError on failure"""
+    prox = get_auth()
+    log = proxmox_lib.check(prox.getNodeTaskLogByUPID(node, upid, limit=limit))
+    return [i.get('t', '') for i in log or []]
+
+
+def wait_task(upid, node=None, timeout=None, interval=1.0):
+    """
+    Poll a task until it stops and return its final status.
+
+    Raises TaskError when the task fails or ``timeout`` seconds pass.
+    """
+    if not upid:
+        raise TaskError("No task was created")
+    if node is None:
+        node = upid_node(upid)
+    deadline = None
+    if timeout:
+        deadline = time.time() + timeout
+    while True:
+        status = task_status(node, upid)
+        if status and status.get('status') == "stopped":
+            if status.get('exitstatus') != "OK":
+                raise TaskError(status.get('exitstatus') or "task failed")
+            return status
+        if deadline and time.time() > deadline:
+            raise TaskError("Timeout waiting for {}".format(upid))
+        time.sleep(interval)
+
+
+class Limiter(object):
+    """
+    Named concurrency budgets, e.g. at most 2 jobs per node and 1 per storage.
+
+    ``limits`` maps a kind ("node", "storage") to the number of jobs that
+    may hold the same key of that kind at once.
+    """
+
+    def __init__(self, limits=None):
+        self.limits = limits or {}
+        self.used = {}
+        self.lock = threading.Lock()
+
+    def tokens(self, keys):
+        tokens = set()
+        for kind, values in (keys or {}).items():
+            if not self.limits.get(kind):
+                continue
+            if not isinstance(values, (list, tuple, set)):
+                values = [values]
+            for value in values:
+                tokens.add((kind, str(value)))
+        return sorted(tokens)
+
+    def try_acquire(self, keys):
+        """Take every budget ``keys`` needs, or none of them and return None"""
+        tokens = self.tokens(keys)
+        with self.lock:
+            for token in tokens:
+                if self.used.get(token, 0) >= self.limits[token[0]]:
+                    return None
+            for token in tokens:
+                self.used[token] = self.used.get(token, 0) + 1
+        return tokens
+
+    def release(self, tokens):
+        with self.lock:
+            for token in tokens:
+                self.used[token] -= 1
+
+
+def run_parallel(items, func, workers=8, limits=None, keys=None, after=None):
+    """
+    Call ``func(item)`` for every item on a thread pool.
+
+    ``keys(item)`` returns the limiter keys of an item, see Limiter. Items
+    are only started once their budgets are free, so a busy node never
+    holds up work queued for the others. ``after(item)`` returns the
+    indexes of earlier items that must succeed before it starts; when
+    one fails the item is not run. Returns ``(item, result, error)``
+    tuples in item order, a failing item never stops the others.
+    """
+    limiter = Limiter(limits)
+    results = [None] * len(items)
+    pending = list(enumerate(items))
+    waits = dict((index, after(item) if after else ()) for index, item in pending)
+
+    def failed(index):
+        return [i for i in waits[index]
+                if results[i] is not None and results[i][2] is not None]
+
+    def waiting(index):
+        return any(results[i] is None for i in waits[index])
+
+    def call(index, item, tokens):
+        try:
+            results[index] = (item, func(item), None)
+        except (Exception, SystemExit) as e:
+            results[index] = (item, None, e)
+        finally:
+            limiter.release(tokens)
+
+    workers = max(1, workers)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        running = set()
+        while pending or running:
+            # in item order, so a chain of items not run is settled at once
+            kept = list()
+            for index, item in pending:
+                broken = failed(index)
+                if broken:
+                    results[index] = (item, None, TaskError(
+                        "Not run, item {} it waits for failed".format(broken[0] + 1)))
+                else:
+                    kept.append((index, item))
+            pending = kept
+            while pending and len(running) < workers:
+                for position, (index, item) in enumerate(pending):
+                    # a failure seen only now is reported on the next pass
+                    if waiting(index) or failed(index):
+                        continue
+                    tokens = limiter.try_acquire(keys(item) if keys else None)
+                    if tokens is not None:
+                        break
+                else:
+                    break
+                del pending[position]
+                running.add(pool.submit(call, index, item, tokens))
+            if running:
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+    return results
@@ -0,0 +1,273 @@
+"""
+Local task history.
+
+Proxmox keeps a bounded, rotating task list per node. It is copied into
+an indexed SQLite database: every sync asks a node only for the tasks
+started since the newest one stored, or since the oldest one stored
+while still running, so a repeated sync transfers the new rows and the
+few that finished since. A task still running RUNNING_WINDOW after the
+newest one started is no longer waited for, so a task that never gets
+an end time can not pin every sync to its start. History queries then
+never touch the API.
+"""
+from prox.libs import login_lib
+from prox.libs import models
+from prox.libs import proxmox_lib
+from prox.libs import task_lib
+from prox.libs import utils
+import re
+import sqlite3
+
+DB_FILE = "{}/.prox.tasks.db".format(utils.APP_HOME)
+# rows per request while paging through a node's task list
+PAGE = 500
+# lines kept of a failed task's log
+LOG_LINES = 1000
+COLUMNS = ("upid", "node", "type", "id", "user", "status", "starttime",
+           "endtime", "pid", "pstart")
+GROUPS = ("type", "user", "node", "id", "status")
+PERCENTILES = (50, 90, 99)
+# seconds before the newest stored task a running one is still asked for
+RUNNING_WINDOW = 24 * 3600
+# how a node answers for a task whose log was rotated away
+LOG_GONE = re.compile(r'no such (task|file)', re.IGNORECASE)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    upid TEXT PRIMARY KEY,
+    node TEXT NOT NULL,
+    type TEXT,
+    id TEXT,
+    user TEXT,
+    status TEXT,
+    starttime INTEGER,
+    endtime INTEGER,
+    duration INTEGER,
+    pid INTEGER,
+    pstart INTEGER
+);
+CREATE INDEX IF NOT EXISTS tasks_node ON tasks (node, starttime);
+CREATE INDEX IF NOT EXISTS tasks_start ON tasks (starttime);
+CREATE INDEX IF NOT EXISTS tasks_id ON tasks (id, starttime);
+CREATE INDEX IF NOT EXISTS tasks_type ON tasks (type, duration, status);
+CREATE INDEX IF NOT EXISTS tasks_user ON tasks (user, starttime);
+CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status);
+CREATE INDEX IF NOT EXISTS tasks_running ON tasks (node, starttime)
+    WHERE endtime IS NULL;
+CREATE TABLE IF NOT EXISTS task_logs (
+    upid TEXT PRIMARY KEY,
+    log TEXT
+);
+"""
+
+# a stored task is only rewritten while it has no end time
+UPSERT = """
+INSERT INTO tasks ({0}, duration) VALUES ({1}, ?)
+ON CONFLICT (upid) DO UPDATE SET status = excluded.status,
+    endtime = excluded.endtime, duration = excluded.duration
+WHERE tasks.endtime IS NULL
+""".format(", ".join(COLUMNS), ", ".join("?" * len(COLUMNS)))
+
+
+def get_auth():
+    try:
+        prox = login_lib.load_dumped_session()
+    except Exception as e:
+        print(e)
+        exit()
+    else:
+        return prox
+
+def connect(path=DB_FILE):
+    db = sqlite3.connect(path)
+    db.executescript(SCHEMA)
+    return db
+
+def since(db, node, window=RUNNING_WINDOW):
+    """
+    Start time to ask ``node`` for: its oldest running task, or its
+    newest one. Running tasks started more than ``window`` seconds
+    before the newest one are left as they are.
+    """
+    newest = db.execute("SELECT max(starttime) FROM tasks WHERE node = ?",
+                        (node,)).fetchone()[0] or 0
+    running = db.execute("SELECT min(starttime) FROM tasks "
+                         "WHERE node = ? AND endtime IS NULL AND starttime >= ?",
+                         (node, newest - window)).fetchone()[0]
+    if running is not None:
+        return running
+    return newest
+
+def fetch(node, start_time=0, page=PAGE):
+    """Tasks of ``node`` started at or after ``start_time``, finished and running"""
+    prox = get_auth()
+    rows = list()
+    offset = 0
+    while True:
+        count = 0
+        for row in prox.iterNodeTasks(node, offset, page, since=start_time,
+                                      source="all"):
+            rows.append(row)
+            count += 1
+        if count < page:
+            return rows
+        offset += page
+
+def store(db, rows, node=None):
+    """Insert new tasks and finish running ones, returns the rows changed"""
+    values = list()
+    for row in rows:
+        task = [row.get(i) for i in COLUMNS]
+        if task[1] is None:
+            task[1] = node
+        if task[3] is not None:
+            task[3] = str(task[3])
+        if not row.get('endtime'):
+            # a running task has no final status yet
+            task[5] = None
+            task[7] = None
+        duration = None
+        if task[6] and task[7]:
+            duration = task[7] - task[6]
+        values.append(task + [duration])
+    before = db.total_changes
+    with db:
+        db.executemany(UPSERT, values)
+    return db.total_changes - before
+
+def missing_logs(db):
+    """(node, upid) of failed tasks whose log was never fetched"""
+    return db.execute("SELECT t.node, t.upid FROM tasks t "
+                      "LEFT JOIN task_logs l ON l.upid = t.upid "
+                      "WHERE t.endtime IS NOT NULL AND t.status != 'OK' "
+                      "AND l.upid IS NULL ORDER BY t.starttime").fetchall()
+
+def store_logs(db, logs):
+    """Save (upid, log) pairs, a None log marks one the node no longer has"""
+    with db:
+        db.executemany("INSERT OR REPLACE INTO task_logs (upid, log) "
+                       "VALUES (?, ?)", logs)
+
+def fetch_log(item):
+    node, upid = item
+    return "\n".join(task_lib.task_log(node, upid, LOG_LINES))
+
+def log_gone(error):
+    """Whether a log fetch failed because the node no longer has the log"""
+    return isinstance(error, proxmox_lib.ProxmoxError) and \
+        LOG_GONE.search(str(error)) is not None
+
+def sync(db, nodes, logs=False, workers=4):
+    """
+    Pull the new tasks of every node into ``db``.
+
+    Nodes are read in parallel and stored one after the other. With
+    ``logs`` the logs of failed tasks are fetched as well, once each; a
+    log the node no longer has is marked gone, one that failed otherwise
+    is asked for again by the next sync.
+    Returns (node, tasks transferred, rows changed, error) tuples and
+    the number of logs saved.
+    """
+    starts = dict((node, since(db, node)) for node in nodes)
+    report = list()
+    for node, rows, error in task_lib.run_parallel(
+            nodes, lambda n: fetch(n, starts[n]), workers):
+        if error is not None:
+            report.append((node, 0, 0, error))
+            continue
+        report.append((node, len(rows), store(db, rows, node), None))
+
+    saved = 0
+    if logs:
+        wanted = [i for i in missing_logs(db) if i[0] in starts]
+        found = list()
+        for (node, upid), log, error in task_lib.run_parallel(
+                wanted, fetch_log, workers):
+            if error is None:
+                found.append((upid, log))
+                saved += 1
+            elif log_gone(error):
+                found.append((upid, None))
+        store_logs(db, found)
+    return report, saved
+
+def _where(node=None, vmid=None, type=None, user=None, status=None,
+           start_time=None, min_duration=None):
+    clauses = list()
+    params = list()
+    for column, value in (("node", node), ("id", vmid), ("type", type),
+                          ("user", user)):
+        if value is not None:
+            clauses.append("{} = ?".format(column))
+            params.append(str(value))
+    if status is not None:
+        if status.lower() == "ok":
+            clauses.append("status = 'OK'")
+        elif status.lower() in ("failed", "error"):
+            clauses.append("endtime IS NOT NULL AND status != 'OK'")
+        elif status.lower() == "running":
+            clauses.append("endtime IS NULL")
+        else:
+            clauses.append("status = ?")
+            params.append(status)
+    if start_time is not None:
+        clauses.append("starttime >= ?")
+        params.append(int(start_time))
+    if min_duration is not None:
+        clauses.append("duration >= ?")
+        params.append(int(min_duration))
+    if not clauses:
+        return "", params
+    return " WHERE " + " AND ".join(clauses), params
+
+def query(db, limit=None, **filters):
+    """Stored tasks matching the filters as Task records, newest first"""
+    where, params = _where(**filters)
+    sql = "SELECT {} FROM tasks{} ORDER BY starttime DESC".format(
+        ", ".join(COLUMNS), where)
+    if limit:
+        sql += " LIMIT ?"
+        params.append(int(limit))
+    return [models.Task.from_api(dict(zip(COLUMNS, row)))
+            for row in db.execute(sql, params)]
+
+def percentile(values, p):
+    """Nearest-rank percentile of sorted ``values``"""
+    if not values:
+        return None
+    return values[max(1, -(-len(values) * p // 100)) - 1]
+
+def stats(db, by="type", **filters):
+    """
+    Count, failures and duration percentiles of finished tasks per ``by``.
+
+    Durations come out of SQLite sorted per group, by type straight from
+    the covering index, and the percentiles are picked from them.
+    """
+    if by not in GROUPS:
+        raise ValueError("Group by one of " + ", ".join(GROUPS))
+    where, params = _where(**filters)
+    where += (" AND " if where else " WHERE ") + "duration IS NOT NULL"
+    sql = "SELECT {0}, duration, status FROM tasks{1} " \
+          "ORDER BY {0}, duration".format(by, where)
+    groups = list()
+    for key, duration, status in db.execute(sql, params):
+        if not groups or key != groups[-1][by]:
+            groups.append({by: key, "durations": list(), "failed": 0})
+        groups[-1]['durations'].append(duration)
+        groups[-1]['failed'] += status != "OK"
+    result = list()
+    for group in groups:
+        durations = group.pop('durations')
+        row = {by: group[by], "count": len(durations), "failed": group['failed']}
+        for p in PERCENTILES:
+            row["p{}".format(p)] = percentile(durations, p)
+        row["max"] = durations[-1]
+        result.append(row)
+    return result
+
+def task_log(db, upid):
+    """Stored log of a task, None when it was not fetched or is gone"""
+    row = db.execute("SELECT log FROM task_logs WHERE upid = ?",
+                     (upid,)).fetchone()
+    return row[0] if row else None
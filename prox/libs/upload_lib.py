@@ -0,0 +1,174 @@
+"""
+Uploads to a storage.
+
+The file is sent inside a multipart body that is generated while the
+request is written: the form head, then the file read in blocks, then
+the closing boundary. Memory use does not depend on the file size. The
+checksum is computed beforehand in one more pass over the file (or
+given by the caller) and sent along, so the node verifies what it got
+before the upload task moves the file into the storage.
+"""
+from prox.libs import login_lib
+from prox.libs import proxmox_lib
+import hashlib
+import os
+import sys
+import time
+import uuid
+
+CHUNK = 1 << 20
+ALGORITHMS = ("md5", "sha1", "sha224", "sha256", "sha384", "sha512")
+# content types by file suffix
+CONTENT = ((".iso", "iso"), (".img", "iso"), (".tar.gz", "vztmpl"),
+           (".tar.xz", "vztmpl"), (".tar.zst", "vztmpl"), (".tgz", "vztmpl"))
+
+
+def get_auth():
+    try:
+        prox = login_lib.load_dumped_session()
+    except Exception as e:
+        print(e)
+        exit()
+    else:
+        return prox
+
+def guess_content(path):
+    name = path.lower()
+    for suffix, content in CONTENT:
+        if name.endswith(suffix):
+            return content
+    return None
+
+def parse_checksum(text, default="sha256"):
+    """'sha512:ab12..' or a bare digest -> (algorithm, digest)"""
+    algorithm, sep, digest = text.strip().rpartition(":")
+    algorithm = (algorithm or default).lower()
+    if algorithm not in ALGORITHMS:
+        raise ValueError("Checksum algorithm must be one of " + ", ".join(ALGORITHMS))
+    if not digest or any(c not in "0123456789abcdefABCDEF" for c in digest):
+        raise ValueError("Checksum must be hexadecimal")
+    return algorithm, digest.lower()
+
+def file_checksum(path, algorithm="sha256", progress=None):
+    digest = hashlib.new(algorithm)
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(CHUNK)
+            if not block:
+                break
+            digest.update(block)
+            if progress:
+                progress.add(len(block))
+    return digest.hexdigest()
+
+
+class Progress(object):
+    """Bytes done, percent and throughput on one terminal line"""
+
+    def __init__(self, total, label, stream=None, interval=0.5):
+        self.total = total
+        self.label = label
+        self.stream = stream or sys.stderr
+        self.interval = interval
+        self.done = 0
+        self.started = time.time()
+        self.shown = 0.0
+        self.live = hasattr(self.stream, "isatty") and self.stream.isatty()
+
+    def rate(self):
+        elapsed = max(time.time() - self.started, 1e-6)
+        return self.done / elapsed
+
+    def line(self):
+        percent = 100.0 * self.done / self.total if self.total else 100.0
+        return "{} {:5.1f}% {:.2f}/{:.2f} GiB {:.1f} MiB/s".format(
+            self.label, percent, self.done / float(1 << 30),
+            self.total / float(1 << 30), self.rate() / (1 << 20))
+
+    def add(self, count):
+        self.done += count
+        now = time.time()
+        if self.live and now - self.shown >= self.interval:
+            self.shown = now
+            self.stream.write("\r" + self.line())
+            self.stream.flush()
+
+    def finish(self):
+        if self.live:
+            self.stream.write("\r" + self.line() + "\n")
+            self.stream.flush()
+
+
+class MultipartStream(object):
+    """
+    multipart/form-data body of some fields and one file, read like a file.
+
+    Form fields come first as the API expects, the file part last.
+    """
+
+    def __init__(self, fields, name, path, filename=None, progress=None):
+        boundary = uuid.uuid4().hex
+        self.content_type = "multipart/form-data; boundary=" + boundary
+        head = b""
+        for key, value in fields:
+            head += ("--{}\r\nContent-Disposition: form-data; name=\"{}\"\r\n\r\n"
+                     "{}\r\n").format(boundary, key, value).encode("utf-8")
+        head += ("--{}\r\nContent-Disposition: form-data; name=\"{}\"; "
+                 "filename=\"{}\"\r\nContent-Type: application/octet-stream"
+                 "\r\n\r\n").format(boundary, name,
+                                    filename or os.path.basename(path)).encode("utf-8")
+        self.parts = [head, None, ("\r\n--{}--\r\n".format(boundary)).encode("utf-8")]
+        self.path = path
+        self.size = os.path.getsize(path)
+        self.file = None
+        self.part = 0
+        self.offset = 0
+        self.progress = progress
+
+    def __len__(self):
+        return len(self.parts[0]) + self.size + len(self.parts[2])
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = CHUNK
+        while self.part < 3:
+            if self.part == 1:
+                if self.file is None:
+                    self.file = open(self.path, "rb")
+                block = self.file.read(size)
+                if block:
+                    if self.progress:
+                        self.progress.add(len(block))
+                    return block
+                self.file.close()
+            else:
+                data = self.parts[self.part]
+                if self.offset < len(data):
+                    block = data[self.offset:self.offset + size]
+                    self.offset += len(block)
+                    return block
+            self.part += 1
+            self.offset = 0
+        return b""
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+
+def upload(node, storage, path, content, checksum=None, progress=None):
+    """
+    Upload ``path`` to a storage and return the UPID of the upload task.
+
+    ``checksum`` is an (algorithm, digest) pair the node checks the
+    received file against.
+    """
+    prox = get_auth()
+    fields = [("content", content)]
+    if checksum:
+        fields += [("checksum-algorithm", checksum[0]), ("checksum", checksum[1])]
+    body = MultipartStream(fields, "filename", path, progress=progress)
+    try:
+        return proxmox_lib.check(prox.uploadStorageContent(node, storage, body))
+    finally:
+        body.close()
@@ -7,6 +7,8 @@ import zipfile
 from dotenv import load_dotenv
 import coloredlogs
 import logging
+import json
+import sys
 
 APP_HOME = os.path.expanduser("~")
 APP_ROOT = os.path.dirname(os.path.abspath(__file__))
@@ -61,7 +63,7 @@ def template_git(url, dir):
 
 def yaml_parser(stream):
     try:
-        data = yaml.load(stream)
+        data = yaml.safe_load(stream)
         return data
     except yaml.YAMLError as exc:
         print(exc)
@@ -89,7 +91,7 @@ def yaml_writeln(stream, path):
 def yaml_read(path):
     with open(path, 'r') as outfile:
         try:
-            data = yaml.load(outfile)
+            data = yaml.safe_load(outfile)
         except yaml.YAMLError as exc:
             print(exc)
         else:
@@ -158,6 +160,7 @@ def get_env_values():
         prox_env = {}
         prox_env['username'] = os.environ.get('OS_USERNAME')
         prox_env['password'] = os.environ.get('OS_PASSWORD')
+        prox_env['token'] = os.environ.get('OS_API_TOKEN')
         prox_env['project_url'] = os.environ.get('OS_PROJECT_URL')
         prox_env['project_port'] = os.environ.get('OS_PROJECT_PORT')
         return prox_env
@@ -198,3 +201,10 @@ def make_archive(name, path):
     shutil.make_archive(name,"zip",path)
 
 
+
+def ndjson(obj, stream=None):
+    """Write ``obj`` as one line of newline delimited JSON."""
+    if stream is None:
+        stream = sys.stdout
+    stream.write(json.dumps(obj, default=str, sort_keys=True) + "\n")
+    stream.flush()
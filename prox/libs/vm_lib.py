@@ -1,5 +1,9 @@
+from prox.libs import clusters_lib
 from prox.libs import login_lib
+from prox.libs import proxmox_lib
 from prox.libs import utils
+import fnmatch
+import re
 
 def get_auth():
     try:
@@ -29,3 +33,153 @@ def get_vm_rrd(node, vm_id):
     prox = get_auth()
     vm_rrd = prox.getVirtualRRD(node, vm_id)
     return vm_rrd['data']
+
+def get_vm_config(node, vm_id):
+    prox = get_auth()
+    vm_config = prox.getVirtualConfig(node, vm_id)
+    return vm_config['data']
+
+
+# rule keys choosing guests, like the filter_vms arguments
+SELECTORS = ("vmid", "node", "name")
+DISK_KEYS = re.compile(r'^(ide|sata|scsi|virtio|efidisk|tpmstate|unused)\d+$')
+
+def vm_storages(config):
+    """Storages holding the disks of a VM config, cdrom drives excluded"""
+    storages = set()
+    for key, value in (config or {}).items():
+        if not DISK_KEYS.match(key) or not isinstance(value, str):
+            continue
+        if "media=cdrom" in value:
+            continue
+        volume = value.split(",")[0]
+        if ":" in volume and not volume.startswith("/"):
+            storages.add(volume.split(":")[0])
+    return sorted(storages)
+
+def parse_vmids(value):
+    """Expand '100,105-107' into [100, 105, 106, 107]"""
+    vmids = list()
+    for part in str(value).split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            first, last = part.split("-", 1)
+            vmids.extend(range(int(first), int(last) + 1))
+        else:
+            vmids.append(int(part))
+    return vmids
+
+def filter_vms(vms, vmids=None, node=None, name=None, status=None,
+               types=("qemu",), templates=False):
+    """
+    Keep the VMs of a cluster/resources listing matching a selector.
+
+    ``vmids`` is a '100,105-107' list, ``name`` a shell glob, ``types``
+    the guest types to keep. Templates are only selected with
+    ``templates``.
+    """
+    wanted = set(parse_vmids(vmids)) if vmids else None
+    selected = list()
+    for vm in vms:
+        if vm.get('type') not in types:
+            continue
+        if vm.get('template') and not templates:
+            continue
+        if wanted is not None and int(vm['vmid']) not in wanted:
+            continue
+        if node and vm.get('node') != node:
+            continue
+        if name and not fnmatch.fnmatch(vm.get('name', ''), name):
+            continue
+        if status and vm.get('status') != status:
+            continue
+        selected.append(vm)
+    return sorted(selected, key=lambda vm: int(vm['vmid']))
+
+def select_vms(vmids=None, node=None, name=None, status=None,
+               templates=False, types=("qemu",)):
+    """Resolve a VM selector with one cluster wide resource listing"""
+    return filter_vms(clusters_lib.list_resources("vm"), vmids, node, name,
+                      status, types, templates)
+
+def set_vm_config(node, vm_id, changes, delete=None, digest=None):
+    """
+    Write only ``changes`` to a VM config.
+
+    ``delete`` lists keys to remove. With ``digest`` the API refuses the
+    write if the config changed since it was read.
+    """
+    prox = get_auth()
+    post_data = dict(changes)
+    if delete:
+        post_data['delete'] = ",".join(delete)
+    if digest:
+        post_data['digest'] = digest
+    result = prox.setVirtualMachineOptions(node, vm_id, post_data)
+    return proxmox_lib.check(result)
+
+def _config_value(value):
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    return str(value)
+
+def config_diff(current, desired):
+    """
+    Compare a VM config with the desired keys.
+
+    A desired value of None removes the key. Returns (changes, delete)
+    with only what differs, both empty when the VM is already in shape.
+    """
+    changes = {}
+    delete = list()
+    for key in sorted(desired):
+        value = desired[key]
+        if value is None:
+            if key in current:
+                delete.append(key)
+        elif key not in current or \
+                _config_value(current[key]) != _config_value(value):
+            changes[key] = _config_value(value)
+    return changes, delete
+
+def check_rule(path, number, rule, keys):
+    """
+    Raise ValueError unless ``rule`` is a mapping of the selectors and
+    ``keys`` only, with at least one selector: a rule without one, or
+    with a misspelt one, would select every guest of the cluster.
+    """
+    if not isinstance(rule, dict):
+        raise ValueError("{}: rule {} is not a mapping".format(path, number))
+    unknown = sorted(str(i) for i in rule if i not in SELECTORS and i not in keys)
+    if unknown:
+        raise ValueError("{}: rule {} has unknown keys {}, use {}".format(
+            path, number, ", ".join(unknown), ", ".join(SELECTORS + tuple(keys))))
+    if all(rule.get(i) in (None, "") for i in SELECTORS):
+        raise ValueError("{}: rule {} needs vmid, node or name".format(path, number))
+
+def load_rules(path):
+    """
+    Read a desired state file.
+
+    The file holds a list of rules, bare or under a ``vms`` key. Each rule
+    selects VMs with ``vmid``, ``node`` and ``name`` like filter_vms.
+    """
+    data = utils.yaml_read(path)
+    if isinstance(data, dict):
+        data = data.get('vms')
+    if not isinstance(data, list):
+        raise ValueError("{}: expected a list of rules".format(path))
+    for number, rule in enumerate(data, 1):
+        check_rule(path, number, rule, ("config",))
+    return data
+
+def match_rules(vms, rules):
+    """Pair every VM with the rules selecting it, in file order"""
+    matched = dict()
+    for rule in rules:
+        for vm in filter_vms(vms, rule.get('vmid'), rule.get('node'),
+                             rule.get('name')):
+            matched.setdefault(vm['vmid'], (vm, list()))[1].append(rule)
+    return [matched[vmid] for vmid in sorted(matched, key=int)]
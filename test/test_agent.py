@@ -0,0 +1,39 @@
+from prox.libs import agent_lib
+
+INTERFACES = [
+    {"name": "lo", "ip-addresses": [{"ip-address": "127.0.0.1"}, {"ip-address": "::1"}]},
+    {"name": "eth0", "ip-addresses": [{"ip-address": "10.0.0.5"},
+                                      {"ip-address": "fe80::5054:ff:fe12:3456"},
+                                      {"ip-address": "2001:db8::5"}]}
+]
+
+
+def test_addresses_skip_loopback_and_link_local():
+    assert agent_lib.addresses(INTERFACES) == ["10.0.0.5", "2001:db8::5"]
+    assert agent_lib.addresses(None) == []
+
+
+def test_answers_are_cached_failures_included(tmp_path, monkeypatch):
+    path = str(tmp_path / "agent.json")
+    asked = list()
+
+    def agent_query(node, vm_id, command, timeout):
+        asked.append(vm_id)
+        if vm_id == 101:
+            raise agent_lib.proxmox_lib.ProxmoxError("No QEMU guest agent configured")
+        return INTERFACES
+    monkeypatch.setattr(agent_lib, "agent_query", agent_query)
+    vms = [{"vmid": 100, "node": "pve", "status": "running"},
+           {"vmid": 101, "node": "pve", "status": "running"},
+           {"vmid": 102, "node": "pve", "status": "stopped"}]
+    results = agent_lib.query_many(vms, "network-get-interfaces", path=path)
+    assert [(vm['vmid'], error) for vm, result, error in results] == [
+        (100, None), (101, "No QEMU guest agent configured"), (102, "not running")]
+    assert sorted(asked) == [100, 101]
+
+    again = agent_lib.query_many(vms, "network-get-interfaces", path=path)
+    assert again == results and sorted(asked) == [100, 101]
+    agent_lib.query_many(vms, "network-get-interfaces", path=path, refresh=True)
+    assert sorted(asked) == [100, 100, 101, 101]
+    agent_lib.query_many(vms, "network-get-interfaces", path=path, ttl=-1)
+    assert len(asked) == 6
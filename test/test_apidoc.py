@@ -0,0 +1,123 @@
+import json
+import pytest
+from prox.libs.proxmox import apidoc
+from prox.libs.proxmox import pyproxmox
+
+TREE = [{
+    "path": "/nodes", "text": "nodes", "info": {"GET": {"parameters": {}}},
+    "children": [{
+        "path": "/nodes/{node}", "text": "{node}",
+        "children": [{
+            "path": "/nodes/{node}/qemu/{vmid}/migrate", "text": "migrate",
+            "info": {"POST": {"parameters": {"properties": {
+                "node": {"type": "string"},
+                "vmid": {"type": "integer"},
+                "target": {"type": "string"},
+                "online": {"type": "boolean", "optional": 1},
+                "with-local-disks": {"type": "boolean", "optional": 1},
+                "bwlimit": {"type": "integer", "minimum": 0, "optional": 1}}}}}
+        }, {
+            "path": "/nodes/{node}/qemu/{vmid}/agent/network-get-interfaces",
+            "text": "network-get-interfaces",
+            "info": {"GET": {"parameters": {"properties": {}},
+                             "returns": {"type": "object", "properties": {
+                                 "result": {"type": "array"}}}}}
+        }, {
+            "path": "/nodes/{node}/tasks", "text": "tasks",
+            "info": {"GET": {
+                "parameters": {"properties": {
+                    "limit": {"type": "integer", "optional": 1},
+                    "source": {"type": "string", "enum": ["archive", "active", "all"],
+                               "optional": 1}}},
+                "returns": {"type": "array", "items": {"type": "object", "properties": {
+                    "starttime": {"type": "integer"}, "saved": {"type": "boolean"}}}}}}
+        }]
+    }]
+}]
+SCRIPT = "// generated\nconst apiSchema = " + json.dumps(TREE) + ";\nlet x = [1];\n"
+
+
+class Response(object):
+    status_code = 200
+    reason = "OK"
+
+    def __init__(self, content):
+        self.content = content
+
+    def raise_for_status(self):
+        pass
+
+
+class Http(object):
+
+    def __init__(self, version="8.2.4"):
+        self.calls = list()
+        self.version = version
+
+    def get(self, url, **kwargs):
+        self.calls.append(("get", url, None))
+        if url.endswith("apidoc.js"):
+            return Response(SCRIPT.encode("utf-8"))
+        if url.endswith("/version"):
+            return Response(json.dumps({"data": {"version": self.version}}).encode("utf-8"))
+        return Response(b'{"data": [{"starttime": "12", "saved": 1, "x": "y"}]}')
+
+    def post(self, url, data=None, **kwargs):
+        self.calls.append(("post", url, data))
+        return Response(b'{"data": "UPID:pve:1"}')
+
+
+def session(tmp_path, host="pve.local", version="8.2.4"):
+    prox = pyproxmox.pyproxmox(
+        pyproxmox.prox_auth(host, token="cli@pve!ops=abc-123"))
+    prox._http = Http(version)
+    prox._api = apidoc.Client(prox, str(tmp_path / "apidoc.json"))
+    return prox
+
+
+def fetches(prox):
+    return [i for i in prox._http.calls if i[1].endswith("apidoc.js")]
+
+
+def test_calls_are_checked_and_typed(tmp_path):
+    prox = session(tmp_path)
+    result = prox.api.nodes("pve").tasks.get(limit=5, source="all")
+    assert result['data'] == [{"starttime": 12, "saved": True, "x": "y"}]
+    assert prox._http.calls[-1][1].endswith("nodes/pve/tasks?limit=5&source=all")
+    prox.api.nodes("pve").qemu(100).migrate.post(target="pve2", online=True,
+                                                 with_local_disks=False)
+    assert prox._http.calls[-1][2] == {"target": "pve2", "online": 1,
+                                       "with-local-disks": 0}
+    prox.api.nodes("pve").qemu(100).agent.network_get_interfaces.get()
+    assert prox._http.calls[-1][1].endswith("qemu/100/agent/network-get-interfaces")
+    # the schema is cached, a second client needs no fetch
+    assert len(fetches(prox)) == 1
+    assert apidoc.Client(prox, str(tmp_path / "apidoc.json")).schema() is not None
+
+
+def test_bad_calls_raise_before_any_request(tmp_path):
+    prox = session(tmp_path)
+    migrate = prox.api.nodes("pve").qemu(100).migrate
+    for call in (lambda: migrate.post(online=1),
+                 lambda: migrate.post(target="pve2", bwlimit=-1),
+                 lambda: migrate.post(target="pve2", speed=1),
+                 lambda: migrate.get(),
+                 lambda: prox.api.nodes("pve").tasks.get(source="old"),
+                 lambda: prox.api.nodes("pve").openvz.get()):
+        with pytest.raises(apidoc.SchemaError):
+            call()
+    assert not [i for i in prox._http.calls if i[0] == "post"]
+
+
+def test_schema_cache_is_kept_per_host_and_version(tmp_path):
+    pattern = str(tmp_path / "apidoc.{}.json")
+    for host, version, fetched in (("pve.local", "8.2.4", 1),
+                                   ("pve.local", "8.2.4", 0),
+                                   ("pve.local", "8.3.0", 1),
+                                   ("fd00::1", "8.2.4", 1)):
+        prox = session(tmp_path, host, version)
+        assert apidoc.Client(prox, pattern).schema() is not None
+        assert len(fetches(prox)) == fetched
+    assert sorted(i.name for i in tmp_path.iterdir()) == [
+        "apidoc.fd00__1-8.2.4.json", "apidoc.pve.local-8.2.4.json",
+        "apidoc.pve.local-8.3.0.json"]
@@ -0,0 +1,100 @@
+import pickle
+import pytest
+import requests
+import stat
+from prox.libs import login_lib
+from prox.libs.proxmox import pyproxmox
+
+
+class FakeResponse(object):
+    status_code = 200
+    reason = "OK"
+    content = b'{"data": "UPID:pve:1"}'
+
+
+class FakeHttp(object):
+
+    def __init__(self):
+        self.calls = list()
+
+    def post(self, url, **kwargs):
+        self.calls.append((url, kwargs))
+        return FakeResponse()
+
+
+def test_token_auth_needs_no_ticket(monkeypatch):
+    def no_post(*args, **kwargs):
+        raise AssertionError("no login request expected")
+    monkeypatch.setattr(requests, "post", no_post)
+    auth = pyproxmox.prox_auth("pve.local", token="cli@pve!ops=abc-123")
+    assert auth.username == "cli@pve"
+    assert auth.ticket is None
+    assert auth.headers == {"Authorization": "PVEAPIToken=cli@pve!ops=abc-123"}
+
+
+def test_token_requests_skip_csrf():
+    prox = pyproxmox.pyproxmox(
+        pyproxmox.prox_auth("pve.local", token="cli@pve!ops=abc-123"))
+    http = FakeHttp()
+    prox._http = http
+    assert prox.connect("post", "nodes/pve/qemu/100/status/start", {}) == \
+        {"data": "UPID:pve:1"}
+    url, kwargs = http.calls[0]
+    assert "CSRFPreventionToken" not in kwargs['headers']
+    assert kwargs['cookies'] is None
+
+
+def test_session_sends_token_header():
+    prox = pyproxmox.pyproxmox(
+        pyproxmox.prox_auth("pve.local", token="cli@pve!ops=abc-123"))
+    assert prox.session().headers['Authorization'] == \
+        "PVEAPIToken=cli@pve!ops=abc-123"
+
+
+def test_dumped_session_holds_no_token():
+    prox = pyproxmox.pyproxmox(
+        pyproxmox.prox_auth("pve.local", token="cli@pve!ops=abc-123"))
+    dumped = pickle.dumps(prox)
+    assert b"abc-123" not in dumped
+    assert pickle.loads(dumped).headers == {}
+
+
+@pytest.mark.parametrize("token", ["cli@pve=abc", "cli!ops=abc", "cli@pve!ops"])
+def test_split_token_rejects_malformed(token):
+    with pytest.raises(ValueError):
+        pyproxmox.split_token(token)
+
+
+def test_expired_ticket_on_a_listing_gives_no_data(monkeypatch):
+    from prox.libs import login_lib
+    from prox.libs import node_lib
+
+    class Expired(object):
+        status_code = 401
+        reason = "No ticket"
+
+        def raise_for_status(self):
+            raise requests.exceptions.HTTPError("401 Client Error: No ticket")
+
+        def close(self):
+            pass
+
+    prox = pyproxmox.pyproxmox(
+        pyproxmox.prox_auth("pve.local", token="cli@pve!ops=abc-123"))
+    prox._http = FakeHttp()
+    prox._http.get = lambda url, **kwargs: Expired()
+    monkeypatch.setattr(login_lib, "_session", prox)
+    assert node_lib.list_vm_by_node("pve") == []
+    assert list(node_lib.iter_finish_task("pve")) == []
+
+
+
+def test_env_file_is_owner_only(tmp_path, monkeypatch):
+    monkeypatch.setattr(login_lib, "APP_HOME", str(tmp_path))
+    path = tmp_path / ".prox.env"
+    path.write_text("old")
+    path.chmod(0o644)
+    assert login_lib.create_env_file("cli@pve", None, "pve.local", 8006,
+                                     token="cli@pve!ops=abc-123")
+    assert stat.S_IMODE(path.stat().st_mode) == 0o600
+    assert path.read_text().startswith("OS_USERNAME=cli@pve\nOS_API_TOKEN=")
@@ -0,0 +1,45 @@
+from prox.libs import backup_lib
+
+G = 1 << 30
+
+
+def test_parse_schedule():
+    assert backup_lib.parse_schedule("mon..fri 02:30") == ([0, 1, 2, 3, 4], 150)
+    assert backup_lib.parse_schedule("sat..mon 1:00") == ([0, 5, 6], 60)
+    assert backup_lib.parse_schedule("21:00") == (list(range(7)), 1260)
+    assert backup_lib.parse_schedule("daily") == (list(range(7)), 0)
+    assert backup_lib.parse_schedule("*/2:00") is None
+    assert backup_lib.job_schedule({"starttime": "03:00", "dow": "sun"}) == ([6], 180)
+    assert backup_lib.format_schedule([0, 1, 2, 3, 4], 150) == "mon..fri 02:30"
+
+
+def test_estimate_uses_history_then_throughput():
+    guests = [{"vmid": 100, "node": "pve1", "maxdisk": 60 * G},
+              {"vmid": 101, "node": "pve1", "maxdisk": 120 * G},
+              {"vmid": 102, "node": "pve2", "maxdisk": 30 * G}]
+    tasks = [{"type": "vzdump", "id": "100", "status": "OK",
+              "starttime": 1000, "endtime": 1600}]
+    durations, rate = backup_lib.history(tasks, guests)
+    assert durations == {"100": 600}
+    busy = backup_lib.estimate({"all": 1, "exclude": "102"}, guests,
+                               durations, rate)
+    assert busy == {"pve1": 600 + 1200.0}
+
+
+def test_propose_moves_overlapping_job():
+    guests = [{"vmid": 100, "node": "pve1", "maxdisk": 60 * G},
+              {"vmid": 200, "node": "pve2", "maxdisk": 60 * G}]
+    jobs = [{"id": "a", "schedule": "daily 01:00", "storage": "pbs", "vmid": "100"},
+            {"id": "b", "schedule": "daily 01:00", "storage": "pbs", "vmid": "200"},
+            {"id": "c", "schedule": "sun 01:00", "storage": "nfs", "vmid": "200"},
+            {"id": "d", "schedule": "daily 01:00", "enabled": 0, "vmid": "100"}]
+    entries = backup_lib.plan(jobs, guests, [], rate=G / 60.0)
+    assert [i['minutes'] for i in entries] == [61, 61, 61]
+    found = backup_lib.conflicts(entries)
+    assert ("a", "2 jobs at once on storage pbs") in found
+    assert ("c", "2 jobs at once on node pve2") in found
+
+    starts = backup_lib.propose(entries, limit=1, window=(0, 6 * 60))
+    assert starts["a"] == 60
+    assert starts["b"] != 60 and starts["c"] != starts["b"]
+    assert backup_lib.conflicts(entries, 1, starts) == []
@@ -0,0 +1,56 @@
+import pytest
+from prox.libs import batch_lib
+
+
+class FakeCommand(object):
+    def __init__(self, options, args):
+        self.args = args
+
+    def is_mutation(self):
+        return "start" in self.args
+
+
+def load_command(name):
+    return FakeCommand
+
+
+def test_parse_lines_skips_comments_and_prox_prefix():
+    steps = batch_lib.parse_lines([
+        "# runbook",
+        "prox ls vm -N pve",
+        "",
+        "service -N 'pve' # trailing",
+    ])
+    assert [s['line'] for s in steps] == [2, 4]
+    assert steps[0]['argv'] == ["ls", "vm", "-N", "pve"]
+    assert steps[1]['argv'] == ["service", "-N", "pve"]
+
+
+def test_plan_keeps_mutations_in_order():
+    steps = batch_lib.parse_lines([
+        "ls vm", "ls storage", "service start", "ls vm", "node task",
+    ])
+    assert batch_lib.prepare(steps, load_command) == []
+    groups = batch_lib.plan(steps)
+    assert [[s['line'] for s in g] for g in groups] == [[1, 2], [3], [4, 5]]
+
+
+def test_nested_batch_is_rejected():
+    steps = batch_lib.parse_lines(["batch other.txt"])
+    failed = batch_lib.prepare(steps, load_command)
+    assert failed and failed[0]['error'] == "batch can not be nested"
+
+
+@pytest.mark.parametrize("argv, mutation", [
+    (["ls", "vm"], False),
+    (["tasks", "ls"], False),
+    (["tasks", "sync"], True),
+    (["completion", "refresh"], True),
+    (["events", "--once"], True),
+    (["storage", "forecast", "--save", "history.json"], True),
+    (["vm", "apply", "-f", "desired.yaml", "--dry-run"], False),
+])
+def test_commands_are_mutations_unless_read_only(argv, mutation):
+    from prox import cli
+    command = cli.load_command(argv[0])({}, argv[1:])
+    assert command.is_mutation() == mutation
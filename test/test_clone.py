@@ -0,0 +1,47 @@
+import pytest
+from prox.libs import clone_lib
+
+TEMPLATE = {"vmid": 9000, "name": "tmpl", "node": "pve1", "template": 1}
+
+
+def test_ids_skip_used_vmids():
+    assert clone_lib.allocate_ids(100, 4, [101, 103, "104"]) == [100, 102, 105, 106]
+
+
+def test_plan_names_nodes_and_overrides():
+    clones = clone_lib.plan(TEMPLATE, 3, [200, 201, 202], "web-{n:02d}",
+                            ["pve1", "pve2"],
+                            ["ipconfig0=ip=10.0.0.{n}/24,gw=10.0.0.1",
+                             "sshkeys=ssh-ed25519 AAAA ops@{template}"])
+    assert [(i['vmid'], i['name'], i['node']) for i in clones] == [
+        (200, "web-01", "pve1"), (201, "web-02", "pve2"), (202, "web-03", "pve1")]
+    assert clones[2]['config']['ipconfig0'] == "ip=10.0.0.3/24,gw=10.0.0.1"
+    assert clones[0]['config']['sshkeys'] == "ssh-ed25519%20AAAA%20ops%40tmpl"
+    # without targets every clone stays on the template's node
+    assert [i['node'] for i in clone_lib.plan(TEMPLATE, 2, [1, 2])] == ["pve1", "pve1"]
+    assert clone_lib.plan(TEMPLATE, 1, [5])[0]['name'] == "tmpl-1"
+
+
+def test_bad_patterns_and_settings():
+    with pytest.raises(ValueError):
+        clone_lib.plan(TEMPLATE, 1, [1], "web-{id}")
+    with pytest.raises(ValueError):
+        clone_lib.plan(TEMPLATE, 1, [1], sets=["no-equals-sign"])
+
+
+def test_storages_are_limiter_keys():
+    config = {"scsi0": "ceph:base-9000-disk-0,size=10G",
+              "ide2": "ceph:vm-9000-cloudinit,media=cdrom",
+              "efidisk0": "local-lvm:base-9000-disk-1"}
+    assert clone_lib.storages(config) == ["ceph", "local-lvm"]
+    assert clone_lib.storages(config, "nvme") == ["ceph", "local-lvm", "nvme"]
+
+
+def test_container_templates_are_refused():
+    vms = [{"vmid": 9000, "type": "qemu", "template": 1},
+           {"vmid": 9001, "type": "lxc", "template": 1}]
+    assert clone_lib.find_template(vms, "9000")['vmid'] == 9000
+    with pytest.raises(ValueError, match="container"):
+        clone_lib.find_template(vms, 9001)
+    with pytest.raises(ValueError, match="not found"):
+        clone_lib.find_template(vms, 9002)
@@ -0,0 +1,63 @@
+import time
+from prox.libs import completion_lib
+
+
+def index(tmp_path, vms=None):
+    completion_lib.write({
+        "nodes": [("pve1", "online"), ("pve2", "online"), ("backup", "offline")],
+        "vms": vms or [("100", "web (qemu, pve1)"), ("101", "db (qemu, pve2)"),
+                       ("200", "ct (lxc, pve1)")],
+        "storages": [("local-lvm", "pve1, pve2")]
+    }, str(tmp_path))
+    return str(tmp_path)
+
+
+def test_complete_commands_and_nodes(tmp_path):
+    path = index(tmp_path)
+    assert completion_lib.complete("bash", ["re"], ["rebalance", "ls"], path) == ["rebalance"]
+    assert completion_lib.complete("bash", ["vm", "-N", "pv"], path=path) == ["pve1", "pve2"]
+    # bash splits --node=pv into three words, zsh and fish keep one
+    assert completion_lib.complete("bash", ["vm", "--node", "=", "pv"], path=path) == ["pve1", "pve2"]
+    assert completion_lib.complete("zsh", ["vm", "--node=b"], path=path) == ["--node=backup:offline"]
+    assert completion_lib.complete("fish", ["storage", "-S", ""], path=path) == \
+        ["local-lvm\tpve1, pve2"]
+    # unknown option or a command where -i is not a vmid
+    assert completion_lib.complete("bash", ["vm", "-x", ""], path=path) == []
+    assert completion_lib.complete("bash", ["ls", "-i", ""], path=path) == []
+
+
+def test_complete_vmid_lists(tmp_path):
+    path = index(tmp_path)
+    assert completion_lib.complete("bash", ["vm", "-i", "10"], path=path) == ["100", "101"]
+    assert completion_lib.complete("bash", ["rebalance", "--pin", "100,2"], path=path) == ["100,200"]
+
+
+def test_complete_is_fast_on_a_large_index(tmp_path):
+    vms = [(str(100 + i), "guest-{} (qemu, pve1)".format(i)) for i in range(20000)]
+    path = index(tmp_path, vms)
+    timings = list()
+    for i in range(3):
+        start = time.time()
+        found = completion_lib.complete("bash", ["vm", "-i", "1999"], path=path)
+        timings.append(time.time() - start)
+    assert min(timings) < 0.05
+    assert "1999" in found and "19990" in found
+
+
+def test_shell_script_completes_fast_end_to_end(tmp_path):
+    import os
+    import shlex
+    import subprocess
+    vms = [(str(100 + i), "guest-{} (qemu, pve1)".format(i)) for i in range(20000)]
+    index(tmp_path / ".prox.index", vms)
+    env = dict(os.environ, HOME=str(tmp_path))
+    command = shlex.split(completion_lib.launcher()) + ["bash", "vm", "-i", "1999"]
+    timings = list()
+    for i in range(5):
+        start = time.time()
+        found = subprocess.run(command, env=env, stdout=subprocess.PIPE,
+                               check=True).stdout.decode().split()
+        timings.append(time.time() - start)
+    # the median, a whole completion as the shell runs it
+    assert sorted(timings)[2] < 0.05
+    assert "1999" in found and "19990" in found
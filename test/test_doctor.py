@@ -0,0 +1,68 @@
+import threading
+import time
+from prox.libs import doctor_lib
+
+G = 1 << 30
+
+
+class FakeProx(object):
+
+    def __init__(self, hang=None):
+        self.hang = hang
+
+    def getNodeServiceList(self, node):
+        return {"data": [{"service": "pveproxy", "state": "running"},
+                         {"service": "pve-ha-lrm", "state": "dead"},
+                         {"service": "postfix", "state": "dead"}]}
+
+    def getNodeStorage(self, node):
+        return {"data": [{"storage": "local", "active": 1, "enabled": 1,
+                          "total": 10 * G, "used": 5 * G},
+                         {"storage": "nfs", "active": 0, "enabled": 1}]}
+
+    def getNodeStatus(self, node):
+        if node == self.hang:
+            self.hang_event.wait(5)
+        return {"data": {"memory": {"used": 9 * G, "total": 10 * G},
+                         "cpuinfo": {"cpus": 4}, "loadavg": ["0.5", "0.4", "0.3"]}}
+
+    def getNodeFinishedTasks(self, node):
+        return {"data": [{"type": "vzdump", "id": "100", "status": "error",
+                          "endtime": time.time()},
+                         {"type": "vzdump", "id": "101", "status": "OK",
+                          "endtime": time.time()}]}
+
+    def getNodeNetworks(self, node):
+        return {"data": [{"iface": "vmbr0", "active": 1, "autostart": 1}]}
+
+
+def test_checks_judge_rows():
+    prox = FakeProx()
+    services = doctor_lib.check_services("pve", prox.getNodeServiceList("pve")['data'])
+    assert services[0]['level'] == doctor_lib.WARN
+    assert services[0]['detail'] == "pve-ha-lrm dead"
+    storage = doctor_lib.check_storage("pve", prox.getNodeStorage("pve")['data'])
+    assert [(i['level'], i['detail']) for i in storage] == [("fail", "nfs inactive")]
+    status = doctor_lib.check_status("pve", prox.getNodeStatus("pve")['data'])
+    assert [i['level'] for i in status] == [doctor_lib.WARN]
+
+
+def test_sweep_reports_hung_and_offline_nodes(monkeypatch):
+    prox = FakeProx(hang="pve2")
+    prox.hang_event = threading.Event()
+    monkeypatch.setattr(doctor_lib, "get_auth", lambda: prox)
+    nodes = [{"node": "pve1", "status": "online"},
+             {"node": "pve2", "status": "online"},
+             {"node": "pve3", "status": "offline"}]
+    start = time.time()
+    results = doctor_lib.sweep(nodes, timeout=0.3, since=0)
+    prox.hang_event.set()
+    assert time.time() - start < 2
+    levels = dict(((i['node'], i['check']), i['level']) for i in results)
+    assert levels[("pve2", "status")] == doctor_lib.FAIL
+    assert levels[("pve3", "node")] == doctor_lib.FAIL
+    assert levels[("pve1", "tasks")] == doctor_lib.WARN
+    assert levels[("pve1", "interfaces")] == doctor_lib.PASS
+    counts, level = doctor_lib.summary(results)
+    assert level == doctor_lib.FAIL
+    assert sum(counts.values()) == 11
@@ -0,0 +1,31 @@
+from prox.libs import events_lib
+
+
+def task(upid, endtime, status="OK", type="qmstart"):
+    return {"upid": upid, "node": "pve", "type": type, "starttime": 1,
+            "endtime": endtime, "status": status}
+
+
+def test_task_events_resume_from_cursor():
+    cursor = events_lib.new_cursor()
+    first = events_lib.task_events([task("U1", 10), task("U2", 10)], cursor)
+    assert len(first) == 2
+    assert cursor['task_time'] == 10
+
+    tasks = [task("U1", 10), task("U2", 10), task("U3", 10, "error"),
+             task("U4", 12, type="qmigrate")]
+    events = events_lib.task_events(tasks, cursor)
+    assert [e['event'] for e in events] == ["task.failed", "migration.done"]
+    assert events_lib.task_events(tasks, cursor) == []
+
+
+def test_resource_events_after_baseline():
+    cursor = events_lib.new_cursor()
+    vm = {"type": "qemu", "vmid": 100, "node": "pve1", "status": "running"}
+    assert events_lib.resource_events([vm], cursor) == []
+    assert events_lib.resource_events([vm], cursor) == []
+
+    moved = dict(vm, node="pve2", status="stopped")
+    events = events_lib.resource_events([moved], cursor)
+    assert [e['event'] for e in events] == ["guest.moved", "guest.stopped"]
+    assert events[0]['source'] == "pve1"
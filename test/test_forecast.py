@@ -0,0 +1,39 @@
+from prox.libs import forecast_lib
+
+G = 1 << 30
+DAY = 86400
+
+
+def history(storage, used, total=100 * G):
+    return {"node": "pve", "storage": storage,
+            "data": [{"time": day * DAY, "used": value, "total": total}
+                     for day, value in enumerate(used)]}
+
+
+def test_forecast_projects_days_per_level():
+    histories = [
+        history("growing", [50 * G, 51 * G, 52 * G, 53 * G, 54 * G]),
+        history("flat", [10 * G] * 5),
+        history("full", [95 * G, 95 * G]),
+        {"node": "pve", "storage": "empty", "data": []},
+    ]
+    results = dict((i['storage'], i) for i in forecast_lib.forecast(histories))
+    growing = results['growing']
+    assert round(growing['growth'] / G, 6) == 1
+    assert round(growing['days'][0.8], 6) == 26
+    assert round(growing['days'][1.0], 6) == 46
+    assert results['flat']['days'] == {0.8: None, 0.9: None, 1.0: None}
+    assert results['full']['days'][0.9] == 0
+    assert results['empty']['usage'] is None
+
+    ordered = sorted(results.values(), key=forecast_lib.urgency)
+    # a storage past 90% comes before one still 36 days away from it
+    assert [i['storage'] for i in ordered] == ["full", "growing", "flat", "empty"]
+
+
+def test_forecast_skips_missing_samples_and_uses_newest_size():
+    data = history("thin", [10 * G, None, 12 * G], total=50 * G)
+    data['data'][2]['total'] = 100 * G
+    result = forecast_lib.forecast([data])[0]
+    assert round(result['growth'] / G, 6) == 1
+    assert result['usage'] == 0.12
@@ -0,0 +1,108 @@
+import json
+import pytest
+import requests
+import urllib3.exceptions
+from prox.libs.proxmox import apidoc
+from prox.libs.proxmox import gateway
+from prox.libs.proxmox import pyproxmox
+
+
+class Response(object):
+    status_code = 200
+    reason = "OK"
+
+    def __init__(self, content):
+        self.content = content
+
+    def raise_for_status(self):
+        pass
+
+
+def refused(url):
+    return requests.exceptions.ConnectionError(urllib3.exceptions.MaxRetryError(
+        None, url, urllib3.exceptions.NewConnectionError(None, "refused")))
+
+
+class Cluster(object):
+    """Answers for the hosts that are up, refuses the others"""
+
+    def __init__(self, up):
+        self.up = set(up)
+        self.calls = list()
+
+    def request(self, url, dropped=False):
+        host = url.split("/")[2].split(":")[0]
+        self.calls.append(host)
+        if host not in self.up:
+            raise refused(url)
+        if dropped:
+            raise requests.exceptions.ConnectionError(
+                urllib3.exceptions.ProtocolError("Connection aborted."))
+        if url.endswith("apidoc.js"):
+            return Response(b"const apiSchema = [{\"path\": \"/version\"}];")
+        if "cluster/status" in url:
+            return Response(json.dumps({"data": [
+                {"type": "cluster", "name": "c"},
+                {"type": "node", "name": "pve1", "ip": "10.0.0.1", "online": 1},
+                {"type": "node", "name": "pve2", "ip": "10.0.0.2", "online": 1},
+                {"type": "node", "name": "pve3", "ip": "10.0.0.3", "online": 0}
+            ]}).encode())
+        return Response(json.dumps({"data": host}).encode())
+
+    def get(self, url, **kwargs):
+        return self.request(url)
+
+    def post(self, url, **kwargs):
+        return self.request(url, dropped=kwargs.get('data') == "dropped")
+
+
+@pytest.fixture
+def prox(tmp_path, monkeypatch):
+    monkeypatch.setattr(gateway, "CACHE_FILE", str(tmp_path / "gateways.json"))
+    rtt = {"10.0.0.1": 0.030, "10.0.0.2": 0.002}
+    monkeypatch.setattr(gateway, "probe", lambda host: rtt.get(host))
+    prox = pyproxmox.pyproxmox(
+        pyproxmox.prox_auth("pve.example.org", token="cli@pve!ops=abc-123"))
+    prox._http = Cluster(["pve.example.org", "10.0.0.1", "10.0.0.2"])
+    return prox
+
+
+def test_discover_uses_the_fastest_member(prox):
+    assert prox.discover() == "10.0.0.2"
+    assert prox.gateways().hosts == ["10.0.0.2", "10.0.0.1", "pve.example.org"]
+    assert prox.connect("get", "nodes/pve1/status", None)['data'] == "10.0.0.2"
+
+    # a new session of the same login starts from the cache
+    again = pyproxmox.pyproxmox(
+        pyproxmox.prox_auth("pve.example.org", token="cli@pve!ops=abc-123"))
+    assert again.host() == "10.0.0.2"
+    assert not again.gateways().stale()
+
+
+def test_failover_on_connection_errors(prox):
+    prox.discover()
+    prox._http.up.discard("10.0.0.2")
+    assert prox.connect("get", "nodes/pve1/qemu", None)['data'] == "10.0.0.1"
+    # writes that never left are sent again
+    prox._http.up.discard("10.0.0.1")
+    assert prox.connect("post", "nodes/pve1/qemu", {})['data'] == "pve.example.org"
+    # the member that failed first is skipped while it counts as down
+    assert prox._http.calls[-2:] == ["10.0.0.1", "pve.example.org"]
+    prox._http.up.discard("pve.example.org")
+    with pytest.raises(requests.exceptions.ConnectionError):
+        prox.connect("get", "nodes/pve1/lxc", None)
+
+
+def test_writes_that_may_have_run_are_not_sent_again(prox):
+    prox.discover()
+    with pytest.raises(requests.exceptions.ConnectionError):
+        prox.connect("post", "nodes/pve1/qemu", "dropped")
+    assert prox._http.calls == ["pve.example.org", "10.0.0.2"]
+
+
+def test_schema_fetch_fails_over(prox, tmp_path):
+    prox.discover()
+    prox._http.up.discard("10.0.0.2")
+    client = apidoc.Client(prox, str(tmp_path / "apidoc.json"))
+    assert client.schema().endpoints == {"/version": {}}
+    assert prox._http.calls[-2:] == ["10.0.0.2", "10.0.0.1"]
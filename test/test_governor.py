@@ -0,0 +1,90 @@
+import threading
+import time
+from prox.libs.proxmox import gateway
+from prox.libs.proxmox import governor
+from prox.libs.proxmox import pyproxmox
+
+
+def test_limits_grow_and_halve():
+    budget = governor.Budget(4, 8)
+    for i in range(40):
+        budget.done(0.01, False)
+    assert budget.limit == 8
+    budget.done(0.01, True)
+    assert budget.limit == 4
+    # requests in flight during the cut do not cut again
+    budget.done(0.01, True)
+    assert budget.limit == 4 and budget.cuts == 1
+    budget.last_cut = 0
+    budget.done(1.0, False)
+    assert budget.limit == 2
+    assert budget.errors == 2 and budget.requests == 43
+
+
+def test_reads_and_writes_have_separate_budgets():
+    gov = governor.Governor(reads=2, writes=1, max_reads=4, max_writes=2)
+    reads = [gov.acquire("nodes/pve/qemu"), gov.acquire("nodes/pve/lxc")]
+    write = gov.acquire("nodes/pve/qemu/100/status/start", True)
+    other = gov.acquire("nodes/pve2/qemu")
+    blocked = list()
+
+    def third_read():
+        gov.acquire("nodes/pve/storage")
+        blocked.append(time.time())
+    thread = threading.Thread(target=third_read)
+    thread.start()
+    time.sleep(0.05)
+    assert not blocked
+    gov.release(reads[0])
+    thread.join(1)
+    assert blocked
+    rows = gov.report()
+    assert [(i['node'], i['kind'], i['peak']) for i in rows] == [
+        ("pve", "read", 2), ("pve", "write", 1), ("pve2", "read", 1)]
+    for slot in (reads[1], write, other):
+        gov.release(slot)
+
+
+def test_configure_caps_limits():
+    gov = governor.Governor()
+    gov.release(gov.acquire("cluster/resources"))
+    gov.configure(max_reads=2, max_writes=1)
+    assert gov.report()[0]['limit'] <= 2
+    assert gov.start[True] == 1
+
+
+def test_release_without_learning():
+    gov = governor.Governor(reads=2)
+    gov.release(gov.acquire("nodes/pve/qemu/100/agent/get-osinfo"), None)
+    row = gov.report()[0]
+    assert row['requests'] == 0 and row['limit'] == 2
+
+
+class Response(object):
+    reason = "Error"
+
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.content = b'{"data": null}'
+
+
+class Http(object):
+    """Answers each GET with the status at the end of its path"""
+
+    def get(self, url, **kwargs):
+        return Response(int(url.rsplit("/", 1)[1]))
+
+
+def test_only_overload_statuses_halve_the_budget(tmp_path, monkeypatch):
+    gov = governor.Governor(reads=4)
+    monkeypatch.setattr(pyproxmox, "GOVERNOR", gov)
+    monkeypatch.setattr(gateway, "CACHE_FILE", str(tmp_path / "gateways.json"))
+    prox = pyproxmox.pyproxmox(
+        pyproxmox.prox_auth("pve.local", token="cli@pve!ops=abc-123"))
+    prox._http = Http()
+    prox.connect("get", "nodes/pve/qemu/100/agent/500", None)
+    row = gov.report()[0]
+    assert row['limit'] == 4 and row['errors'] == 0
+    prox.connect("get", "nodes/pve/qemu/503", None)
+    row = gov.report()[0]
+    assert row['limit'] == 2 and row['errors'] == 1
@@ -0,0 +1,38 @@
+import pytest
+from prox.libs import hotspots_lib
+
+
+def test_parse_window_and_timeframe():
+    assert hotspots_lib.parse_window("1h") == 3600
+    assert hotspots_lib.parse_window("30m") == 1800
+    assert hotspots_lib.timeframe(3600) == "hour"
+    assert hotspots_lib.timeframe(2 * 86400) == "week"
+    with pytest.raises(ValueError):
+        hotspots_lib.parse_window("soon")
+
+
+def test_rank_names_the_guest_behind_peaks():
+    noisy = [0, 0, 0, 0, 0, 0, 0, 0, 3, 3]
+    steady = [1] * 10
+    node_rows = [{"time": t, "cpu": (noisy[t] + steady[t] + 0.5) / 8.0,
+                  "maxcpu": 8, "netin": 10, "netout": 0} for t in range(10)]
+    guests = [{"vmid": 100, "name": "steady", "type": "qemu"},
+              {"vmid": 101, "name": "noisy", "type": "lxc"}]
+    guest_rows = [
+        [{"time": t, "cpu": steady[t] / 2.0, "maxcpu": 2,
+          "diskread": 100, "diskwrite": 0} for t in range(10)],
+        # a sample outside the node axis is dropped
+        [{"time": t, "cpu": noisy[t] / 4.0, "maxcpu": 4,
+          "diskread": 300 * noisy[t], "diskwrite": 0} for t in range(10)]
+        + [{"time": 99, "cpu": 1.0, "maxcpu": 4}],
+    ]
+    ranking = hotspots_lib.rank(node_rows, guests, guest_rows, top=5)
+    cpu = ranking['cpu']
+    assert [i['name'] for i in cpu] == ["noisy", "steady"]
+    assert round(cpu[0]['peak'], 3) == round(6 / 9.0, 3)
+    assert cpu[0]['corr'] > 0.9 and cpu[1]['corr'] == 0
+    # the node has no disk series, its total is the guests' sum
+    disk = ranking['disk']
+    assert disk[0]['name'] == "noisy"
+    assert round(disk[0]['share'] + disk[1]['share'], 6) == 1
+    assert ranking['net'] == []
@@ -0,0 +1,35 @@
+import json
+import pytest
+from prox.libs.proxmox import jsonstream
+
+
+def chunked(text, size):
+    data = text.encode("utf-8")
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def test_iter_array_survives_every_chunk_boundary():
+    body = json.dumps({"data": [{"vmid": 100, "name": "wéb", "mem": 123456789},
+                                12345, -1.5e3, None, [1, [2]], "x"]})
+    for size in range(1, 12):
+        rows = list(jsonstream.iter_array(chunked(body, size)))
+        assert rows == json.loads(body)['data']
+
+
+def test_iter_array_skips_other_keys():
+    body = '{"errors": {"a": [1, 2]}, "total": 3, "data": [{"n": 1}]}'
+    assert list(jsonstream.iter_array(chunked(body, 4))) == [{"n": 1}]
+
+
+def test_iter_array_missing_or_null_data():
+    assert list(jsonstream.iter_array([b'{"data": null}'])) == []
+    assert list(jsonstream.iter_array([b'{"other": 1}'])) == []
+
+
+def test_iter_array_truncated_body():
+    with pytest.raises(ValueError):
+        list(jsonstream.iter_array([b'{"data": [{"n": 1}, {"n"']))
+
+
+def test_loads_accepts_bytes():
+    assert jsonstream.loads(b'{"data": [1]}') == {"data": [1]}
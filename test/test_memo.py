@@ -0,0 +1,78 @@
+import threading
+import time
+from prox.libs.proxmox import pyproxmox
+
+
+class Response(object):
+    status_code = 200
+    reason = "OK"
+
+    def __init__(self, content, status_code=200):
+        self.content = content
+        self.status_code = status_code
+
+
+class SlowHttp(object):
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.gets = list()
+        self.lock = threading.Lock()
+
+    def get(self, url, **kwargs):
+        with self.lock:
+            self.gets.append(url)
+        time.sleep(self.delay)
+        return Response(b'{"data": [{"node": "pve"}]}')
+
+    def post(self, url, **kwargs):
+        return Response(b'{"data": "UPID:pve:1"}')
+
+
+def session():
+    prox = pyproxmox.pyproxmox(
+        pyproxmox.prox_auth("pve.local", token="cli@pve!ops=abc-123"))
+    prox._http = SlowHttp()
+    return prox
+
+
+def test_concurrent_gets_share_one_request():
+    prox = session()
+    results = list()
+    threads = [threading.Thread(target=lambda: results.append(prox.getClusterStatus()))
+               for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(prox._http.gets) == 1
+    assert results == [{"data": [{"node": "pve"}]}] * 8
+    # every caller decodes its own copy
+    results[0]['data'] = None
+    assert prox.getClusterStatus() == {"data": [{"node": "pve"}]}
+    assert prox.memo().made == 1
+    assert prox.memo().saved == 8
+
+
+def test_writes_and_task_polls_reach_the_api():
+    prox = session()
+    prox.getNodeStatus("pve")
+    prox.getNodeTaskStatusByUPID("pve", "UPID:pve:1")
+    prox.getNodeTaskStatusByUPID("pve", "UPID:pve:1")
+    assert len(prox._http.gets) == 3
+    prox.connect("post", "nodes/pve/qemu/100/status/start", {})
+    prox.getNodeStatus("pve")
+    assert len(prox._http.gets) == 4
+
+
+def test_failures_are_not_memoized():
+    prox = session()
+    calls = list()
+
+    def failing(url, **kwargs):
+        calls.append(url)
+        return Response(b'{"data": null}', 500)
+    prox._http.get = failing
+    assert prox.getNodeStatus("pve")['status'] == 500
+    prox.getNodeStatus("pve")
+    assert len(calls) == 2
@@ -0,0 +1,58 @@
+from prox.libs import migration_lib
+
+G = 1 << 30
+
+
+def node(name, mem, maxmem=64 * G, status="online"):
+    return {"node": name, "status": status, "mem": mem, "maxmem": maxmem,
+            "maxcpu": 16, "cpu": 0.1}
+
+
+def vm(vmid, maxmem, status="running"):
+    return {"vmid": vmid, "node": "pve1", "status": status,
+            "maxmem": maxmem, "maxcpu": 2, "cpu": 0.5}
+
+
+def test_plan_spreads_by_free_memory():
+    nodes = [node("pve1", 40 * G), node("pve2", 10 * G), node("pve3", 30 * G)]
+    moves, unplaced = migration_lib.plan_evacuation(
+        [vm(100, 8 * G), vm(101, 16 * G), vm(102, 8 * G)], nodes, "pve1")
+    assert unplaced == []
+    assert dict((v['vmid'], t) for v, t in moves) == {
+        101: "pve2", 100: "pve2", 102: "pve3"}
+
+
+def test_plan_respects_reserve_and_offline_nodes():
+    nodes = [node("pve1", 0), node("pve2", 60 * G),
+             node("pve3", 0, status="offline")]
+    moves, unplaced = migration_lib.plan_evacuation(
+        [vm(100, 8 * G), vm(101, 8 * G, "stopped")], nodes, "pve1")
+    assert [v['vmid'] for v in unplaced] == [100]
+    assert [(v['vmid'], t) for v, t in moves] == [(101, "pve2")]
+
+
+def test_downtime_is_read_from_task_log():
+    log = ["migration active", "average migration speed: 1 GiB/s - downtime 61 ms",
+           "migration finished successfully"]
+    assert migration_lib.downtime(log) == 61
+    assert migration_lib.downtime(["no numbers"]) is None
+
+
+def test_containers_move_with_a_restart(monkeypatch):
+    calls = list()
+
+    class Prox(object):
+        def migrateLXCContainer(self, *args):
+            calls.append(("lxc",) + args)
+            return {"data": "UPID:pve1:1"}
+
+        def migrateVirtualMachine(self, *args):
+            calls.append(("qemu",) + args)
+            return {"data": "UPID:pve1:2"}
+
+    monkeypatch.setattr(migration_lib, "get_auth", lambda: Prox())
+    monkeypatch.setattr(migration_lib.task_lib, "wait_task", lambda *args: None)
+    container = dict(vm(200, 2 * G), type="lxc")
+    done = migration_lib.migrate_and_wait(container, "pve2", 1024)
+    assert calls == [("lxc", "pve1", 200, "pve2", True, 1024)]
+    assert done['upid'] == "UPID:pve1:1" and done['downtime'] is None
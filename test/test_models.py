@@ -0,0 +1,21 @@
+from prox.libs import models
+
+
+def test_record_from_api_fills_missing_fields_and_aliases():
+    guest = models.Guest.from_api({"vmid": 100, "name": "web", "maxcpu": 4})
+    assert guest.vmid == 100
+    assert guest.cpus == 4
+    assert guest.status is None
+    assert guest.get("status", "unknown") == "unknown"
+    assert not hasattr(guest, "__dict__")
+
+
+def test_task_target_names_node_tasks_master():
+    tasks = models.Task.from_rows([{"id": ""}, {"id": "100"}])
+    assert [t.target for t in tasks] == ["master", "100"]
+
+
+def test_table_renders_records_without_dicts():
+    rows = models.Storage.from_rows([{"storage": "local", "total": 10}])
+    out = models.table(rows, [("storage", "Name"), ("total", "Total")])
+    assert "local" in out and "Name" in out
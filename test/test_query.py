@@ -0,0 +1,72 @@
+import pytest
+from prox.libs import models
+from prox.libs import query_lib
+
+G = 1 << 30
+
+
+def guests():
+    return models.Guest.from_rows([
+        {"vmid": 100, "name": "web1", "status": "running", "mem": 9 * G, "cpu": 0.5},
+        {"vmid": 101, "name": "web2", "status": "running", "mem": 2 * G, "cpu": 0.9},
+        {"vmid": 102, "name": "db1", "status": "running", "mem": 12 * G, "cpu": 0.7},
+        {"vmid": 103, "name": "web3", "status": "stopped", "mem": 0},
+        {"vmid": 104, "name": "web4", "status": "running", "mem": 16 * G},
+    ])
+
+
+def vmids(records):
+    return [r.vmid for r in records]
+
+
+def test_parse_number_units():
+    assert query_lib.parse_number("8G") == 8 * G
+    assert query_lib.parse_number("1.5KiB") == 1536
+    assert query_lib.parse_number("50%") == 0.5
+    assert query_lib.parse_number("web") is None
+
+
+def test_where_combines_comparisons():
+    test = query_lib.compile_where(
+        "status==running and mem>8G and name~web*")
+    assert vmids(filter(test, guests())) == [100, 104]
+
+
+def test_where_not_or_and_parentheses():
+    test = query_lib.compile_where("not (name~web* or status=stopped)")
+    assert vmids(filter(test, guests())) == [102]
+
+
+def test_sort_top_uses_missing_values_last():
+    records = query_lib.apply(guests(), sort="-cpu", top=3)
+    assert vmids(records) == [101, 102, 100]
+
+
+def test_sort_multiple_keys():
+    records = query_lib.apply(guests(), where="status==running",
+                              sort="status,-mem")
+    assert vmids(records) == [104, 102, 100, 101]
+
+
+def test_unknown_field_and_bad_syntax():
+    known = query_lib.fields(models.Guest)
+    with pytest.raises(query_lib.QueryError):
+        query_lib.compile_where("color==red", known)
+    with pytest.raises(query_lib.QueryError):
+        query_lib.compile_where("(mem>1G", known)
+    with pytest.raises(query_lib.QueryError):
+        query_lib.apply(guests(), top="many")
+
+
+def test_split_where_keeps_late_fields_apart():
+    test, later = query_lib.split_where(
+        "status==running and (ip~10.* or ip~192.*) and mem>8G", ("ip",))
+    assert vmids(filter(test, guests())) == [100, 102, 104]
+    records = guests()
+    records[0].ip, records[2].ip = "10.0.0.5", "172.16.0.2"
+    assert vmids(filter(later, records)) == [100]
+
+    test, later = query_lib.split_where("name~web* or ip~10.*", ("ip",))
+    assert test is None and later is not None
+    test, later = query_lib.split_where("name~web*", ("ip",))
+    assert later is None
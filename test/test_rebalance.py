@@ -0,0 +1,68 @@
+from prox.libs import rebalance_lib
+
+G = 1 << 30
+
+
+def cluster(guests, count=3, **kwargs):
+    nodes = [{"node": "pve%d" % i, "status": "online", "maxcpu": 8,
+              "maxmem": 64 * G, "cpu": 0, "mem": 0} for i in range(1, count + 1)]
+    by_name = dict((i['node'], i) for i in nodes)
+    for guest in guests:
+        guest.setdefault("type", "qemu")
+        guest.setdefault("status", "running")
+        node = by_name[guest['node']]
+        node['mem'] += guest['mem']
+        node['cpu'] += guest['cpu'] * guest['maxcpu'] / 8.0
+    return rebalance_lib.Cluster(nodes, guests, **kwargs)
+
+
+def guest(vmid, node, mem, cores=1, **extra):
+    row = {"vmid": vmid, "node": node, "mem": mem * G, "cpu": cores / 4.0,
+           "maxcpu": 4}
+    row.update(extra)
+    return row
+
+
+def test_plan_evens_out_with_few_moves():
+    c = cluster([guest(100, "pve1", 16), guest(101, "pve1", 16),
+                 guest(102, "pve1", 8), guest(103, "pve2", 8)])
+    moves = rebalance_lib.plan(c, 0.2)
+    assert [(m[0]["vmid"], m[1], m[2]) for m in moves] == [
+        (100, "pve1", "pve3"), (102, "pve1", "pve2")]
+    cpu, mem = c.spreads()
+    assert mem <= 0.2 and cpu <= 0.2
+
+
+def test_plan_keeps_pins_and_anti_affinity():
+    c = cluster([guest(100, "pve1", 16, tags="pin"), guest(101, "pve1", 16),
+                 guest(102, "pve1", 8, tags="aa-db"), guest(103, "pve3", 8, tags="aa-db"),
+                 guest(104, "pve1", 8, type="lxc")], pinned=[101])
+    moves = rebalance_lib.plan(c, 0.05)
+    assert [(m[0]['vmid'], m[2]) for m in moves] == [(102, "pve2")]
+
+
+def test_plan_brings_down_nodes_tied_at_the_top():
+    # four equally loaded nodes, moving off one leaves the max - min as it is
+    guests = [guest(100 + i, "pve%d" % (1 + i % 4), 4) for i in range(24)]
+    c = cluster(guests, count=12)
+    moves = rebalance_lib.plan(c, 0.1)
+    cpu, mem = c.spreads()
+    assert mem <= 0.1 and cpu <= 0.1
+    # two VMs on each node, the least moves that get there
+    assert len(moves) == 16
+    assert set(m[1] for m in moves) == set(["pve1", "pve2", "pve3", "pve4"])
+
+
+def test_moves_into_freed_memory_wait_for_it():
+    # pve1 is over its reserve, 103 fits there only once 100 is gone
+    c = cluster([guest(100, "pve1", 32, cores=1), guest(101, "pve1", 32, cores=0),
+                 guest(102, "pve2", 24, cores=4), guest(103, "pve2", 8, cores=3)])
+    moves = rebalance_lib.plan(c, 0.1)
+    assert [(m[0]['vmid'], m[1], m[2], m[3]) for m in moves] == [
+        (100, "pve1", "pve3", []), (103, "pve2", "pve1", [0])]
+
+
+def test_history_load_takes_the_higher_value():
+    row = guest(100, "pve1", 4, cores=1)
+    rows = [{"time": t, "cpu": 0.5, "maxcpu": 4, "mem": 2 * G} for t in range(10)]
+    assert rebalance_lib.history_load(row, rows, window=5) == (2.0, 4 * G)
@@ -0,0 +1,67 @@
+import datetime
+import pytest
+from prox.libs import reconcile_lib
+
+
+def guest(vmid, status, node="pve1", name="web", type="qemu", **extra):
+    return dict({"vmid": vmid, "status": status, "node": node, "name": name,
+                 "type": type}, **extra)
+
+
+def test_windows():
+    window = reconcile_lib.parse_window("mon..fri 08:00-18:00")
+    assert window == ([0, 1, 2, 3, 4], 480, 1080)
+    # 2026-10-16 is a friday
+    assert reconcile_lib.in_window(window, datetime.datetime(2026, 10, 16, 9, 0))
+    assert not reconcile_lib.in_window(window, datetime.datetime(2026, 10, 16, 18, 0))
+    assert not reconcile_lib.in_window(window, datetime.datetime(2026, 10, 17, 9, 0))
+
+    overnight = reconcile_lib.parse_window("fri 22:00-06:00")
+    assert reconcile_lib.in_window(overnight, datetime.datetime(2026, 10, 16, 23, 0))
+    assert reconcile_lib.in_window(overnight, datetime.datetime(2026, 10, 17, 5, 59))
+    assert not reconcile_lib.in_window(overnight, datetime.datetime(2026, 10, 18, 5, 0))
+    with pytest.raises(ValueError):
+        reconcile_lib.parse_window("weekdays 8-18")
+
+
+def test_rules_must_select_and_be_spelt_right(tmp_path):
+    path = tmp_path / "states.yaml"
+    for text in ("- state: stopped\n", "- vmids: 100\n  state: stopped\n"):
+        path.write_text(text)
+        with pytest.raises(ValueError):
+            reconcile_lib.load_states(str(path))
+    path.write_text("guests:\n  - vmid: 100\n    running: mon 08:00-18:00\n")
+    assert reconcile_lib.load_states(str(path))[0]['window'] == ([0], 480, 1080)
+
+
+def test_plan_sends_only_corrections():
+    guests = [guest(100, "running"), guest(101, "stopped"),
+              guest(102, "stopped", lock="backup"),
+              guest(103, "running", name="db", type="lxc"),
+              guest(104, "stopped", node="pve2"), guest(105, "stopped"),
+              guest(106, "stopped", node="pve2")]
+    rules = [{"name": "web", "state": "running"},
+             {"name": "db", "state": "stopped"},
+             {"vmid": "106", "state": "stopped"}]
+    now = datetime.datetime(2026, 10, 16, 12, 0)
+    states = reconcile_lib.desired_states(guests, rules, now)
+    pending = {105: {"node": "pve1", "vmid": 105}}
+
+    actions, deferred = reconcile_lib.plan(states, pending, per_node=2)
+    assert [(i['vmid'], i['action']) for i in actions] == \
+        [(101, "start"), (104, "start")]
+    assert [(i['vmid'], i['action']) for i in deferred] == [(103, "shutdown")]
+
+
+def test_settle_tracks_actions_between_cycles():
+    pending = {
+        100: {"vmid": 100, "state": "running", "since": 0},
+        101: {"vmid": 101, "state": "stopped", "since": 0},
+        102: {"vmid": 102, "state": "stopped", "since": 90},
+        103: {"vmid": 103, "state": "running", "since": 90}
+    }
+    guests = [guest(100, "running"), guest(101, "running"), guest(102, "running")]
+    settled = reconcile_lib.settle(pending, guests, 100, 60)
+    assert [(i['vmid'], outcome) for i, outcome in settled] == \
+        [(100, "done"), (101, "timeout"), (103, "gone")]
+    assert list(pending) == [102]
@@ -0,0 +1,23 @@
+from prox.libs import rightsize_lib
+
+G = 1 << 30
+
+
+def test_analyse_recommends_from_percentiles():
+    vms = [{"vmid": 100, "name": "big", "node": "pve1", "maxcpu": 8, "maxmem": 16 * G},
+           {"vmid": 101, "name": "busy", "node": "pve1", "maxcpu": 2, "maxmem": 2 * G},
+           {"vmid": 102, "name": "new", "node": "pve2", "maxcpu": 4, "maxmem": 4 * G}]
+    histories = [
+        [{"cpu": 0.125, "mem": 3 * G}] * 20 + [{"cpu": None, "mem": None}],
+        [{"cpu": 1.0, "mem": 2 * G}] * 10,
+        [],
+    ]
+    big, busy, new = rightsize_lib.analyse(vms, histories, 95, 0.2)
+    assert big['cpu'] == 1.0 and big['rec_cpus'] == 2
+    assert big['rec_mem'] == 4 * G
+    assert busy['rec_cpus'] == 3
+    assert new['rec_cpus'] == 4 and new['rec_mem'] == 4 * G and new['cpu'] is None
+
+    freed = rightsize_lib.reclaimable([big, busy, new])
+    assert freed == {"pve1": {"cpus": 6, "mem": 12 * G},
+                     "pve2": {"cpus": 0, "mem": 0}}
@@ -0,0 +1,39 @@
+from prox.libs import snapshot_lib
+import time
+
+DAY = 24 * 3600
+NOW = time.mktime((2024, 6, 10, 12, 0, 0, 0, 0, -1))
+
+
+def snapshots(hours):
+    return [{"name": "prox_%d" % h, "snaptime": NOW - h * 3600}
+            for h in hours]
+
+
+def names(items):
+    return [i['name'] for i in items]
+
+
+def test_retention_without_rules_keeps_everything():
+    keep, remove = snapshot_lib.retention(snapshots([0, 24, 48]))
+    assert names(keep) == ["prox_0", "prox_24", "prox_48"]
+    assert remove == []
+
+
+def test_keep_last():
+    keep, remove = snapshot_lib.retention(snapshots([48, 0, 24]), keep_last=2)
+    assert names(keep) == ["prox_0", "prox_24"]
+    assert names(remove) == ["prox_48"]
+
+
+def test_keep_daily_skips_days_covered_by_keep_last():
+    # two snapshots a day for four days, newest at NOW
+    keep, remove = snapshot_lib.retention(
+        snapshots([0, 6, 24, 30, 48, 54, 72, 78]), keep_last=1, keep_daily=2)
+    assert names(keep) == ["prox_0", "prox_24", "prox_48"]
+    assert "prox_6" in names(remove)
+
+
+def test_owned_filters_on_prefix():
+    items = snapshots([0]) + [{"name": "manual", "snaptime": NOW}]
+    assert names(snapshot_lib.owned(items)) == ["prox_0"]
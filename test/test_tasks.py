@@ -0,0 +1,107 @@
+from prox.libs import proxmox_lib
+from prox.libs import tasks_lib
+
+
+def task(upid, start, end=None, status="OK", type="qmstart", vmid="100",
+         user="root@pam"):
+    row = {"upid": upid, "node": "pve", "type": type, "id": vmid,
+           "user": user, "starttime": start}
+    if end is not None:
+        row['endtime'] = end
+        row['status'] = status
+    return row
+
+
+def test_sync_is_incremental(monkeypatch):
+    db = tasks_lib.connect(":memory:")
+    listing = [task("U1", 10, 12), task("U2", 20)]
+    asked = list()
+
+    def fetch(node, start_time=0):
+        asked.append(start_time)
+        return [i for i in listing if i['starttime'] >= start_time]
+
+    monkeypatch.setattr(tasks_lib, "fetch", fetch)
+    report, logs = tasks_lib.sync(db, ["pve"])
+    assert report == [("pve", 2, 2, None)]
+
+    # the running task is asked for again until it finishes
+    listing = [task("U1", 10, 12), task("U2", 20, 50, "error"),
+               task("U3", 30, 31)]
+    report, logs = tasks_lib.sync(db, ["pve"])
+    assert asked == [0, 20]
+    assert report == [("pve", 2, 2, None)]
+
+    report, logs = tasks_lib.sync(db, ["pve"])
+    assert asked[-1] == 30
+    assert report == [("pve", 1, 0, None)]
+    assert tasks_lib.query(db, status="failed")[0].duration == 30
+
+
+def test_stuck_running_task_stops_pinning_the_sync():
+    db = tasks_lib.connect(":memory:")
+    tasks_lib.store(db, [task("U1", 100), task("U2", 200, 210)])
+    assert tasks_lib.since(db, "pve") == 100
+    later = 100 + tasks_lib.RUNNING_WINDOW + 1
+    tasks_lib.store(db, [task("U3", later, later + 5)])
+    assert tasks_lib.since(db, "pve") == later
+
+
+def test_failed_logs_fetched_once(monkeypatch):
+    db = tasks_lib.connect(":memory:")
+    tasks_lib.store(db, [task("U1", 1, 2), task("U2", 3, 4, "error")])
+    fetched = list()
+
+    def fetch_log(item):
+        fetched.append(item)
+        return "boom"
+
+    monkeypatch.setattr(tasks_lib, "fetch", lambda node, start_time=0: [])
+    monkeypatch.setattr(tasks_lib, "fetch_log", fetch_log)
+    assert tasks_lib.sync(db, ["pve"], logs=True)[1] == 1
+    assert tasks_lib.sync(db, ["pve"], logs=True)[1] == 0
+    assert fetched == [("pve", "U2")]
+    assert tasks_lib.task_log(db, "U2") == "boom"
+
+
+def test_only_gone_logs_are_given_up(monkeypatch):
+    db = tasks_lib.connect(":memory:")
+    tasks_lib.store(db, [task("U1", 1, 2, "error"), task("U2", 3, 4, "error")])
+    answers = {
+        "U1": proxmox_lib.ProxmoxError(
+            "Parameter verification failed. {'upid': 'no such task - unable "
+            "to open file - No such file or directory'}"),
+        "U2": proxmox_lib.ProxmoxError("HTTP 503")
+    }
+
+    def fetch_log(item):
+        raise answers[item[1]]
+
+    monkeypatch.setattr(tasks_lib, "fetch", lambda node, start_time=0: [])
+    monkeypatch.setattr(tasks_lib, "fetch_log", fetch_log)
+    assert tasks_lib.sync(db, ["pve"], logs=True)[1] == 0
+    assert tasks_lib.missing_logs(db) == [("pve", "U2")]
+
+    monkeypatch.setattr(tasks_lib, "fetch_log", lambda item: "boom")
+    assert tasks_lib.sync(db, ["pve"], logs=True)[1] == 1
+    assert tasks_lib.task_log(db, "U1") is None
+    assert tasks_lib.task_log(db, "U2") == "boom"
+
+
+def test_query_and_stats():
+    db = tasks_lib.connect(":memory:")
+    rows = [task("U%d" % i, i * 10, i * 10 + i, type="vzdump", vmid=str(100 + i % 2))
+            for i in range(1, 101)]
+    rows.append(task("X", 5, 6, "error", type="qmstart", user="ops@pve"))
+    tasks_lib.store(db, rows)
+
+    assert [i.upid for i in tasks_lib.query(db, limit=2)] == ["U100", "U99"]
+    assert len(tasks_lib.query(db, vmid=101)) == 50
+    assert [i.upid for i in tasks_lib.query(db, user="ops@pve")] == ["X"]
+    assert len(tasks_lib.query(db, type="vzdump", min_duration=91)) == 10
+
+    stats = dict((i['type'], i) for i in tasks_lib.stats(db))
+    assert stats['vzdump']['count'] == 100
+    assert (stats['vzdump']['p50'], stats['vzdump']['p90'],
+            stats['vzdump']['p99'], stats['vzdump']['max']) == (50, 90, 99, 100)
+    assert stats['qmstart']['failed'] == 1
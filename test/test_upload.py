@@ -0,0 +1,46 @@
+import hashlib
+import pytest
+from prox.libs import upload_lib
+
+
+def test_multipart_body_streams_in_small_blocks(tmp_path):
+    path = tmp_path / "debian.iso"
+    data = bytes(range(256)) * 1000
+    path.write_bytes(data)
+    seen = list()
+
+    class Counter(object):
+        def add(self, count):
+            seen.append(count)
+    body = upload_lib.MultipartStream([("content", "iso")], "filename", str(path),
+                                      progress=Counter())
+    blocks = list()
+    while True:
+        block = body.read(4096)
+        if not block:
+            break
+        assert len(block) <= 4096
+        blocks.append(block)
+    raw = b"".join(blocks)
+    assert len(raw) == len(body)
+    boundary = body.content_type.split("boundary=")[1].encode()
+    parts = raw.split(b"--" + boundary)
+    assert parts[1] == b'\r\nContent-Disposition: form-data; name="content"\r\n\r\niso\r\n'
+    assert b'filename="debian.iso"' in parts[2]
+    assert parts[2].split(b"\r\n\r\n", 1)[1] == data + b"\r\n"
+    assert parts[3] == b"--\r\n"
+    assert sum(seen) == len(data)
+
+
+def test_checksums_and_content_types(tmp_path):
+    path = tmp_path / "ct.tar.zst"
+    path.write_bytes(b"x" * 3000000)
+    assert upload_lib.file_checksum(str(path), "sha256") == \
+        hashlib.sha256(b"x" * 3000000).hexdigest()
+    assert upload_lib.guess_content(str(path)) == "vztmpl"
+    assert upload_lib.guess_content("Debian.ISO") == "iso"
+    assert upload_lib.guess_content("disk.qcow2") is None
+    assert upload_lib.parse_checksum("ABC123") == ("sha256", "abc123")
+    assert upload_lib.parse_checksum("sha512:ff") == ("sha512", "ff")
+    with pytest.raises(ValueError):
+        upload_lib.parse_checksum("crc32:ff")
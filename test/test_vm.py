@@ -1,4 +1,49 @@
 import pytest
+from prox.libs import vm_lib
 
 def test_test():
-    pass
\ No newline at end of file
+    pass
+
+def test_parse_vmids():
+    assert vm_lib.parse_vmids("100, 105-107") == [100, 105, 106, 107]
+
+def test_filter_vms_skips_templates_and_containers():
+    vms = [
+        {"vmid": 101, "name": "web1", "node": "pve", "type": "qemu"},
+        {"vmid": 100, "name": "web0", "node": "pve", "type": "qemu"},
+        {"vmid": 102, "name": "tpl", "node": "pve", "type": "qemu", "template": 1},
+        {"vmid": 103, "name": "web3", "node": "pve", "type": "lxc"},
+    ]
+    assert [vm['vmid'] for vm in vm_lib.filter_vms(vms, name="web*")] == [100, 101]
+    # evacuation must move templates too
+    assert [vm['vmid'] for vm in vm_lib.filter_vms(vms, node="pve", templates=True)] \
+        == [100, 101, 102]
+
+def test_vm_storages_ignores_cdrom():
+    config = {
+        "scsi0": "local-lvm:vm-100-disk-0,size=32G",
+        "virtio1": "ceph:vm-100-disk-1,size=8G",
+        "ide2": "local:iso/debian.iso,media=cdrom",
+        "net0": "virtio=AA:BB:CC:DD:EE:FF,bridge=vmbr0",
+    }
+    assert vm_lib.vm_storages(config) == ["ceph", "local-lvm"]
+
+def test_config_diff_only_reports_changes():
+    current = {"cores": 4, "onboot": 1, "balloon": 0, "digest": "abc"}
+    desired = {"cores": 4, "onboot": True, "memory": 2048, "balloon": None,
+               "agent": None}
+    changes, delete = vm_lib.config_diff(current, desired)
+    assert changes == {"memory": "2048"}
+    assert delete == ["balloon"]
+
+def test_config_diff_in_shape():
+    assert vm_lib.config_diff({"cores": "2"}, {"cores": 2}) == ({}, [])
+
+def test_rules_must_select_and_be_spelt_right(tmp_path):
+    path = tmp_path / "desired.yaml"
+    path.write_text("- name: web*\n  config: {cores: 2}\n")
+    assert vm_lib.load_rules(str(path))[0]['name'] == "web*"
+    for text in ("- config: {cores: 2}\n", "- vmids: 100\n  config: {cores: 2}\n"):
+        path.write_text(text)
+        with pytest.raises(ValueError):
+            vm_lib.load_rules(str(path))